@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Alpha sweep vs one full re-blend per candidate alpha
+
+Usage:
+    python -m scripts.benchmark_alpha_sweep --requests 20000 --grid 41
+"""
+import argparse
+import dataclasses
+import time
+
+import numpy as np
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.config.blending_config import BlendingConfig
+from src.evaluation.alpha_sweep import alpha_sweep
+from src.evaluation.blending_metrics import METRIC_COLS, topk_metrics
+from src.utils.synthetic_data import make_synthetic_requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--grid", type=int, default=41, help="number of alphas in the re-blend grid")
+    parser.add_argument("--alpha-max", type=float, default=100.0)
+    args = parser.parse_args()
+
+    config = BlendingConfig()
+    inputs = BlendingInput.from_rows(make_synthetic_requests(args.requests))
+    alphas = np.linspace(0.0, args.alpha_max, args.grid)
+    print(f"📊 {args.requests:,} requests, alpha in [0, {args.alpha_max:g}]")
+
+    start = time.perf_counter()
+    grid = [topk_metrics(blend_batch(inputs, dataclasses.replace(config, alpha=a)), config.k) for a in alphas]
+    grid_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sweep = alpha_sweep(inputs, config, alpha_min=0.0, alpha_max=args.alpha_max)
+    breakpoints, curves = sweep.mean_curves()
+    sweep_seconds = time.perf_counter() - start
+
+    max_error = max(
+        abs(curves[name][np.searchsorted(breakpoints, a, side="right") - 1] - metrics[name].mean())
+        for a, metrics in zip(alphas, grid)
+        for name in METRIC_COLS
+    )
+    pieces = sweep.pieces_per_request
+    print(f"  re-blend grid ({args.grid} alphas)  : {grid_seconds:8.3f}s")
+    print(f"  alpha sweep (exact curves) : {sweep_seconds:8.3f}s  "
+          f"({len(breakpoints):,} breakpoints, {pieces.mean():.1f} pieces/request, max {pieces.max()})")
+    print(f"  speedup                    : {grid_seconds / sweep_seconds:8.1f}x")
+    print(f"  max |curve - grid mean|    : {max_error:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Multi-day backfill: wall time against the sum of the day times and the slowest day, by worker limit
+
+Usage:
+    python -m scripts.benchmark_backfill --days 4 --requests 5000
+"""
+import argparse
+import datetime
+import os
+import tempfile
+
+import pyarrow as pa
+
+from src.data_pipelines.backfill import backfill, date_range
+from src.utils.synthetic_data import make_synthetic_events
+
+START = "2025-07-20"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=5000, help="Requests per day")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    end = (datetime.date.fromisoformat(START) + datetime.timedelta(days=args.days - 1)).isoformat()
+    days = [make_synthetic_events(args.requests, date=date, seed=seed)
+            for seed, date in enumerate(date_range(START, end))]
+    events = {name: pa.concat_tables([day[name] for day in days]) for name in days[0]}
+    print(f"📊 Backfill of {args.days} days x {args.requests:,} requests, {os.cpu_count()} CPUs")
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as output:
+            report = backfill(events, START, end, output, max_workers=workers)
+        slowest = max(day.seconds for day in report.days)
+        print(f"  {workers} workers: {report.wall_seconds:8.3f}s wall, {report.day_seconds:8.3f}s of days, "
+              f"slowest day {slowest:7.3f}s, {len(report.failed)} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark: batch blending engine vs the row-at-a-time reference
+
+Usage:
+    python -m scripts.benchmark_batch_blending --requests 20000
+"""
+import argparse
+import dataclasses
+import time
+
+import numpy as np
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.algorithms.blending_algorithm import merge_sort_blending_dedup
+from src.config.blending_config import BlendingConfig
+from src.utils.synthetic_data import make_synthetic_requests
+
+
+def run_reference(rows, config):
+    return [
+        merge_sort_blending_dedup(
+            row["ad_quality_score_array"],
+            row["ad_expected_value_array"],
+            row["nv_pctr_array"],
+            config.alpha,
+            config.beta,
+            row["ad_sorted_card_position_array"],
+            row["nv_sorted_card_position_array"],
+            config.max_ads_block_size,
+            config.min_nv_block_size,
+            row["ad_unhashed_bms_id_array"],
+            row["nv_unhashed_bms_id_array"],
+        )
+        for row in rows
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = BlendingConfig()
+    rows = make_synthetic_requests(args.requests, seed=args.seed)
+    inputs = BlendingInput.from_rows(rows)
+    n_items = int(inputs.ad_lengths.sum() + inputs.nv_lengths.sum())
+    print(f"📊 {args.requests:,} requests, {n_items:,} ad+NV items")
+
+    start = time.perf_counter()
+    expected = run_reference(rows, config)
+    reference_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    blended = blend_batch(inputs, config)
+    batch_seconds = time.perf_counter() - start
+
+    # Same requests with bms ids already mapped to integers, which removes the
+    # string hashing from the dedup setup.
+    int_inputs = dataclasses.replace(
+        inputs,
+        ad_bms_id=inputs.ad_bms_id.astype(np.int64),
+        nv_bms_id=inputs.nv_bms_id.astype(np.int64),
+    )
+    start = time.perf_counter()
+    blend_batch(int_inputs, config)
+    int_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    truncated = blend_batch(inputs, config, top_k=config.k)
+    top_k_seconds = time.perf_counter() - start
+
+    mismatches = sum(blended.to_records(r) != expected[r] for r in range(len(rows)))
+    mismatches += sum(truncated.to_records(r) != expected[r][:config.k] for r in range(len(rows)))
+    print(f"  reference UDF function : {reference_seconds:8.3f}s  "
+          f"({args.requests / reference_seconds:12,.0f} requests/s)")
+    print(f"  batch engine           : {batch_seconds:8.3f}s  "
+          f"({args.requests / batch_seconds:12,.0f} requests/s)")
+    print(f"  batch engine, int ids  : {int_seconds:8.3f}s  "
+          f"({args.requests / int_seconds:12,.0f} requests/s)")
+    print(f"  batch engine, top-{config.k:<3d}  : {top_k_seconds:8.3f}s  "
+          f"({args.requests / top_k_seconds:12,.0f} requests/s)")
+    print(f"  speedup                : {reference_seconds / batch_seconds:8.1f}x "
+          f"(string ids), {reference_seconds / int_seconds:.1f}x (int ids), "
+          f"{reference_seconds / top_k_seconds:.1f}x (top-{config.k})")
+    print(f"  output items           : {len(blended.source):,} full, {len(truncated.source):,} top-{config.k}")
+    print(f"  mismatching requests   : {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Blend time with and without the content-addressed memo, on inputs with repeated requests
+
+Usage:
+    python -m scripts.benchmark_blend_memo --requests 50000 --duplicates 0.3 --days 3
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src.algorithms.batch_blending import (
+    AD_BMS_ID_COL,
+    AD_CARD_POSITION_COL,
+    AD_EXPECTED_VALUE_COL,
+    AD_QUALITY_SCORE_COL,
+    NV_BMS_ID_COL,
+    NV_CARD_POSITION_COL,
+    NV_PCTR_COL,
+    BlendingInput,
+    blend_batch,
+)
+from src.algorithms.blend_memo import BlendMemo, memoize_blending, request_fingerprints
+from src.algorithms.blending_algorithm import merge_sort_blending_dedup
+from src.algorithms.interning import intern_ids
+from src.config.blending_config import BlendingConfig
+from src.utils.synthetic_data import make_synthetic_requests
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def make_day(distinct_rows, n, duplicates, rng):
+    """``n`` rows drawn from ``distinct_rows``, a ``duplicates`` share of them repeats."""
+    fresh = int(n * (1 - duplicates))
+    picks = np.concatenate([rng.choice(len(distinct_rows), fresh, replace=False), rng.integers(0, fresh, n - fresh)])
+    return [distinct_rows[i] for i in rng.permutation(picks)]
+
+
+def reference_args(row, config):
+    return (
+        row[AD_QUALITY_SCORE_COL], row[AD_EXPECTED_VALUE_COL], row[NV_PCTR_COL], config.alpha, config.beta,
+        row[AD_CARD_POSITION_COL], row[NV_CARD_POSITION_COL], config.max_ads_block_size,
+        config.min_nv_block_size, row[AD_BMS_ID_COL], row[NV_BMS_ID_COL],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50000, help="requests per day")
+    parser.add_argument("--duplicates", type=float, default=0.3, help="share of repeated requests")
+    parser.add_argument("--days", type=int, default=3, help="daily batches sharing one memo")
+    parser.add_argument("--reference-rows", type=int, default=5000, help="rows per day for the reference blend")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    distinct_rows = make_synthetic_requests(2 * args.requests, seed=1)
+    day_rows = [make_day(distinct_rows, args.requests, args.duplicates, rng) for _ in range(args.days)]
+    days = [intern_ids(BlendingInput.from_rows(rows)) for rows in day_rows]
+    config = BlendingConfig()
+    print(f"📊 {args.days} days x {args.requests:,} interned requests, {args.duplicates:.0%} repeats per day")
+
+    _, fingerprint_seconds = timed(lambda: request_fingerprints(days[0]))
+    print(f"  fingerprints          : {fingerprint_seconds:8.3f}s per day")
+    for top_k in (config.k, None):
+        label = f"top-{top_k}" if top_k else "full"
+        plain = sum(timed(lambda: blend_batch(day, config, top_k=top_k))[1] for day in days)
+        memo = BlendMemo()
+        memoized = sum(timed(lambda: memo.blend(day, config, top_k=top_k))[1] for day in days)
+        print(f"  {label:6s} blend_batch   : {plain:8.3f}s")
+        print(f"  {label:6s} BlendMemo     : {memoized:8.3f}s ({plain / memoized:.2f}x), hit rate "
+              f"{memo.stats.hit_rate:.1%}, in-batch repeats {memo.stats.duplicate_rate:.1%}")
+
+    # Row-at-a-time reference, as in the notebook's UDF.
+    calls = [reference_args(row, config) for rows in day_rows for row in rows[:args.reference_rows]]
+    _, plain = timed(lambda: [merge_sort_blending_dedup(*a) for a in calls])
+    memoized = memoize_blending()
+    _, cached = timed(lambda: [memoized(*a) for a in calls])
+    info = memoized.cache_info()
+    print(f"  reference per row     : {plain:8.3f}s for {len(calls):,} rows")
+    print(f"  memoize_blending      : {cached:8.3f}s ({plain / cached:.2f}x), hit rate "
+          f"{info.hits / (info.hits + info.misses):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Memory per blended request: reference list-of-dicts vs compact BlendedBatch
+
+Usage:
+    python -m scripts.benchmark_blended_memory --requests 20000
+"""
+import argparse
+import sys
+
+from scripts.benchmark_batch_blending import run_reference
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.config.blending_config import BlendingConfig
+from src.utils.synthetic_data import make_synthetic_requests
+
+
+def deep_size(obj, seen=None) -> int:
+    """Bytes held by ``obj`` and the lists, dicts and scalars it references."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, list):
+        size += sum(deep_size(v, seen) for v in obj)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    config = BlendingConfig()
+    rows = make_synthetic_requests(args.requests)
+    inputs = BlendingInput.from_rows(rows)
+
+    reference_bytes = deep_size(run_reference(rows, config))
+    blended = blend_batch(inputs, config)
+    top_k = blend_batch(inputs, config, top_k=config.k)
+    # The same batch with every signal column materialized as float64/int64.
+    eager_bytes = blended.nbytes + len(blended.source) * 3 * 8
+
+    n = args.requests
+    print(f"📊 {n:,} requests, {len(blended.source):,} blended items")
+    print(f"  list of dicts (reference)     : {reference_bytes / n:10,.0f} bytes/request")
+    print(f"  arrays with gathered signals  : {eager_bytes / n:10,.0f} bytes/request")
+    print(f"  compact source/index          : {blended.nbytes / n:10,.0f} bytes/request "
+          f"({reference_bytes / blended.nbytes:.0f}x smaller)")
+    print(f"  compact, top-{config.k:<3d}              : {top_k.nbytes / n:10,.0f} bytes/request "
+          f"({reference_bytes / top_k.nbytes:.0f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
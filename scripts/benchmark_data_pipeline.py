@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Local ad data pipeline: in-memory DAG vs writing and re-reading every stage
+
+Usage:
+    python -m scripts.benchmark_data_pipeline --requests 200000 --workers 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pyarrow.parquet as pq
+
+from src.data_pipelines.ad_pipeline import AD_OUTPUT, run_ad_pipeline
+from src.utils.synthetic_data import make_synthetic_ad_events
+
+DATE = "2025-07-23"
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        sources = {}
+        for name, table in make_synthetic_ad_events(args.requests, date=DATE, seed=1).items():
+            sources[name] = os.path.join(root, f"{name}.parquet")
+            pq.write_table(table, sources[name])
+        print(f"📊 {args.requests:,} ad requests")
+
+        materialized, materialized_seconds = timed(lambda: run_ad_pipeline(
+            sources, DATE, max_workers=1, materialize=os.path.join(root, "stages")))
+        in_memory, in_memory_seconds = timed(lambda: run_ad_pipeline(sources, DATE, max_workers=args.workers))
+        assert in_memory.outputs[AD_OUTPUT].num_rows == materialized.outputs[AD_OUTPUT].num_rows
+
+        for name, run, seconds in (("materialize every step", materialized, materialized_seconds),
+                                   ("in-memory DAG", in_memory, in_memory_seconds)):
+            stages = ", ".join(f"{stage} {s:.2f}s" for stage, s in run.seconds.items())
+            print(f"  {name:22s}: {seconds:8.3f}s  ({stages})")
+        print(f"  speedup               : {materialized_seconds / in_memory_seconds:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Unique-key dedup: the notebooks' CTE and join against the window rewrite and the local hash count
+
+Usage:
+    python -m scripts.benchmark_dedup --requests 50000
+"""
+import argparse
+import time
+
+import duckdb
+
+from src.data_pipelines.ad_pipeline import AD_DEDUP, AD_PARAMS, ad_pipeline
+from src.data_pipelines.nv_pipeline import NV_DEDUP, NV_PARAMS, nv_pipeline
+from src.utils.synthetic_data import make_synthetic_events
+
+DATE = "2025-07-23"
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def query(sql, name, table):
+    connection = duckdb.connect()
+    try:
+        connection.register(name, table)
+        return connection.execute(sql).to_arrow_table()
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    events = make_synthetic_events(args.requests, date=DATE, seed=4)
+    for dedup, pipeline, params in [(AD_DEDUP, ad_pipeline(), AD_PARAMS), (NV_DEDUP, nv_pipeline(), NV_PARAMS)]:
+        table = pipeline.run(events, dict(params, date=DATE), targets=[dedup.table]).outputs[dedup.table]
+        report = dedup.apply(table)[1]
+        print(f"📊 {dedup.table}: {table.num_rows:,} rows, {report.kept:,} kept, "
+              f"{report.duplicates.num_rows:,} shared keys, {report.null_key_rows:,} NULL-key rows")
+        runs = [
+            ("CTE + join SQL", lambda: query(dedup.sql(window=False), dedup.table, table)),
+            ("window SQL", lambda: query(dedup.sql(), dedup.table, table)),
+            ("local hash count", lambda: dedup.apply(table)),
+        ]
+        for name, fn in runs:
+            seconds = min(timed(fn)[1] for _ in range(args.repeats))
+            print(f"  {name:17s}: {seconds:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Grid evaluation vs re-parsing the raw list columns once per config
+
+Usage:
+    python -m scripts.benchmark_grid_evaluation --requests 20000 --workers 4
+"""
+import argparse
+import time
+
+from src.algorithms.batch_blending import BlendingInput
+from src.evaluation.grid_evaluation import config_grid, evaluate_config, evaluate_grid
+from src.utils.list_parsing import parse_raw_rows
+from src.utils.synthetic_data import make_synthetic_requests, to_raw_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    raw_rows = to_raw_rows(make_synthetic_requests(args.requests))
+    configs = config_grid(alpha=(5.0, 10.0, 20.0, 40.0), max_ads_block_size=(2, 3), min_nv_block_size=(1, 2))
+    print(f"📊 {args.requests:,} requests, {len(configs)} configs")
+
+    start = time.perf_counter()
+    for config in configs:
+        evaluate_config(BlendingInput.from_rows(parse_raw_rows(raw_rows)), config)
+    per_config_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    inputs = BlendingInput.from_rows(parse_raw_rows(raw_rows))
+    parse_seconds = time.perf_counter() - start
+    evaluate_grid(inputs, configs, max_workers=args.workers)
+    grid_seconds = time.perf_counter() - start
+
+    print(f"  parse + evaluate per config : {per_config_seconds:8.3f}s")
+    print(f"  parse once + grid           : {grid_seconds:8.3f}s  (parse {parse_seconds:.3f}s)")
+    print(f"  speedup                     : {per_config_seconds / grid_seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
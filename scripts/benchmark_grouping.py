@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+List grouping: per-list ARRAY_AGG SQL against single-sort SQL and the local lexsort grouping
+
+Usage:
+    python -m scripts.benchmark_grouping --requests 50000
+"""
+import argparse
+import time
+
+import duckdb
+
+from src.data_pipelines.ad_pipeline import AD_GROUPING, AD_PARAMS, ad_pipeline
+from src.data_pipelines.nv_pipeline import NV_GROUPING, NV_PARAMS, nv_pipeline
+from src.utils.synthetic_data import make_synthetic_events
+
+DATE = "2025-07-23"
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def query(sql, name, table):
+    connection = duckdb.connect()
+    try:
+        connection.register(name, table)
+        return connection.execute(sql).to_arrow_table()
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    events = make_synthetic_events(args.requests, date=DATE, seed=2)
+    groupings = [(AD_GROUPING, ad_pipeline(), AD_PARAMS), (NV_GROUPING, nv_pipeline(), NV_PARAMS)]
+    for grouping, pipeline, params in groupings:
+        table = pipeline.run(events, dict(params, date=DATE), targets=[grouping.table]).outputs[grouping.table]
+        print(f"📊 {grouping.table}: {table.num_rows:,} rows, {len(grouping.lists)} lists")
+        runs = [
+            ("per-list SQL", lambda: query(grouping.sql(single_sort=False), grouping.table, table)),
+            ("single-sort SQL", lambda: query(grouping.sql(), grouping.table, table)),
+            ("local lexsort", lambda: grouping.group(table)),
+        ]
+        for name, fn in runs:
+            seconds = min(timed(fn)[1] for _ in range(args.repeats))
+            print(f"  {name:16s}: {seconds:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
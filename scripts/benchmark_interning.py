@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Per-request cost of the bms id dedup: raw string ids vs interned int ids
+
+Usage:
+    python -m scripts.benchmark_interning --requests 50000 --configs 16
+"""
+import argparse
+import time
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.algorithms.interning import intern_ids
+from src.config.blending_config import BlendingConfig
+from src.utils.synthetic_data import make_synthetic_requests
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--configs", type=int, default=16, help="blends sharing one interned input (grid size)")
+    args = parser.parse_args()
+
+    config = BlendingConfig()
+    inputs = BlendingInput.from_rows(make_synthetic_requests(args.requests))
+    interned, intern_seconds = timed(lambda: intern_ids(inputs))
+
+    n, g = args.requests, args.configs
+    print(f"📊 {n:,} requests")
+    print(f"  interning              : {intern_seconds * 1e6 / n:8.2f} µs/request")
+    for label, top_k in (("full", None), (f"top-{config.k}", config.k)):
+        raw, raw_seconds = timed(lambda: blend_batch(inputs, config, top_k=top_k))
+        dense, dense_seconds = timed(lambda: blend_batch(interned, config, top_k=top_k))
+        assert (raw.source == dense.source).all() and (raw.index == dense.index).all()
+        amortized = dense_seconds + intern_seconds / g
+        print(f"  {label:8s} string ids    : {raw_seconds * 1e6 / n:8.2f} µs/request")
+        print(f"  {label:8s} interned ids  : {dense_seconds * 1e6 / n:8.2f} µs/request "
+              f"({raw_seconds / dense_seconds:.1f}x)")
+        print(f"  {label:8s} over {g:3d} blends: {amortized * 1e6 / n:8.2f} µs/request incl. interning "
+              f"(saves {(raw_seconds - amortized) * 1e6 / n:.2f})")
+
+
+if __name__ == "__main__":
+    main()
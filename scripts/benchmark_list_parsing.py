@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Parse throughput of the raw list columns: per-row JSON vs the columnar Arrow decoder
+
+Usage:
+    python -m scripts.benchmark_list_parsing --requests 50000
+    python -m scripts.benchmark_list_parsing --requests 50000 --spark
+"""
+import argparse
+import time
+
+import pyarrow as pa
+
+from src.utils.list_decoding import blending_input_from_raw, decode_list_array
+from src.utils.list_parsing import RAW_LIST_COLUMNS, parse_list
+from src.utils.synthetic_data import make_synthetic_requests, to_raw_rows
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def benchmark_spark(raw_rows, master: str) -> None:
+    from pyspark.sql import SparkSession
+    from pyspark.sql import functions as F
+
+    from src.algorithms.spark_blending import PARSED_INPUT_SCHEMA
+    from src.utils.spark_list_parsing import with_parsed_lists
+
+    spark = (
+        SparkSession.builder.master(master)
+        .config("spark.ui.enabled", "false")
+        .config("spark.ui.showConsoleProgress", "false")
+        .getOrCreate()
+    )
+    names = [raw for raw, _, _ in RAW_LIST_COLUMNS]
+    df = spark.createDataFrame([tuple(row[n] for n in names) for row in raw_rows],
+                               ", ".join(f"{n} string" for n in names)).cache()
+    df.count()
+
+    def notebook():
+        """The notebook's input prep: regexp_replace + from_json per column."""
+        return df.select(*(
+            F.from_json(F.regexp_replace(F.col(raw), r"\n|\s", ""), PARSED_INPUT_SCHEMA[parsed].dataType)
+            .alias(parsed)
+            for raw, parsed, _ in RAW_LIST_COLUMNS
+        ))
+
+    def run(frame):
+        frame.write.format("noop").mode("overwrite").save()
+
+    run(notebook())
+    run(with_parsed_lists(df, drop_raw=True))  # warm up the Python workers
+    json_seconds = timed(lambda: run(notebook()))
+    arrow_seconds = timed(lambda: run(with_parsed_lists(df, drop_raw=True)))
+    n = len(raw_rows)
+    print(f"  spark from_json + regexp  : {json_seconds:8.3f}s  ({n / json_seconds:10,.0f} rows/s)")
+    print(f"  spark mapInArrow decoder  : {arrow_seconds:8.3f}s  ({n / arrow_seconds:10,.0f} rows/s, "
+          f"{json_seconds / arrow_seconds:.1f}x)")
+    spark.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--spark", action="store_true", help="also time the Spark paths")
+    parser.add_argument("--master", default="local[*]")
+    args = parser.parse_args()
+
+    raw_rows = to_raw_rows(make_synthetic_requests(args.requests))
+    columns = {raw: pa.array([row[raw] for row in raw_rows], pa.string()) for raw, _, _ in RAW_LIST_COLUMNS}
+    n = args.requests
+    megabytes = sum(c.nbytes for c in columns.values()) / 2 ** 20
+    print(f"📊 {n:,} requests, {megabytes:.1f} MiB of list text")
+    for raw, _, kind in RAW_LIST_COLUMNS:
+        texts = columns[raw].to_pylist()
+        row_seconds = timed(lambda: [parse_list(t, kind) for t in texts])
+        column_seconds = timed(lambda: decode_list_array(columns[raw], kind))
+        mib = columns[raw].nbytes / 2 ** 20
+        print(f"  {raw:26s}: per-row {mib / row_seconds:7.1f} MiB/s, columnar {mib / column_seconds:7.1f} MiB/s "
+              f"({row_seconds / column_seconds:.1f}x)")
+    total = timed(lambda: blending_input_from_raw(columns))
+    print(f"  raw columns -> BlendingInput: {total:.3f}s ({n / total:,.0f} requests/s)")
+    if args.spark:
+        benchmark_spark(raw_rows, args.master)
+
+
+if __name__ == "__main__":
+    main()
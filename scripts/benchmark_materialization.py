@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Stage materialization cache: cold run, unchanged re-run and a one-filter change
+
+Usage:
+    python -m scripts.benchmark_materialization --requests 30000
+"""
+import argparse
+import tempfile
+import time
+
+from src.data_pipelines.materialization import MaterializationCache, format_plan
+from src.data_pipelines.nv_pipeline import run_nv_pipeline
+from src.utils.synthetic_data import make_synthetic_events
+
+DATE = "2025-07-23"
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=30000)
+    args = parser.parse_args()
+
+    events = make_synthetic_events(args.requests, date=DATE, seed=1)
+    print(f"📊 NV pipeline, {args.requests:,} rankings")
+    with tempfile.TemporaryDirectory() as root:
+        cache = MaterializationCache(root)
+        runs = [
+            ("cold", {}),
+            ("unchanged", {}),
+            ("new v2c model id", {"v2c_model_id": "mtml_v2c_ctr_1747176394_retrained"}),
+        ]
+        for name, params in runs:
+            print(f"  {name} (dry run):")
+            print("    " + format_plan(run_nv_pipeline(events, DATE, cache=cache, dry_run=True, **params).plan)
+                  .replace("\n", "\n    "))
+            run, seconds = timed(lambda: run_nv_pipeline(events, DATE, cache=cache, **params))
+            print(f"  {name:18s}: {seconds:8.3f}s, {len(run.seconds)} of {len(run.plan)} stages ran")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Metric pack: the notebook's per-metric scans vs the fused single pass, and per-K vs the metric cube
+
+Usage:
+    python -m scripts.benchmark_metric_pack --requests 50000
+"""
+import argparse
+import time
+
+from pyspark.sql import DataFrame, SparkSession
+from pyspark.sql.functions import expr
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.algorithms.spark_blending import PARSED_INPUT_SCHEMA, with_merged_result
+from src.config.blending_config import BlendingConfig
+from src.evaluation.blending_metrics import METRIC_PAIRS, fixed_slot_metrics, metric_cube, metric_pack, topk_metrics
+from src.evaluation.grid_evaluation import summarize_cube, summarize_metrics
+from src.evaluation.spark_metrics import fixed_slot_sql, metric_cube_summary, metric_pack_summary
+from src.utils.synthetic_data import make_synthetic_requests
+
+
+def notebook_metric_pack(df: DataFrame, k: int) -> DataFrame:
+    """``calculate_metric_pack`` as written in the notebook: one scan per metric."""
+    def util(items, field):
+        return expr(f"""aggregate(zip_with(slice({items}, 1, {k}), sequence(0, {k - 1}),
+                        (x, i) -> x.{field} / log2(i + 2)), 0D, (acc, v) -> acc + v)""")
+
+    df = df.withColumn("sorted_struct", expr(fixed_slot_sql())).withColumns({
+        "ads_load_topk_blended": expr(f"size(filter(slice(merged_result, 1, {k}), x -> x.revenue_signal > 0))"),
+        "ads_load_topk": expr(f"size(filter(slice(sorted_struct, 1, {k}), x -> x.revenue > 0))"),
+        "sum_enga_util_topk": util("sorted_struct", "engagement"),
+        "sum_rev_util_topk": util("sorted_struct", "revenue"),
+        "sum_engagement_util_topk_blended": util("merged_result", "engagement_signal"),
+        "sum_revenue_util_topk_blended": util("merged_result", "revenue_signal"),
+    })
+    stats = [
+        df.selectExpr(
+            f"'{col}' as metric",
+            f"mean({col}) as mean",
+            f"percentile_approx({col}, 0.5) as median",
+            f"percentile_approx({col}, array(0.25, 0.50, 0.75)) as quantiles",
+        )
+        for pair in METRIC_PAIRS for col in pair
+    ]
+    result = stats[0]
+    for s in stats[1:]:
+        result = result.unionByName(s, allowMissingColumns=True)
+    return result
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--master", default="local[*]")
+    parser.add_argument("--ks", type=int, nargs="+", default=[1, 2, 4, 8, 12, 24])
+    args = parser.parse_args()
+
+    config = BlendingConfig()
+    rows = make_synthetic_requests(args.requests)
+    print(f"📊 {args.requests:,} requests, K={config.k}")
+
+    inputs = BlendingInput.from_rows(rows)
+    blended = blend_batch(inputs, config, top_k=config.k)
+
+    def separate():
+        values = {}
+        fixed, mixed = fixed_slot_metrics(inputs, config.k), topk_metrics(blended, config.k)
+        for fixed_col, blended_col in METRIC_PAIRS:
+            values[fixed_col], values[blended_col] = fixed[fixed_col], mixed[blended_col]
+        return summarize_metrics(values)
+
+    separate_seconds = timed(separate)
+    fused_seconds = timed(lambda: summarize_metrics(metric_pack(blended, config.k)))
+    print(f"  numpy separate            : {separate_seconds:8.3f}s")
+    print(f"  numpy fused               : {fused_seconds:8.3f}s  ({separate_seconds / fused_seconds:.1f}x)")
+
+    deep = blend_batch(inputs, config, top_k=max(args.ks))
+    per_k_seconds = timed(lambda: [summarize_metrics(metric_pack(deep, k)) for k in args.ks])
+    cube_seconds = timed(lambda: summarize_cube(metric_cube(deep, args.ks)))
+    print(f"  numpy per-K ({len(args.ks)} cut-offs)  : {per_k_seconds:8.3f}s")
+    print(f"  numpy cube                : {cube_seconds:8.3f}s  ({per_k_seconds / cube_seconds:.1f}x)")
+
+    spark = (
+        SparkSession.builder.master(args.master)
+        .config("spark.ui.enabled", "false")
+        .config("spark.ui.showConsoleProgress", "false")
+        .getOrCreate()
+    )
+    columns = PARSED_INPUT_SCHEMA.fieldNames()
+    df = spark.createDataFrame([tuple(row[c] for c in columns) for row in rows], PARSED_INPUT_SCHEMA)
+    df = with_merged_result(df, config).cache()
+    df.count()
+    notebook_metric_pack(df, config.k).collect()  # warm up
+    notebook_seconds = timed(lambda: notebook_metric_pack(df, config.k).collect())
+    spark_fused_seconds = timed(lambda: metric_pack_summary(df, config.k).collect())
+    print(f"  spark notebook (6 scans)  : {notebook_seconds:8.3f}s")
+    print(f"  spark fused (1 agg)       : {spark_fused_seconds:8.3f}s  "
+          f"({notebook_seconds / spark_fused_seconds:.1f}x)")
+
+    deep_df = with_merged_result(df.drop("merged_result"), config, top_k=max(args.ks)).cache()
+    deep_df.count()
+    spark_per_k_seconds = timed(lambda: [metric_pack_summary(deep_df, k).collect() for k in args.ks])
+    spark_cube_seconds = timed(lambda: metric_cube_summary(deep_df, args.ks).collect())
+    print(f"  spark per-K summaries     : {spark_per_k_seconds:8.3f}s")
+    print(f"  spark cube (1 agg)        : {spark_cube_seconds:8.3f}s  "
+          f"({spark_per_k_seconds / spark_cube_seconds:.1f}x)")
+    spark.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Per-row time of the heap-based multi-source blender against the two-source reference, and its growth with sources
+
+Usage:
+    python -m scripts.benchmark_multi_source_blending --requests 5000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src.algorithms.blending_algorithm import merge_sort_blending_dedup
+from src.algorithms.multi_source_blending import ads_source, blend_ads_and_nv, blend_sources, nv_source
+from src.config.blending_config import BlendingConfig
+from src.utils.synthetic_data import make_synthetic_requests
+from scripts.benchmark_blend_memo import reference_args
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def split_sources(row, config, n_sources, rng):
+    """The row's ads dealt round-robin into ``n_sources - 1`` paid sources, plus its NV source."""
+    paid = [
+        ads_source(
+            row["ad_quality_score_array"][s::n_sources - 1], row["ad_expected_value_array"][s::n_sources - 1],
+            row["ad_sorted_card_position_array"][s::n_sources - 1], row["ad_unhashed_bms_id_array"][s::n_sources - 1],
+            config.alpha, int(rng.integers(1, 4)), name=f"paid_{s}",
+        )
+        for s in range(n_sources - 1)
+    ]
+    nv = nv_source(row["nv_pctr_array"], row["nv_sorted_card_position_array"], row["nv_unhashed_bms_id_array"],
+                   config.effective_beta, config.min_nv_block_size)
+    return paid + [nv]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    rows = make_synthetic_requests(args.requests, seed=1)
+    config = BlendingConfig()
+    calls = [reference_args(row, config) for row in rows]
+    print(f"📊 {args.requests:,} requests")
+
+    expected, reference = timed(lambda: [merge_sort_blending_dedup(*a) for a in calls])
+    merged, heap = timed(lambda: [blend_ads_and_nv(*a) for a in calls])
+    assert merged == expected
+    print(f"  reference (2 sources)    : {reference / args.requests * 1e6:8.1f} us/row")
+    print(f"  blend_sources (2 sources): {heap / args.requests * 1e6:8.1f} us/row")
+
+    rng = np.random.default_rng(0)
+    for n_sources in (3, 5, 9):
+        sources = [split_sources(row, config, n_sources, rng) for row in rows]
+        merged, seconds = timed(lambda: [blend_sources(s) for s in sources])
+        items = sum(len(m) for m in merged)
+        print(f"  blend_sources ({n_sources} sources): {seconds / args.requests * 1e6:8.1f} us/row, "
+              f"{seconds / items * 1e6:.2f} us/placed item")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Exact optimal blend against the greedy merge: solver time and the greedy's optimality gap
+
+Usage:
+    python -m scripts.benchmark_optimal_blending --requests 100000
+"""
+import argparse
+import time
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.algorithms.interning import intern_ids
+from src.config.blending_config import BlendingConfig
+from src.evaluation.optimal_blending import DEFAULT_CHUNK_SIZE, optimal_blend, optimality_gap, summarize_gap
+from src.utils.synthetic_data import make_synthetic_requests
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="requests per DP chunk")
+    args = parser.parse_args()
+
+    inputs = intern_ids(BlendingInput.from_rows(make_synthetic_requests(args.requests)))
+    config = BlendingConfig()
+    print(f"📊 {args.requests:,} interned requests, top-{config.k}")
+
+    _, greedy_seconds = timed(lambda: blend_batch(inputs, config, top_k=config.k))
+    _, optimal_seconds = timed(lambda: optimal_blend(inputs, config, chunk_size=args.chunk_size))
+    print(f"  greedy blend_batch   : {greedy_seconds:8.3f}s")
+    print(f"  optimal_blend (DP)   : {optimal_seconds:8.3f}s "
+          f"({optimal_seconds / args.requests * 1e6:.1f} us/request)")
+
+    summary = summarize_gap(optimality_gap(inputs, config, chunk_size=args.chunk_size))
+    print(summary.to_string(float_format=lambda x: f"{x:.4f}"))
+
+
+if __name__ == "__main__":
+    main()
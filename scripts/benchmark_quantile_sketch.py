@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Multi-day metric percentiles: rescanning every day vs merging stored daily sketches
+
+Usage:
+    python -m scripts.benchmark_quantile_sketch --requests 20000 --days 7
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.config.blending_config import BlendingConfig
+from src.evaluation.blending_metrics import metric_pack
+from src.evaluation.grid_evaluation import summarize_metrics
+from src.evaluation.quantile_sketch import (
+    merge_metric_sketches,
+    metric_sketches,
+    sketch_summary,
+    sketches_from_bytes,
+    sketches_to_bytes,
+)
+from src.utils.synthetic_data import make_synthetic_requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000, help="requests per day")
+    parser.add_argument("--days", type=int, default=7)
+    args = parser.parse_args()
+
+    config = BlendingConfig()
+    days = [BlendingInput.from_rows(make_synthetic_requests(args.requests, seed=d)) for d in range(args.days)]
+
+    def day_metrics(inputs):
+        return metric_pack(blend_batch(inputs, config, top_k=config.k), config.k)
+
+    start = time.perf_counter()
+    packs = [day_metrics(inputs) for inputs in days]
+    exact = summarize_metrics({name: np.concatenate([p[name] for p in packs]) for name in packs[0]})
+    rescan_seconds = time.perf_counter() - start
+
+    # Daily job: one sketch set per day, stored as bytes.
+    stored = [sketches_to_bytes(metric_sketches(pack)) for pack in packs]
+    start = time.perf_counter()
+    merged = sketch_summary(merge_metric_sketches(sketches_from_bytes(data) for data in stored))
+    merge_seconds = time.perf_counter() - start
+
+    print(f"📊 {args.days} days x {args.requests:,} requests")
+    print(f"  rescan all days   : {rescan_seconds:8.3f}s")
+    print(f"  merge day sketches: {merge_seconds:8.3f}s  ({rescan_seconds / merge_seconds:.0f}x), "
+          f"{np.mean([len(s) for s in stored]) / 1024:.1f} KiB stored per day")
+    for name, want, got in zip(exact.metric, exact.quantiles, merged.quantiles):
+        values = np.sort(np.concatenate([p[name] for p in packs]))
+        ranks = (np.searchsorted(values, got, side="right") - np.searchsorted(values, want, side="right"))
+        print(f"  {name:34s} quartiles {np.round(got, 3)} (exact {np.round(want, 3)}, "
+              f"max rank shift {np.abs(ranks).max() / len(values):.2%})")
+
+
+if __name__ == "__main__":
+    main()
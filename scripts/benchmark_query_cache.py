@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Cost of a query cache miss (write) and hit (memory-mapped reopen) on a synthetic snapshot
+
+Usage:
+    python -m scripts.benchmark_query_cache --requests 200000
+"""
+import argparse
+import tempfile
+import time
+
+import pyarrow as pa
+
+from src.utils.list_parsing import RAW_LIST_COLUMNS
+from src.utils.query_cache import QueryCache
+from src.utils.synthetic_data import make_synthetic_requests, to_raw_rows
+
+QUERY = "SELECT * FROM proddb.duocheng.FINAL_BLENDING_LONG_INPUT_UPTO_0721"
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200000)
+    args = parser.parse_args()
+
+    raw_rows = to_raw_rows(make_synthetic_requests(args.requests))
+    snapshot = pa.table({raw: pa.array([row[raw] for row in raw_rows], pa.string()) for raw, _, _ in RAW_LIST_COLUMNS})
+    mib = snapshot.nbytes / 2 ** 20
+    print(f"📊 {args.requests:,} requests, {mib:.1f} MiB snapshot")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = QueryCache(tmp)
+        _, miss = timed(lambda: cache.load(QUERY, lambda query: snapshot))
+        allocated = pa.total_allocated_bytes()
+        table, hit = timed(lambda: cache.load(QUERY, lambda query: snapshot))
+        allocated = pa.total_allocated_bytes() - allocated
+        assert table.equals(snapshot)
+        print(f"  miss (write entry)   : {miss:8.3f}s  ({mib / miss:8.1f} MiB/s)")
+        print(f"  hit (mmap reopen)    : {hit * 1e3:8.2f}ms, {allocated / 2 ** 20:.1f} MiB newly allocated")
+
+
+if __name__ == "__main__":
+    main()
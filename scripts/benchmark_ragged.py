@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Memory and speed of the ragged-array inputs vs object-dtype pandas list columns
+
+Usage:
+    python -m scripts.benchmark_ragged --requests 100000
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from src.algorithms.batch_blending import (
+    AD_BMS_ID_COL,
+    AD_COLUMNS,
+    AD_QUALITY_SCORE_COL,
+    NV_BMS_ID_COL,
+    NV_COLUMNS,
+    NV_PCTR_COL,
+    BlendingInput,
+)
+from src.utils.ragged import RaggedArrays
+from src.utils.synthetic_data import make_synthetic_requests
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def traced(fn):
+    """Result of ``fn`` and the Python-heap MiB it still holds."""
+    tracemalloc.start()
+    result = fn()
+    held = tracemalloc.get_traced_memory()[0] / 2 ** 20
+    tracemalloc.stop()
+    return result, held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=100000)
+    args = parser.parse_args()
+
+    n = args.requests
+    table = pa.Table.from_pandas(pd.DataFrame(make_synthetic_requests(n)), preserve_index=False)
+    print(f"📊 {n:,} requests, {table.nbytes / 2 ** 20:.1f} MiB as Arrow")
+
+    frame, frame_mib = traced(table.to_pandas)
+    inputs, ragged_mib = traced(lambda: BlendingInput.from_arrow(table))
+    print(f"  held memory      : pandas {frame_mib:8.1f} MiB, ragged {ragged_mib:8.1f} MiB "
+          f"({frame_mib / ragged_mib:.1f}x)")
+    # Without the string ids, whose Python str objects dominate both layouts.
+    numeric = table.drop_columns([AD_BMS_ID_COL, NV_BMS_ID_COL])
+    _, frame_mib = traced(numeric.to_pandas)
+    _, ragged_mib = traced(lambda: (RaggedArrays.from_arrow(numeric, AD_COLUMNS[:3]),
+                                    RaggedArrays.from_arrow(numeric, NV_COLUMNS[:2])))
+    print(f"  numeric columns  : pandas {frame_mib:8.1f} MiB, ragged {ragged_mib:8.1f} MiB "
+          f"({frame_mib / ragged_mib:.1f}x)")
+
+    pandas_seconds = timed(table.to_pandas)
+    ragged_seconds = timed(lambda: BlendingInput.from_arrow(table))
+    print(f"  load from Arrow  : pandas {pandas_seconds:8.3f}s, ragged {ragged_seconds:8.3f}s "
+          f"({pandas_seconds / ragged_seconds:.1f}x)")
+
+    def pandas_sums():
+        return (frame[AD_QUALITY_SCORE_COL].map(sum).to_numpy(), frame[NV_PCTR_COL].map(sum).to_numpy())
+
+    def ragged_sums():
+        return tuple(
+            np.bincount(
+                np.repeat(np.arange(len(group)), group.lengths), weights=group.values(name), minlength=len(group)
+            )
+            for group, name in ((inputs.ads, AD_QUALITY_SCORE_COL), (inputs.nv, NV_PCTR_COL))
+        )
+
+    for expected, got in zip(pandas_sums(), ragged_sums()):
+        np.testing.assert_allclose(expected, got)
+    pandas_seconds = timed(pandas_sums)
+    ragged_seconds = timed(ragged_sums)
+    print(f"  per-request sums : pandas {pandas_seconds:8.3f}s, ragged {ragged_seconds:8.3f}s "
+          f"({pandas_seconds / ragged_seconds:.1f}x)")
+
+    half = n // 2
+    pandas_seconds = timed(lambda: [frame.iloc[s:s + 1000] for s in range(0, half, 1000)])
+    ragged_seconds = timed(lambda: [inputs.slice(s, s + 1000) for s in range(0, half, 1000)])
+    print(f"  1000-row slices  : pandas {pandas_seconds:8.3f}s, ragged {ragged_seconds:8.3f}s "
+          f"({pandas_seconds / ragged_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Throughput of shared-memory sharded blending on 1/2/4/8 worker processes
+
+Usage:
+    python -m scripts.benchmark_sharded_blending --requests 400000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import time
+
+from src.algorithms.batch_blending import BlendingInput
+from src.algorithms.interning import intern_ids
+from src.config.blending_config import BlendingConfig
+from src.evaluation.sharded_blending import sharded_blend
+from src.utils.synthetic_data import make_synthetic_requests
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=400000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    inputs = intern_ids(BlendingInput.from_rows(make_synthetic_requests(args.requests, seed=1)))
+    config = BlendingConfig()
+    print(f"📊 {args.requests:,} requests, {os.cpu_count()} CPU(s)")
+    base = None
+    for workers in args.workers:
+        metrics, seconds = timed(lambda: sharded_blend(inputs, config, max_workers=workers))
+        base = base or seconds
+        print(f"  {workers:2d} worker(s): {seconds:8.3f}s, {metrics.requests / seconds:12,.0f} requests/s,"
+              f" speedup {base / seconds:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
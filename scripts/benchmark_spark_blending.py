@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Timing comparison of the Spark blending paths on a local SparkSession
+
+Usage:
+    python -m scripts.benchmark_spark_blending --requests 50000
+"""
+import argparse
+import time
+
+from pyspark.sql import DataFrame, SparkSession
+from pyspark.sql.functions import lit, udf
+
+from src.algorithms.blending_algorithm import merge_sort_blending_dedup
+from src.algorithms.spark_blending import PARSED_INPUT_SCHEMA, RESULT_SCHEMA, with_merged_result
+from src.algorithms.spark_sql_blending import with_merged_result_sql
+from src.config.blending_config import BlendingConfig
+from src.utils.synthetic_data import make_synthetic_requests
+
+
+def with_merged_result_udf(df: DataFrame, config: BlendingConfig) -> DataFrame:
+    """The reference notebook's row-at-a-time udf."""
+    merge_sort_blending_udf = udf(merge_sort_blending_dedup, RESULT_SCHEMA)
+    return df.withColumn("merged_result", merge_sort_blending_udf(
+        df["ad_quality_score_array"], df["ad_expected_value_array"], df["nv_pctr_array"],
+        lit(config.alpha), lit(config.beta),
+        df["ad_sorted_card_position_array"], df["nv_sorted_card_position_array"],
+        lit(config.max_ads_block_size), lit(config.min_nv_block_size),
+        df["ad_unhashed_bms_id_array"], df["nv_unhashed_bms_id_array"],
+    ))
+
+
+def time_blend(df: DataFrame) -> float:
+    start = time.perf_counter()
+    df.write.format("noop").mode("overwrite").save()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--partitions", type=int, default=4)
+    parser.add_argument("--master", default="local[*]")
+    args = parser.parse_args()
+
+    spark = (
+        SparkSession.builder.master(args.master)
+        .config("spark.ui.enabled", "false")
+        .config("spark.ui.showConsoleProgress", "false")
+        .getOrCreate()
+    )
+    config = BlendingConfig()
+    rows = make_synthetic_requests(args.requests)
+    columns = PARSED_INPUT_SCHEMA.fieldNames()
+    df = spark.createDataFrame([tuple(row[c] for c in columns) for row in rows], PARSED_INPUT_SCHEMA)
+    df = df.repartition(args.partitions).cache()
+    df.count()
+
+    paths = {
+        "python udf (reference)": lambda: with_merged_result_udf(df, config),
+        "mapInArrow batch engine": lambda: with_merged_result(df, config),
+        "spark sql aggregate": lambda: with_merged_result_sql(df, config),
+    }
+    print(f"📊 {args.requests:,} requests, {args.partitions} partitions, master={args.master}")
+    timings = {}
+    for name, build in paths.items():
+        time_blend(build())  # warm up the Python workers and the JIT
+        timings[name] = time_blend(build())
+        print(f"  {name:26s}: {timings[name]:8.3f}s  ({args.requests / timings[name]:10,.0f} requests/s)")
+    baseline = timings["python udf (reference)"]
+    for name, seconds in timings.items():
+        print(f"  speedup {name:18s}: {baseline / seconds:6.1f}x")
+    spark.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Peak memory and time of streaming blending over a growing number of daily partitions, against loading them whole
+
+Usage:
+    python -m scripts.benchmark_streaming --days 8 --requests 100000
+"""
+import argparse
+import multiprocessing
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.config.blending_config import BlendingConfig
+from src.evaluation.blending_metrics import metric_pack
+from src.evaluation.streaming import stream_blend
+from src.utils.synthetic_data import make_synthetic_requests
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def write_days(root, days, requests):
+    rows = make_synthetic_requests(requests, seed=1)
+    table = pa.Table.from_pylist(rows)
+    for d in range(days):
+        pq.write_to_dataset(table.append_column("date", pa.array([f"2025-07-{d + 1:02d}"] * requests)),
+                            root, partition_cols=["date"], row_group_size=16384)
+
+
+def peak_rss_mib():
+    """High-water RSS of this process image (``ru_maxrss`` would carry the parent's over ``exec``)."""
+    with open("/proc/self/status") as status:
+        line = next(line for line in status if line.startswith("VmHWM:"))
+    return int(line.split()[1]) / 1024
+
+
+def run(mode, root, days):
+    """Time and peak RSS (MiB) of one run, in a fresh process."""
+    config = BlendingConfig()
+    dates = [f"2025-07-{d + 1:02d}" for d in range(days)]
+    dataset = ds.dataset(root, format="parquet", partitioning="hive")
+    selected = ds.field("date").isin(dates)
+    if mode == "stream":
+        _, seconds = timed(lambda: stream_blend(dataset, config, group_by="date", filter=selected))
+    else:
+        def load_whole():
+            inputs = BlendingInput.from_arrow(dataset.to_table(filter=selected).combine_chunks().to_batches()[0])
+            return metric_pack(blend_batch(inputs, config, top_k=config.k), config.k)
+        _, seconds = timed(load_whole)
+    return seconds, peak_rss_mib()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100000, help="requests per day")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as root:
+        write_days(root, args.days, args.requests)
+        print(f"📊 up to {args.days} days x {args.requests:,} requests")
+        for days in sorted({1, max(args.days // 2, 1), args.days}):
+            for mode in ("stream", "whole"):
+                with context.Pool(1) as pool:
+                    seconds, peak = pool.apply(run, (mode, root, days))
+                print(f"  {mode:6s} {days:3d} day(s): {seconds:8.3f}s, peak RSS {peak:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ This package contains the core functionality for KPI estimation and content blen
 Modules:
 - data_pipelines: ETL processing for ad and NV data
 - algorithms: Core blending algorithms
+- evaluation: Blending metrics and parameter sweeps
 - analysis: Research and analysis scripts
 - utils: Shared utilities and helpers
 - config: Configuration management
@@ -0,0 +1,14 @@
+"""
+Algorithms Module
+
+Core blending algorithms for mixing sponsored ads and NV content.
+
+Modules:
+- blending_algorithm: Reference row-at-a-time merge-sort blending with dedup
+- batch_blending: Vectorized blending of many requests held in flat arrays
+- multi_source_blending: Heap-based blending of any number of ranked sources with per-source block rules
+- interning: Dense per-request int ids for the bms id dedup
+- blend_memo: Content-addressed memo of per-request blends, with hit-rate stats
+- spark_blending: Arrow (mapInArrow) path running the batch engine inside Spark
+- spark_sql_blending: Pure Spark SQL (aggregate over a sequence) blending expression
+"""
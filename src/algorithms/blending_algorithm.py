@@ -0,0 +1,119 @@
+"""
+Reference Blending Algorithm
+
+Clean copy of ``merge_sort_blending_dedup`` from
+``reference/blending_algorithms/Blending algorithm & analysis (dedup).py``.
+The logic is kept line-for-line identical (including its quirks) because it
+is the ground truth every faster implementation is tested against.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+
+def merge_sort_blending_dedup(
+    ads_expected_engagement_utility: Sequence[float],
+    ads_expected_revenue_utility: Sequence[float],
+    nv_expected_engagement_utility: Sequence[float],
+    alpha: float,
+    beta: Optional[float],
+    ads_sorted_card_position: Sequence[int],
+    nv_sorted_card_position: Sequence[int],
+    max_ads_block_size: int,
+    min_nv_block_size: int,
+    ads_bms_id: Sequence[Any],
+    nv_bms_id: Sequence[Any],
+) -> List[Dict[str, Any]]:
+    """Blend one request's ad and NV lists into a single ranked list.
+
+    Returns a list of dicts with ``source``, ``revenue_signal``,
+    ``engagement_signal``, ``index`` and ``original_card_position``.
+    """
+    if not beta:
+        beta = alpha
+    i = j = 0
+    merged = []
+
+    consecutive_ads_count = 0
+    consecutive_nv_count = 0
+    must_insert_nv = False
+    placed_item_id = set()
+
+    def insert_nv_to_merged(j):
+        merged.append({
+            "source": "nv",
+            "revenue_signal": 0.0,
+            "engagement_signal": nv_expected_engagement_utility[j],
+            "index": j,
+            "original_card_position": nv_sorted_card_position[j],
+        })
+        placed_item_id.add(nv_bms_id[j])
+
+    def insert_ads_to_merged(i):
+        merged.append({
+            "source": "ads",
+            "revenue_signal": ads_expected_revenue_utility[i],
+            "engagement_signal": ads_expected_engagement_utility[i],
+            "index": i,
+            "original_card_position": ads_sorted_card_position[i],
+        })
+        placed_item_id.add(ads_bms_id[i])
+
+    def compare_ads_to_nv(i, j):
+        return (
+            ads_expected_revenue_utility[i] + alpha * ads_expected_engagement_utility[i]
+            > beta * nv_expected_engagement_utility[j]
+        )
+
+    while i < len(ads_expected_engagement_utility) or j < len(nv_expected_engagement_utility):
+        # de-duplication
+        if i < len(ads_expected_engagement_utility) and (ads_bms_id[i] in placed_item_id):
+            i += 1
+            continue
+        if j < len(nv_expected_engagement_utility) and (nv_bms_id[j] in placed_item_id):
+            j += 1
+            continue
+
+        while must_insert_nv:
+            if j < len(nv_expected_engagement_utility):
+                insert_nv_to_merged(j)
+                j += 1
+                consecutive_nv_count += 1
+
+                if consecutive_nv_count >= min_nv_block_size:
+                    must_insert_nv = False
+                    consecutive_nv_count = 0
+            else:
+                must_insert_nv = False
+                consecutive_nv_count = 0
+
+        if i < len(ads_expected_engagement_utility) and j < len(nv_expected_engagement_utility):
+            if consecutive_ads_count >= max_ads_block_size:
+                must_insert_nv = True
+                consecutive_ads_count = 0
+                continue
+
+            if compare_ads_to_nv(i, j):
+                insert_ads_to_merged(i)
+                i += 1
+                consecutive_ads_count += 1
+            else:
+                insert_nv_to_merged(j)
+                j += 1
+                consecutive_nv_count += 1
+
+                if consecutive_ads_count:
+                    must_insert_nv = True
+                    consecutive_ads_count = 0
+
+        elif i < len(ads_expected_engagement_utility):
+            if consecutive_ads_count >= max_ads_block_size:
+                break
+
+            insert_ads_to_merged(i)
+            i += 1
+            consecutive_ads_count += 1
+
+        elif j < len(nv_expected_engagement_utility):
+            j += 1
+
+    return merged
@@ -0,0 +1,84 @@
+"""
+Bms Id Interning
+
+Maps the bms ids of every request to dense per-request int32 ids
+(``0 .. n_ids[r] - 1``, shared by the ad and NV lists of request ``r``), so
+the blend can dedup with a flag-array lookup instead of hashing strings on
+every step. Interning is done once, in the input prep; the grid evaluation
+and the alpha sweep reuse the interned input for every blend they run.
+
+Items are grouped by sorting a ``(request, id hash)`` key packed into one
+int64, then every item is compared with the first item of its group, so a
+hash collision is always detected; the rare batch with a collision is
+regrouped with exact codes from ``pandas.factorize``.
+"""
+
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.algorithms.batch_blending import BlendingInput, request_ids
+
+
+def _hash_codes(ids: np.ndarray) -> np.ndarray:
+    if ids.dtype.kind in "iu":
+        return ids.astype(np.int64)
+    return np.fromiter(map(hash, ids), dtype=np.int64, count=len(ids))
+
+
+def _group(
+    ids: np.ndarray, owner: np.ndarray, codes: np.ndarray, n: int
+) -> Tuple[np.ndarray, np.ndarray, bool]:
+    """Dense per-request group number of every item, groups per request, and whether groups hold equal ids only."""
+    owner_bits = max(int(n).bit_length(), 1)
+    code_mask = np.int64((1 << (63 - owner_bits)) - 1)
+    key = (owner << np.int64(63 - owner_bits)) | (codes & code_mask)
+    order = np.argsort(key, kind="stable")
+    sorted_key = key[order]
+    starts = np.ones(len(key), dtype=bool)
+    starts[1:] = sorted_key[1:] != sorted_key[:-1]
+    group = np.cumsum(starts) - 1
+    first = np.flatnonzero(starts)
+    duplicate = ~starts
+    exact = bool(np.all(ids[order[duplicate]] == ids[order[first[group[duplicate]]]]))
+
+    sorted_owner = owner[order]
+    n_ids = np.bincount(sorted_owner[starts], minlength=n)
+    request_first_group = np.cumsum(n_ids) - n_ids
+    dense = np.empty(len(key), dtype=np.int32)
+    dense[order] = group - request_first_group[sorted_owner]
+    return dense, n_ids, exact
+
+
+def intern_ids(inputs: BlendingInput) -> BlendingInput:
+    """Copy of ``inputs`` with per-request dense int32 bms ids (no-op if already interned)."""
+    if inputs.n_ids is not None:
+        return inputs
+    n = len(inputs)
+    ad_lo, ad_hi = inputs.ad_offsets[0], inputs.ad_offsets[-1]
+    nv_lo, nv_hi = inputs.nv_offsets[0], inputs.nv_offsets[-1]
+    n_ads = ad_hi - ad_lo
+    ids = np.concatenate([np.asarray(inputs.ad_bms_id[ad_lo:ad_hi]), np.asarray(inputs.nv_bms_id[nv_lo:nv_hi])])
+    owner = np.concatenate([request_ids(inputs.ad_offsets), request_ids(inputs.nv_offsets)])
+
+    dense, n_ids, exact = _group(ids, owner, _hash_codes(ids), n)
+    if not exact:
+        dense, n_ids, _ = _group(ids, owner, pd.factorize(ids)[0].astype(np.int64), n)
+
+    ad_ids = np.zeros(len(inputs.ad_bms_id), dtype=np.int32)
+    nv_ids = np.zeros(len(inputs.nv_bms_id), dtype=np.int32)
+    ad_ids[ad_lo:ad_hi] = dense[:n_ads]
+    nv_ids[nv_lo:nv_hi] = dense[n_ads:]
+    return BlendingInput(
+        ad_quality_score=inputs.ad_quality_score,
+        ad_expected_value=inputs.ad_expected_value,
+        ad_card_position=inputs.ad_card_position,
+        ad_bms_id=ad_ids,
+        ad_offsets=inputs.ad_offsets,
+        nv_pctr=inputs.nv_pctr,
+        nv_card_position=inputs.nv_card_position,
+        nv_bms_id=nv_ids,
+        nv_offsets=inputs.nv_offsets,
+        n_ids=n_ids,
+    )
@@ -0,0 +1,287 @@
+"""
+Multi-Source Blending
+
+Row-at-a-time blending of any number of ranked sources (ads, NV, sponsored
+brands, ...) into one list. Every source is a ``BlendSource``: its items in
+ranked order, the per-item utility the blend compares, and its own block
+rules. No source is special-cased; with an ads source and an NV source built
+by ``ads_source`` and ``nv_source`` the result is that of
+``merge_sort_blending_dedup``, which is the two-source case of the rules
+below:
+
+- The head of every source is its next item; heads whose bms id is already
+  placed are skipped.
+- While two or more sources have items left, the head with the highest
+  utility is placed (on ties, the source listed first). A source with
+  ``max_block_size`` whose run reaches that size owes a block to another
+  source: the best head of the other sources starts a forced block. A
+  ``max_block_size`` of 0 is reached with no run at all, so such a source
+  keeps forcing blocks of the others, as the reference does for ads.
+- A source with ``min_block_size`` that takes over from another source's
+  run also starts a forced block. A forced block keeps placing the forcing
+  source's heads until that source's item count reaches
+  ``min_block_size`` (at least one item, counting the items placed since
+  its last forced block), as the reference does; those heads skip the id
+  check.
+- Once a single source has items left, it keeps placing them up to its
+  ``max_block_size`` run if it ``fills_tail``; otherwise the blend ends (the
+  reference drops the NV items left after the last ad).
+
+Heads wait in a heap keyed by utility, and an index from bms id to the
+sources whose head carries it finds the heads a placement makes duplicates,
+so a blend takes ``O(total items * log(number of sources))``.
+"""
+
+import heapq
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+@dataclass
+class BlendSource:
+    """One ranked list of items to blend.
+
+    Args:
+        name: Value of ``source`` in the blended records.
+        utility: Per-item value compared across sources.
+        engagement_signal: Per-item engagement signal of the records.
+        card_position: Per-item original card position of the records.
+        bms_id: Per-item id; an id is placed at most once across sources.
+        revenue_signal: Per-item revenue signal; 0 for every item when None.
+        max_block_size: Longest run of this source (no limit when None).
+        min_block_size: Forced block length when this source takes over
+            from another source's run (no forced block when None).
+        fills_tail: Whether the source keeps placing items once it is the
+            only source with items left.
+    """
+
+    name: str
+    utility: Sequence[float]
+    engagement_signal: Sequence[float]
+    card_position: Sequence[int]
+    bms_id: Sequence[Any]
+    revenue_signal: Optional[Sequence[float]] = None
+    max_block_size: Optional[int] = None
+    min_block_size: Optional[int] = None
+    fills_tail: bool = True
+
+    def __len__(self) -> int:
+        return len(self.utility)
+
+    def record(self, p: int) -> Dict[str, Any]:
+        """Item ``p`` in the reference's blended-record format."""
+        return {
+            "source": self.name,
+            "revenue_signal": 0.0 if self.revenue_signal is None else self.revenue_signal[p],
+            "engagement_signal": self.engagement_signal[p],
+            "index": p,
+            "original_card_position": self.card_position[p],
+        }
+
+
+def ads_source(
+    quality_score: Sequence[float],
+    expected_value: Sequence[float],
+    card_position: Sequence[int],
+    bms_id: Sequence[Any],
+    alpha: float,
+    max_block_size: Optional[int],
+    name: str = "ads",
+) -> BlendSource:
+    """Source of paid items: utility ``expected_value + alpha * quality_score``, ranked as given."""
+    utility = (np.asarray(expected_value, dtype=float) + alpha * np.asarray(quality_score, dtype=float)).tolist()
+    return BlendSource(
+        name=name,
+        utility=utility,
+        engagement_signal=quality_score,
+        card_position=card_position,
+        bms_id=bms_id,
+        revenue_signal=expected_value,
+        max_block_size=max_block_size,
+    )
+
+
+def nv_source(
+    pctr: Sequence[float],
+    card_position: Sequence[int],
+    bms_id: Sequence[Any],
+    beta: float,
+    min_block_size: Optional[int],
+    name: str = "nv",
+) -> BlendSource:
+    """Source of organic items: utility ``beta * pctr``; it does not fill the tail."""
+    return BlendSource(
+        name=name,
+        utility=(beta * np.asarray(pctr, dtype=float)).tolist(),
+        engagement_signal=pctr,
+        card_position=card_position,
+        bms_id=bms_id,
+        min_block_size=min_block_size,
+        fills_tail=False,
+    )
+
+
+class _Heads:
+    """Head of every source, the utility heap and the duplicate tracking."""
+
+    def __init__(self, sources: Sequence[BlendSource]):
+        self.sources = sources
+        self.position = [0] * len(sources)
+        self.heap = []
+        self.placed = set()
+        self.by_id = defaultdict(set)  # bms id -> sources whose clean head carries it
+        self.duplicates = []  # (source, position) of heads whose id is placed
+        self.remaining = 0
+        for r in range(len(sources)):
+            if len(sources[r]):
+                self.remaining += 1
+                self._arrive(r)
+
+    def _arrive(self, r: int) -> None:
+        source, p = self.sources[r], self.position[r]
+        if source.bms_id[p] in self.placed:
+            self.duplicates.append((r, p))
+        else:
+            self.by_id[source.bms_id[p]].add(r)
+        heapq.heappush(self.heap, (-source.utility[p], r, p))
+
+    def advance(self, r: int) -> None:
+        source, p = self.sources[r], self.position[r]
+        self.by_id[source.bms_id[p]].discard(r)
+        self.position[r] = p + 1
+        if p + 1 < len(source):
+            self._arrive(r)
+        else:
+            self.remaining -= 1
+
+    def has_items(self, r: int) -> bool:
+        return self.position[r] < len(self.sources[r])
+
+    def place(self, r: int) -> Dict[str, Any]:
+        """Record of source ``r``'s head; marks the other heads carrying its id as duplicates."""
+        source, p = self.sources[r], self.position[r]
+        bms_id = source.bms_id[p]
+        self.placed.add(bms_id)
+        for q in self.by_id.pop(bms_id, ()):
+            if q != r:
+                self.duplicates.append((q, self.position[q]))
+        record = source.record(p)
+        self.advance(r)
+        return record
+
+    def skip_duplicates(self) -> None:
+        while self.duplicates:
+            r, p = self.duplicates.pop()
+            if self.position[r] == p:
+                self.advance(r)
+
+    def _drop_stale(self) -> None:
+        while self.heap and self.position[self.heap[0][1]] != self.heap[0][2]:
+            heapq.heappop(self.heap)
+
+    def best(self, exclude: int = -1) -> int:
+        """Source of the best head other than ``exclude`` (``-1`` if none)."""
+        self._drop_stale()
+        if not self.heap:
+            return -1
+        if self.heap[0][1] != exclude:
+            return self.heap[0][1]
+        top = heapq.heappop(self.heap)
+        self._drop_stale()
+        second = self.heap[0][1] if self.heap else -1
+        heapq.heappush(self.heap, top)
+        return second
+
+
+def blend_sources(sources: Sequence[BlendSource]) -> List[Dict[str, Any]]:
+    """Blend ranked ``sources`` into one list of records (see the module docstring for the rules)."""
+    heads = _Heads(sources)
+    merged = []
+    counts = [0] * len(sources)
+    run_source, run_length = -1, 0
+    must_insert = False
+    forced = -1  # source of the pending forced block
+    blocked = -1  # source whose full run asked for it, when ``forced`` is still to be picked
+    # Sources at their limit without a run: a limit of 0 blocks them from the start.
+    never_run = [r for r, s in enumerate(sources) if s.max_block_size is not None and s.max_block_size <= 0]
+
+    def at_limit(r: int) -> bool:
+        """Whether source ``r``'s run (0 when another source runs) has reached its ``max_block_size``."""
+        limit = sources[r].max_block_size
+        return limit is not None and (run_length if r == run_source else 0) >= limit
+
+    def place(r: int) -> None:
+        nonlocal run_source, run_length
+        merged.append(heads.place(r))
+        counts[r] += 1
+        run_length = run_length + 1 if r == run_source else 1
+        run_source = r
+
+    while heads.remaining:
+        heads.skip_duplicates()
+        if not heads.remaining:
+            break
+
+        if must_insert and forced < 0:
+            forced = heads.best(exclude=blocked)
+        while must_insert:
+            if forced >= 0 and heads.has_items(forced):
+                place(forced)
+                if counts[forced] >= (sources[forced].min_block_size or 0):
+                    must_insert = False
+                    counts[forced] = 0
+            else:
+                must_insert = False
+                if forced >= 0:
+                    counts[forced] = 0
+
+        if heads.remaining >= 2:
+            candidates = ([run_source] if run_source >= 0 else []) + never_run
+            full = next((r for r in candidates if heads.has_items(r) and at_limit(r)), -1)
+            if full >= 0:
+                must_insert, forced, blocked = True, -1, full
+                if full == run_source:
+                    run_length = 0
+                continue
+            r = heads.best()
+            took_over = run_source != r and run_length > 0
+            place(r)
+            if took_over and sources[r].min_block_size is not None:
+                must_insert, forced = True, r
+        elif heads.remaining == 1:
+            r = heads.best()
+            if not sources[r].fills_tail or at_limit(r):
+                break
+            place(r)
+    return merged
+
+
+def blend_ads_and_nv(
+    ads_expected_engagement_utility: Sequence[float],
+    ads_expected_revenue_utility: Sequence[float],
+    nv_expected_engagement_utility: Sequence[float],
+    alpha: float,
+    beta: Optional[float],
+    ads_sorted_card_position: Sequence[int],
+    nv_sorted_card_position: Sequence[int],
+    max_ads_block_size: int,
+    min_nv_block_size: int,
+    ads_bms_id: Sequence[Any],
+    nv_bms_id: Sequence[Any],
+) -> List[Dict[str, Any]]:
+    """``merge_sort_blending_dedup`` (same arguments, same result) as a two-source ``blend_sources``.
+
+    NV is listed first, so equal utilities go to NV as in the reference.
+    """
+    if not beta:
+        beta = alpha
+    return blend_sources([
+        nv_source(nv_expected_engagement_utility, nv_sorted_card_position, nv_bms_id, beta, min_nv_block_size),
+        ads_source(
+            ads_expected_engagement_utility, ads_expected_revenue_utility, ads_sorted_card_position, ads_bms_id,
+            alpha, max_ads_block_size,
+        ),
+    ])
@@ -0,0 +1,40 @@
+"""
+Blending Configuration
+
+Parameters of the utility-based merge-sort blending algorithm. Defaults match
+the blending config cell of the reference notebook.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class BlendingConfig:
+    """One set of blending knobs.
+
+    Attributes:
+        k: Number of top slots the metrics look at.
+        alpha: Weight of ad engagement in the ad utility ``rev + alpha * eng``.
+        beta: Weight of NV engagement. ``None`` (or 0) means ``beta = alpha``,
+            as in the reference implementation.
+        max_ads_block_size: Maximum number of consecutive ads.
+        min_nv_block_size: Minimum NV block inserted after an ads block.
+    """
+
+    k: int = 12
+    alpha: float = 20.0
+    beta: Optional[float] = None
+    max_ads_block_size: int = 3
+    min_nv_block_size: int = 2
+
+    @property
+    def effective_beta(self) -> float:
+        """Beta actually used by the comparison (``if not beta: beta = alpha``)."""
+        return float(self.beta) if self.beta else float(self.alpha)
+
+    @property
+    def table_suffix(self) -> str:
+        """Suffix used for per-config output tables, e.g. ``20_3_2``."""
+        alpha = int(self.alpha) if float(self.alpha).is_integer() else self.alpha
+        return f"{alpha}_{self.max_ads_block_size}_{self.min_nv_block_size}"
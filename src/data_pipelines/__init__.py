@@ -0,0 +1,15 @@
+"""
+Data Pipelines Module
+
+ETL processing for ad and NV data, run locally on Parquet inputs.
+
+Modules:
+- dag: Typed-stage DAG runner over DuckDB/Arrow, with in-memory hand-off and concurrent independent stages
+- ad_pipeline: The ad data pipeline (impression filter, funnel join, list grouping, session-key dedup)
+- nv_pipeline: The NV data pipeline (impression filter, sibyl log union and join, list grouping, dedup)
+- grouping: Single-sort list grouping (local lexsort + segments, or generated SQL) for the ARRAY_AGG steps
+- dedup: Single-pass unique-key filter (64-bit key hash counted locally, or a window-function rewrite)
+- materialization: Content-hash cache of stage outputs, so only changed stages and their dependents rerun
+- matching: The ad / NV match into final_blending_input, and the stage graph of one day
+- backfill: Multi-day scheduler running days concurrently, resuming from the days already written
+"""
@@ -0,0 +1,167 @@
+"""
+Ad Data Pipeline
+
+The four steps of ``ad data pipeline.py`` as a ``Pipeline`` over local
+tables, in DuckDB SQL but for the grouping and the dedup:
+
+1. ``ad_impression``: sponsored category-page impressions in USD of the day,
+   with the timestamp clipped to the minute and NULL keys as ``'null'``.
+2. ``ad_left_joined_table``: the day's category-placement funnel rows, left
+   joined with their impressions. The funnel filter is its own stage,
+   ``ad_funnel``, so it runs concurrently with step 1; a left join after
+   the filter is the notebook's filtered left join.
+3. ``ad_grouped_left_joined_table``: one row per ``AD_REQUEST_ID`` with the
+   ``MIN`` of the key columns and the ad lists ordered by card position
+   (unimpressed ads last, by descending expected value). The five lists
+   share one sort (``AD_GROUPING``, see ``grouping``); ties in card
+   position, which the notebook leaves unordered, go by expected value too.
+4. ``ad_grouped_left_joined_table_rm_dup``: requests whose (session, minute,
+   store, L1, L2) key no other request shares (``AD_DEDUP``, see ``dedup``).
+
+Snowflake functions are replaced by their DuckDB equivalents, and the
+lists skip NULLs as Snowflake's ``ARRAY_AGG`` does. The source tables keep
+their Snowflake names: ``fact_item_card_view_dedup`` and
+``fact_ads_item_request_funnel``. The run parameters are ``date``, the day
+as ``YYYY-MM-DD``, and ``placements`` (``AD_PARAMS``).
+"""
+
+from typing import Any, Mapping, Optional
+
+import pyarrow as pa
+
+from src.data_pipelines.dag import Pipeline, PipelineRun, Stage, TableSource
+from src.data_pipelines.dedup import UniqueKeyFilter
+from src.data_pipelines.grouping import ListColumn, ListGrouping, OrderKey
+from src.data_pipelines.materialization import MaterializationCache
+
+IMPRESSION_SOURCE = "fact_item_card_view_dedup"
+FUNNEL_SOURCE = "fact_ads_item_request_funnel"
+AD_OUTPUT = "ad_grouped_left_joined_table_rm_dup"
+AD_PARAMS = {
+    "placements": ("PLACEMENT_TYPE_SPONSORED_PRODUCTS_CATEGORY_L1", "PLACEMENT_TYPE_SPONSORED_PRODUCTS_CATEGORY_L2"),
+}
+DEDUP_KEY_COLUMNS = (
+    "DD_SESSION_ID_MIN",
+    "CLIPPED_IMPRESSION_TIMESTAMP_MIN",
+    "STORE_ID_MIN",
+    "L1_CATEGORY_ID_MIN",
+    "L2_CATEGORY_ID_MIN",
+)
+
+AD_IMPRESSION_SCHEMA = pa.schema([
+    ("CLIPPED_IMPRESSION_TIMESTAMP", pa.string()),
+    ("CARD_POSITION", pa.int64()),
+    ("DD_SESSION_ID", pa.string()),
+    ("STORE_ID", pa.string()),
+    ("L1_CATEGORY_ID", pa.string()),
+    ("L2_CATEGORY_ID", pa.string()),
+    ("IMPRESSION_EVENT_ID", pa.string()),
+    ("RECEIVED_AT", pa.date32()),
+])
+AD_FUNNEL_SCHEMA = pa.schema([
+    ("AD_REQUEST_ID", pa.string()),
+    ("AD_QUALITY_SCORE", pa.float64()),
+    ("EXPECTED_VALUE", pa.float64()),
+    ("TRUE_BID", pa.float64()),
+    ("UNHASHED_BMS_ID", pa.string()),
+    ("AD_RANK", pa.int32()),
+    ("IMPRESSION_EVENT_ID", pa.string()),
+])
+AD_JOINED_SCHEMA = pa.schema(list(AD_FUNNEL_SCHEMA)[:-1] + list(AD_IMPRESSION_SCHEMA))
+AD_GROUPED_SCHEMA = pa.schema(
+    [("AD_REQUEST_ID", pa.string())]
+    + [(name, pa.string()) for name in DEDUP_KEY_COLUMNS]
+    + [
+        ("AD_QUALITY_SCORE_LIST", pa.list_(pa.float64())),
+        ("UNHASHED_BMS_ID_LIST", pa.list_(pa.string())),
+        ("EXPECTED_VALUE_LIST", pa.list_(pa.float64())),
+        ("TRUE_BID_LIST", pa.list_(pa.float64())),
+        ("CARD_POSITION_LIST", pa.list_(pa.int64())),
+    ]
+)
+
+AD_IMPRESSION_SQL = """
+SELECT
+  STRFTIME(RECEIVED_AT, '%Y-%m-%d %H:%M') AS CLIPPED_IMPRESSION_TIMESTAMP,
+  CARD_POSITION,
+  COALESCE(DD_SESSION_ID, 'null') AS DD_SESSION_ID,
+  COALESCE(CAST(STORE_ID AS VARCHAR), 'null') AS STORE_ID,
+  COALESCE(L1_CATEGORY_ID, 'null') AS L1_CATEGORY_ID,
+  COALESCE(L2_CATEGORY_ID, 'null') AS L2_CATEGORY_ID,
+  ID AS IMPRESSION_EVENT_ID,
+  CAST(RECEIVED_AT AS DATE) AS RECEIVED_AT
+FROM fact_item_card_view_dedup
+WHERE IS_SPONSORED = TRUE AND FEATURE = 'category'
+  AND CAST(RECEIVED_AT AS DATE) = DATE '{date}'
+  AND CURRENCY = 'USD'
+"""
+
+AD_FUNNEL_SQL = """
+SELECT
+  AD_REQUEST_ID,
+  AD_QUALITY_SCORE,
+  EXPECTED_VALUE,
+  TRUE_BID,
+  BUSINESS_MERCHANT_SUPPLIED_ID AS UNHASHED_BMS_ID,
+  CAST(JSON_EXTRACT(PRICING_METADATA, '$.adRank') AS INTEGER) AS AD_RANK,
+  IMPRESSION_EVENT_ID
+FROM fact_ads_item_request_funnel
+WHERE CAST(AUCTION_OCCURRED_AT AS DATE) = DATE '{date}'
+  AND PLACEMENT IN ({placements})
+"""
+
+AD_JOIN_SQL = """
+SELECT
+  ad_funnel.* EXCLUDE (IMPRESSION_EVENT_ID),
+  ad_imp.*
+FROM ad_funnel
+LEFT JOIN ad_impression ad_imp
+  ON ad_imp.IMPRESSION_EVENT_ID = ad_funnel.IMPRESSION_EVENT_ID
+"""
+
+AD_GROUPING = ListGrouping(
+    "ad_left_joined_table",
+    "AD_REQUEST_ID",
+    mins=tuple(key[:-len("_MIN")] for key in DEDUP_KEY_COLUMNS),
+    lists=(
+        ListColumn("AD_QUALITY_SCORE_LIST", "AD_QUALITY_SCORE"),
+        ListColumn("UNHASHED_BMS_ID_LIST", "UNHASHED_BMS_ID"),
+        ListColumn("EXPECTED_VALUE_LIST", "EXPECTED_VALUE"),
+        ListColumn("TRUE_BID_LIST", "TRUE_BID"),
+        ListColumn("CARD_POSITION_LIST", "CARD_POSITION", fill=99999),
+    ),
+    order=(OrderKey("CARD_POSITION"), OrderKey("EXPECTED_VALUE", descending=True)),
+)
+AD_DEDUP = UniqueKeyFilter("ad_grouped_left_joined_table", DEDUP_KEY_COLUMNS)
+
+
+def ad_pipeline() -> Pipeline:
+    """The ad data pipeline's stages."""
+    return Pipeline([
+        Stage("ad_impression", (IMPRESSION_SOURCE,), sql=AD_IMPRESSION_SQL, schema=AD_IMPRESSION_SCHEMA),
+        Stage("ad_funnel", (FUNNEL_SOURCE,), sql=AD_FUNNEL_SQL, schema=AD_FUNNEL_SCHEMA),
+        Stage("ad_left_joined_table", ("ad_funnel", "ad_impression"), sql=AD_JOIN_SQL, schema=AD_JOINED_SCHEMA),
+        Stage("ad_grouped_left_joined_table", ("ad_left_joined_table",), fn=AD_GROUPING, schema=AD_GROUPED_SCHEMA,
+              params=()),
+        Stage(AD_OUTPUT, ("ad_grouped_left_joined_table",), fn=AD_DEDUP, schema=AD_GROUPED_SCHEMA, params=()),
+    ])
+
+
+def run_ad_pipeline(
+    sources: Mapping[str, TableSource],
+    date: str,
+    max_workers: Optional[int] = None,
+    materialize: Optional[str] = None,
+    cache: Optional[MaterializationCache] = None,
+    dry_run: bool = False,
+    **params: Any,
+) -> PipelineRun:
+    """Run the ad pipeline for one day; ``outputs[AD_OUTPUT]`` is the deduplicated grouped table.
+
+    ``params`` override ``AD_PARAMS``; the other arguments are those of
+    ``Pipeline.run``.
+    """
+    return ad_pipeline().run(
+        sources, dict(AD_PARAMS, **params, date=date), max_workers=max_workers, materialize=materialize,
+        cache=cache, dry_run=dry_run,
+    )
@@ -0,0 +1,418 @@
+"""
+Pipeline DAG
+
+Runs the notebooks' ETL steps locally as a DAG of typed stages. A stage
+reads the tables named in ``inputs`` (source tables or other stages) and
+returns one Arrow table, either from a DuckDB query in which every input is
+registered under its name, or from a Python function of the input tables.
+Stage SQL may hold ``{name}`` placeholders filled from the run parameters
+(e.g. ``{date}``, or ``IN ({placements})`` for a list of values).
+
+``Pipeline.run`` starts every stage as soon as its inputs are ready, on a
+thread pool (DuckDB releases the GIL while it executes), and hands results
+to downstream stages in memory: no table is written out and read back as
+with ``write_data_to_snowflake``. Intermediate results are dropped once
+their last consumer has run. Passing ``materialize`` writes every stage
+result to Parquet and reads it back instead, like the notebooks' flow.
+
+Source tables are Arrow tables or Parquet paths; paths are registered as
+Arrow datasets, so DuckDB pushes projections and filters into the scan.
+
+With a ``MaterializationCache`` (see ``materialization``), stages whose
+fingerprint is cached are loaded instead of run, and ``dry_run`` returns the
+plan of what would run without running it.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import string
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple, Union
+
+import duckdb
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.data_pipelines.materialization import (
+    STATUS_CACHED,
+    STATUS_RUN,
+    STATUS_SKIPPED,
+    MaterializationCache,
+    StagePlan,
+    source_fingerprint,
+)
+from src.utils.query_cache import normalize_query
+
+TableSource = Union[str, pa.Table, ds.Dataset]
+StageFunction = Callable[[Mapping[str, pa.Table], Mapping[str, Any]], pa.Table]
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One step of a pipeline.
+
+    Args:
+        name: Name of the stage's output table, as downstream stages read it.
+        inputs: Names of the source tables and stages the stage reads.
+        sql: DuckDB query over the inputs; ``{param}`` placeholders are
+            filled from the run parameters.
+        fn: Alternative to ``sql``: ``fn(tables, params)`` with the input
+            tables keyed by name.
+        schema: Output schema; the result is cast to it (and reduced to its
+            columns), and a result that does not fit raises ``ValueError``.
+        params: Run parameters ``fn`` reads (all of them when None); SQL
+            stages read the parameters of their placeholders.
+        version: Bumped by hand to invalidate cached outputs when logic
+            outside the stage (e.g. a helper ``fn`` calls) changes.
+    """
+
+    name: str
+    inputs: Tuple[str, ...]
+    sql: Optional[str] = None
+    fn: Optional[StageFunction] = None
+    schema: Optional[pa.Schema] = None
+    params: Optional[Tuple[str, ...]] = None
+    version: str = ""
+
+    def __post_init__(self):
+        if (self.sql is None) == (self.fn is None):
+            raise ValueError(f"stage {self.name!r} needs exactly one of sql and fn")
+
+    def parameters(self, params: Mapping[str, Any]) -> Dict[str, Any]:
+        """The run parameters the stage reads."""
+        if self.sql is not None:
+            names = {field for _, field, _, _ in string.Formatter().parse(self.sql) if field}
+        else:
+            names = set(params) if self.params is None else set(self.params)
+        missing = names - set(params)
+        if missing:
+            raise KeyError(f"stage {self.name!r} needs parameters {sorted(missing)}")
+        return {name: params[name] for name in sorted(names)}
+
+    def fingerprint(self, params: Mapping[str, Any], input_fingerprints: Sequence[str]) -> str:
+        """Hash of the stage's logic, schema, parameters and input fingerprints."""
+        if self.sql is not None:
+            logic = normalize_query(self.sql)
+        else:
+            try:
+                logic = inspect.getsource(self.fn)
+            except (OSError, TypeError):
+                logic = f"{getattr(self.fn, '__module__', '')}.{getattr(self.fn, '__qualname__', repr(self.fn))}"
+        key = {
+            "name": self.name,
+            "logic": logic,
+            "schema": None if self.schema is None else self.schema.to_string(),
+            "params": self.parameters(params),
+            "version": self.version,
+            "inputs": list(input_fingerprints),
+        }
+        text = json.dumps(key, sort_keys=True, default=repr)
+        return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+    def run(self, tables: Mapping[str, Any], params: Mapping[str, Any]) -> pa.Table:
+        """Output of the stage over ``tables`` (Arrow tables or datasets keyed by input name)."""
+        if self.sql is not None:
+            connection = duckdb.connect()
+            try:
+                for name in self.inputs:
+                    connection.register(name, tables[name])
+                result = connection.execute(render_sql(self.sql, params)).to_arrow_table()
+            finally:
+                connection.close()
+        else:
+            result = self.fn({name: _to_table(tables[name]) for name in self.inputs}, params)
+        return conform(result, self.schema, self.name)
+
+
+def _sql_string(value: str) -> str:
+    return value.replace("'", "''")
+
+
+def _sql_value(value: Any) -> Any:
+    if isinstance(value, (list, tuple)):
+        return ", ".join(f"'{_sql_string(v)}'" if isinstance(v, str) else str(v) for v in value)
+    if isinstance(value, str):
+        return _sql_string(value)
+    return value
+
+
+def render_sql(sql: str, params: Mapping[str, Any]) -> str:
+    """``sql`` with its placeholders filled; lists and tuples become comma-separated SQL literals.
+
+    Quotes in strings are doubled, so string placeholders go inside quotes (``'{date}'``).
+    """
+    return sql.format_map({name: _sql_value(value) for name, value in params.items()})
+
+
+def conform(table: pa.Table, schema: Optional[pa.Schema], stage: str = "") -> pa.Table:
+    """``table`` with exactly the columns of ``schema``, cast to its types."""
+    if schema is None:
+        return table
+    missing = [name for name in schema.names if name not in table.column_names]
+    if missing:
+        raise ValueError(f"stage {stage!r} output lacks columns {missing}")
+    try:
+        return table.select(schema.names).cast(schema)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as error:
+        raise ValueError(f"stage {stage!r} output does not fit its schema: {error}") from error
+
+
+def _to_table(source: Any) -> pa.Table:
+    return source.to_table() if isinstance(source, ds.Dataset) else source
+
+
+def open_source(source: TableSource) -> Union[pa.Table, ds.Dataset]:
+    """Arrow table or dataset of a source; paths are opened as (hive-partitioned) Parquet datasets."""
+    if isinstance(source, str):
+        return ds.dataset(source, format="parquet", partitioning="hive")
+    return source
+
+
+@dataclass
+class PipelineRun:
+    """Result of ``Pipeline.run``.
+
+    Attributes:
+        outputs: Tables of the target stages.
+        seconds: Wall time of every stage that ran, in completion order.
+        wall_seconds: Wall time of the whole run.
+        plan: What the run did with each stage, when it used a cache or
+            was a dry run.
+    """
+
+    outputs: Dict[str, pa.Table] = field(default_factory=dict)
+    seconds: Dict[str, float] = field(default_factory=dict)
+    wall_seconds: float = 0.0
+    plan: List[StagePlan] = field(default_factory=list)
+
+    @property
+    def stage_seconds(self) -> float:
+        """Sum of the stage times; above ``wall_seconds`` when stages overlapped."""
+        return sum(self.seconds.values())
+
+
+class Pipeline:
+    """A DAG of ``Stage``s; stage inputs that are not stages are source tables."""
+
+    def __init__(self, stages: Iterable[Stage]):
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"duplicate stage {stage.name!r}")
+            self.stages[stage.name] = stage
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order, state = [], {}
+
+        def visit(name: str, path: Tuple[str, ...]) -> None:
+            if state.get(name) == "done" or name not in self.stages:
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"stage cycle: {' -> '.join(path + (name,))}")
+            state[name] = "visiting"
+            for upstream in self.stages[name].inputs:
+                visit(upstream, path + (name,))
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, ())
+        return order
+
+    @property
+    def sources(self) -> List[str]:
+        """Names of the source tables the stages read, in first-use order."""
+        names = [name for stage in self.order for name in self.stages[stage].inputs if name not in self.stages]
+        return list(dict.fromkeys(names))
+
+    @property
+    def sinks(self) -> List[str]:
+        """Stages no other stage reads."""
+        read = {name for stage in self.stages.values() for name in stage.inputs}
+        return [name for name in self.order if name not in read]
+
+    def upstream(self, targets: Iterable[str]) -> List[str]:
+        """``targets`` and every stage they depend on, in topological order."""
+        needed: Set[str] = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in self.stages:
+                raise KeyError(f"unknown stage {name!r}")
+            if name not in needed:
+                needed.add(name)
+                pending.extend(n for n in self.stages[name].inputs if n in self.stages)
+        return [name for name in self.order if name in needed]
+
+    def downstream(self, names: Iterable[str]) -> List[str]:
+        """``names`` and every stage that depends on them, in topological order."""
+        affected = set(names)
+        for name in self.order:
+            if any(upstream in affected for upstream in self.stages[name].inputs):
+                affected.add(name)
+        return [name for name in self.order if name in affected]
+
+    def fingerprints(
+        self,
+        sources: Mapping[str, TableSource],
+        params: Mapping[str, Any],
+        stages: Sequence[str],
+        source_fingerprints: Optional[Mapping[str, str]] = None,
+    ) -> Dict[str, str]:
+        """Fingerprint of each of ``stages`` (which must include their upstream stages).
+
+        Sources missing from ``source_fingerprints`` are hashed.
+        """
+        fingerprints = dict(source_fingerprints or {})
+        for name in self.order:
+            if name not in stages:
+                continue
+            inputs = []
+            for upstream in self.stages[name].inputs:
+                if upstream not in fingerprints:
+                    fingerprints[upstream] = source_fingerprint(sources[upstream])
+                inputs.append(fingerprints[upstream])
+            fingerprints[name] = self.stages[name].fingerprint(params, inputs)
+        return {name: fingerprints[name] for name in stages}
+
+    def plan(
+        self,
+        sources: Mapping[str, TableSource],
+        params: Mapping[str, Any],
+        targets: Sequence[str],
+        cache: Optional[MaterializationCache],
+        source_fingerprints: Optional[Mapping[str, str]] = None,
+    ) -> List[StagePlan]:
+        """Status of every stage ``targets`` depend on, in topological order.
+
+        A stage runs unless its output is cached; the stages above a cached
+        stage are skipped unless a stage that runs reads them.
+        """
+        stages = self.upstream(targets)
+        fingerprints = self.fingerprints(sources, params, stages, source_fingerprints)
+        needed, status = set(targets), {}
+        for name in reversed(stages):
+            if name not in needed:
+                status[name] = STATUS_SKIPPED
+            elif cache is not None and (name, fingerprints[name]) in cache:
+                status[name] = STATUS_CACHED
+            else:
+                status[name] = STATUS_RUN
+                needed.update(self.stages[name].inputs)
+        return [StagePlan(name, fingerprints[name], status[name]) for name in stages]
+
+    def run(
+        self,
+        sources: Mapping[str, TableSource],
+        params: Optional[Mapping[str, Any]] = None,
+        targets: Optional[Sequence[str]] = None,
+        max_workers: Optional[int] = None,
+        materialize: Optional[str] = None,
+        cache: Optional[MaterializationCache] = None,
+        dry_run: bool = False,
+        source_fingerprints: Optional[Mapping[str, str]] = None,
+    ) -> PipelineRun:
+        """Run the stages ``targets`` need, independent ones concurrently.
+
+        Args:
+            sources: Source tables by name: Arrow tables, datasets or Parquet
+                paths.
+            params: Values of the ``{param}`` placeholders of the stage SQL,
+                also passed to stage functions.
+            targets: Stages whose outputs are returned (the sinks when None).
+            max_workers: Stages run at once; ``1`` runs them one after another.
+            materialize: Directory to write every stage output to as
+                ``<stage>.parquet``; downstream stages then read that file,
+                like the notebooks read back their Snowflake tables.
+            cache: Cache of stage outputs by fingerprint: cached stages are
+                loaded instead of run, and the outputs of the stages that run
+                are added to it.
+            dry_run: Only plan: return the ``plan`` of what would run.
+            source_fingerprints: Known ``source_fingerprint`` of sources, so
+                runs sharing sources do not hash them again.
+
+        Returns:
+            The target tables, per-stage timings and, with a cache or on a
+            dry run, the plan.
+        """
+        params = dict(params or {})
+        targets = list(targets) if targets is not None else self.sinks
+        stages = self.upstream(targets)
+        missing = [name for stage in stages for name in self.stages[stage].inputs
+                   if name not in self.stages and name not in sources]
+        if missing:
+            raise KeyError(f"missing source tables {sorted(set(missing))}")
+
+        run = PipelineRun()
+        if cache is not None or dry_run:
+            run.plan = self.plan(sources, params, targets, cache, source_fingerprints)
+            if dry_run:
+                return run
+            status = {p.stage: p.status for p in run.plan}
+            fingerprints = {p.stage: p.fingerprint for p in run.plan}
+        else:
+            status = {name: STATUS_RUN for name in stages}
+        plan = [name for name in stages if status[name] == STATUS_RUN]
+        if materialize is not None:
+            os.makedirs(materialize, exist_ok=True)
+
+        start = time.perf_counter()
+        tables: Dict[str, Any] = {name: open_source(source) for name, source in sources.items()}
+        for name in stages:
+            if status[name] == STATUS_CACHED:
+                tables[name] = cache.get(name, fingerprints[name])
+                if name in targets:
+                    run.outputs[name] = tables[name]
+        consumers = {name: sum(name in self.stages[stage].inputs for stage in plan) for name in stages}
+        waiting = {stage: {n for n in self.stages[stage].inputs if status.get(n) == STATUS_RUN} for stage in plan}
+
+        def execute(name: str) -> Tuple[Any, float]:
+            stage_start = time.perf_counter()
+            output = self.stages[name].run(tables, params)
+            if cache is not None:
+                cache.put(name, fingerprints[name], output)
+            if materialize is not None:
+                path = os.path.join(materialize, f"{name}.parquet")
+                pq.write_table(output, path)
+                output = pq.read_table(path)
+            return output, time.perf_counter() - stage_start
+
+        with ThreadPoolExecutor(max_workers or len(plan) or 1) as pool:
+            running: Dict[Future, str] = {}
+
+            def submit_ready() -> None:
+                for stage in [s for s in plan if s in waiting and not waiting[s]]:
+                    del waiting[stage]
+                    running[pool.submit(execute, stage)] = stage
+
+            submit_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        output, seconds = future.result()
+                    except BaseException:
+                        for other in running:
+                            other.cancel()
+                        raise
+                    run.seconds[name] = seconds
+                    tables[name] = output
+                    if name in targets:
+                        run.outputs[name] = output
+                    for upstream in self.stages[name].inputs:
+                        if upstream in consumers:
+                            consumers[upstream] -= 1
+                            if not consumers[upstream] and upstream not in targets:
+                                del tables[upstream]
+                    for inputs in waiting.values():
+                        inputs.discard(name)
+                submit_ready()
+        run.wall_seconds = time.perf_counter() - start
+        return run
@@ -0,0 +1,124 @@
+"""
+Unique-Key Filter
+
+The notebooks' dedup step keeps the rows whose (session, minute, store, L1,
+L2) key no other row shares, through a ``valid_keys`` CTE (``GROUP BY``
+the five columns ``HAVING COUNT(*) = 1``) joined back on all five.
+``UniqueKeyFilter`` does it without the join, in two forms:
+
+- ``apply``: local over Arrow. Every key column is dictionary-encoded and
+  the codes are mixed into one 64-bit hash per row; one hash-table pass
+  (``pd.factorize``) numbers the hashes and a ``bincount`` counts them, and
+  rows whose count is one are kept. ``apply`` also returns a
+  ``DedupReport``: the rows each shared key removed, and the rows removed
+  for a NULL key (the notebooks' equality join drops those).
+- ``sql``: a window-function rewrite, ``QUALIFY COUNT(*) OVER (PARTITION
+  BY HASH(<keys>)) = 1``, valid in DuckDB and Snowflake.
+  ``sql(window=False)`` is the notebooks' form, for comparison.
+
+Both treat keys with equal 64-bit hashes as equal; two distinct keys of a
+day collide with probability about ``rows ** 2 / 2 ** 65``. The local
+hashes come from per-table dictionary codes, so they compare only within
+one table.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Mapping, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_SHIFT = np.uint64(29)
+DUPLICATE_ROWS = "ROWS"
+
+
+def key_hashes(table: pa.Table, columns: Tuple[str, ...]) -> Tuple[np.ndarray, np.ndarray]:
+    """64-bit hash of each row's ``columns``, and whether all of them are non-NULL."""
+    hashes = np.zeros(table.num_rows, np.uint64)
+    valid = np.ones(table.num_rows, bool)
+    for column in columns:
+        codes = table.column(column).combine_chunks().dictionary_encode().indices
+        valid &= codes.is_valid().to_numpy(zero_copy_only=False)
+        hashes ^= codes.fill_null(0).to_numpy().astype(np.uint64)
+        hashes *= _MULTIPLIER
+        hashes ^= hashes >> _SHIFT
+    return hashes, valid
+
+
+@dataclass
+class DedupReport:
+    """Rows in and kept, rows with a NULL key, and one row per shared key with the ``ROWS`` it removed."""
+
+    rows: int
+    kept: int
+    null_key_rows: int
+    duplicates: pa.Table
+
+    @property
+    def removed(self) -> int:
+        return self.rows - self.kept
+
+
+@dataclass(frozen=True)
+class UniqueKeyFilter:
+    """Rows of ``table`` whose ``keys`` no other row shares (and that have no NULL key).
+
+    Called as a stage function (``fn(tables, params)``) it filters its
+    ``table`` input.
+    """
+
+    table: str
+    keys: Tuple[str, ...]
+
+    def __call__(self, tables: Mapping[str, pa.Table], params: Mapping[str, Any]) -> pa.Table:
+        return self.apply(tables[self.table])[0]
+
+    def sql(self, window: bool = True) -> str:
+        """The DuckDB/Snowflake query over ``table``: the window rewrite, or the notebooks' CTE and join."""
+        if not window:
+            return self._join_sql()
+        not_null = "\n  AND ".join(f"{key} IS NOT NULL" for key in self.keys)
+        return f"""
+SELECT *
+FROM {self.table}
+WHERE {not_null}
+QUALIFY COUNT(*) OVER (PARTITION BY HASH({", ".join(self.keys)})) = 1
+"""
+
+    def _join_sql(self) -> str:
+        keys = ",\n    ".join(self.keys)
+        join = "\n AND ".join(f"t.{key} = vk.{key}" for key in self.keys)
+        return f"""
+WITH valid_keys AS (
+  SELECT
+    {keys}
+  FROM {self.table}
+  GROUP BY
+    {keys}
+  HAVING COUNT(*) = 1
+)
+SELECT t.*
+FROM {self.table} t
+JOIN valid_keys vk
+  ON {join}
+"""
+
+    def apply(self, table: pa.Table) -> Tuple[pa.Table, DedupReport]:
+        """The rows of ``table`` with unique keys, in their order, and the report of what was removed."""
+        hashes, valid = key_hashes(table, self.keys)
+        codes, _ = pd.factorize(hashes[valid])
+        row_counts = np.bincount(codes)[codes]
+        unique = np.zeros(table.num_rows, bool)
+        unique[valid] = row_counts == 1
+
+        shared = row_counts > 1
+        _, first = np.unique(codes[shared], return_index=True)
+        duplicates = table.select(list(self.keys)).take(np.flatnonzero(valid)[shared][first])
+        duplicates = duplicates.append_column(DUPLICATE_ROWS, pa.array(row_counts[shared][first]))
+        duplicates = duplicates.sort_by([(DUPLICATE_ROWS, "descending")])
+
+        kept = table.filter(pa.array(unique))
+        report = DedupReport(table.num_rows, kept.num_rows, int((~valid).sum()), duplicates)
+        return kept, report
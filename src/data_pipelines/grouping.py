@@ -0,0 +1,158 @@
+"""
+List Grouping
+
+The notebooks' grouping step: one row per request id with the ``MIN`` of
+the key columns and several ``ARRAY_AGG ... WITHIN GROUP (ORDER BY ...)``
+lists that all share one ordering. Written that way, every list sorts its
+group again (five times per ad request, three per NV ranking).
+``ListGrouping`` sorts once and gathers every list from that permutation,
+in two forms:
+
+- ``group``: local and vectorized over Arrow. One ``np.lexsort`` over the
+  group codes and order keys gives the permutation, the change points of
+  the sorted codes give the segment offsets, and each list column is one
+  ``take`` with those offsets; the ``MIN`` columns are a hash aggregate.
+- ``sql``: a DuckDB query aggregating one ordered ``ARRAY_AGG`` of a
+  struct of the list columns, then unpacking each list with a list
+  comprehension. ``sql(single_sort=False)`` is the per-list form, for
+  comparison.
+
+Order keys sort NULLs last. List columns drop NULLs, as ``ARRAY_AGG`` does,
+or replace them with ``fill``; a group whose values are all NULL gets an
+empty list, as in Snowflake.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Mapping, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+_CODE = "__group_code"
+
+
+@dataclass(frozen=True)
+class OrderKey:
+    """A list order column, NULLs last."""
+
+    column: str
+    descending: bool = False
+
+
+@dataclass(frozen=True)
+class ListColumn:
+    """Output list ``name`` of ``column``, NULLs dropped or replaced by ``fill``."""
+
+    name: str
+    column: str
+    fill: Optional[Any] = None
+
+
+@dataclass(frozen=True)
+class ListGrouping:
+    """Rows of ``table`` grouped by ``key``, with ``<column>_MIN`` of ``mins`` and the ``lists`` in ``order``.
+
+    Called as a stage function (``fn(tables, params)``) it groups its
+    ``table`` input; its repr, and so the stage fingerprint, spells out the
+    whole grouping.
+    """
+
+    table: str
+    key: str
+    mins: Tuple[str, ...]
+    lists: Tuple[ListColumn, ...]
+    order: Tuple[OrderKey, ...]
+
+    def __call__(self, tables: Mapping[str, pa.Table], params: Mapping[str, Any]) -> pa.Table:
+        return self.group(tables[self.table])
+
+    def sql(self, single_sort: bool = True) -> str:
+        """The DuckDB query over ``table``: single-sort, or with one ordered ``ARRAY_AGG`` per list."""
+        if not single_sort:
+            return self._per_list_sql()
+        fields = [_quote(column) for column in dict.fromkeys(item.column for item in self.lists)]
+        order = self._order_sql()
+
+        def unpack(item: ListColumn) -> str:
+            value = f"i.{_quote(item.column)}"
+            if item.fill is None:
+                return f"[{value} FOR i IN ITEMS IF {value} IS NOT NULL] AS {_quote(item.name)}"
+            return f"[COALESCE({value}, {item.fill!r}) FOR i IN ITEMS] AS {_quote(item.name)}"
+
+        key = _quote(self.key)
+        mins = "".join(f"\n    MIN({_quote(c)}) AS {_quote(c + '_MIN')}," for c in self.mins)
+        packed = ", ".join(f"{field} := {field}" for field in fields)
+        outputs = "".join(f",\n  {_quote(c + '_MIN')}" for c in self.mins)
+        lists = "".join(f",\n  {unpack(item)}" for item in self.lists)
+        return f"""
+WITH grouped AS (
+  SELECT
+    {key},{mins}
+    ARRAY_AGG(STRUCT_PACK({packed}) ORDER BY {order}) AS ITEMS
+  FROM {self.table}
+  GROUP BY {key}
+)
+SELECT
+  {key}{outputs}{lists}
+FROM grouped
+"""
+
+    def _order_sql(self) -> str:
+        return ", ".join(f"{_quote(k.column)} {'DESC' if k.descending else 'ASC'} NULLS LAST" for k in self.order)
+
+    def _per_list_sql(self) -> str:
+        order = self._order_sql()
+
+        def aggregate(item: ListColumn) -> str:
+            column = _quote(item.column)
+            if item.fill is None:
+                return f"COALESCE(ARRAY_AGG({column} ORDER BY {order}) FILTER (WHERE {column} IS NOT NULL), [])"
+            return f"ARRAY_AGG(COALESCE({column}, {item.fill!r}) ORDER BY {order})"
+
+        key = _quote(self.key)
+        columns = [key] + [f"MIN({_quote(c)}) AS {_quote(c + '_MIN')}" for c in self.mins]
+        columns += [f"{aggregate(item)} AS {_quote(item.name)}" for item in self.lists]
+        return "SELECT\n  " + ",\n  ".join(columns) + f"\nFROM {self.table}\nGROUP BY {key}\n"
+
+    def group(self, table: pa.Table) -> pa.Table:
+        """The grouped table, one row per ``key`` in order of first appearance."""
+        keys = table.column(self.key).combine_chunks().dictionary_encode(null_encoding="encode")
+        codes = keys.indices.to_numpy(zero_copy_only=False)
+        sort_keys = []
+        for key in reversed(self.order):
+            direction = "descending" if key.descending else "ascending"
+            rank = pc.rank(table.column(key.column), direction, tiebreaker="dense")
+            sort_keys.append(rank.to_numpy())
+        permutation = np.lexsort(sort_keys + [codes])
+        sorted_codes = codes[permutation]
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]) if len(codes) else codes
+
+        columns = {self.key: keys.dictionary}
+        if self.mins:
+            grouped = pa.table({_CODE: codes, **{c: table.column(c) for c in self.mins}})
+            mins = grouped.group_by(_CODE, use_threads=False).aggregate([(c, "min") for c in self.mins])
+            mins = mins.take(np.argsort(mins.column(_CODE).to_numpy()))
+            columns.update({f"{c}_MIN": mins.column(f"{c}_min") for c in self.mins})
+
+        gathered = table.select(list(dict.fromkeys(item.column for item in self.lists))).take(permutation)
+        for item in self.lists:
+            columns[item.name] = _segments(gathered.column(item.column).combine_chunks(), starts, item.fill)
+        return pa.table(columns)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _segments(values: pa.Array, starts: np.ndarray, fill: Optional[Any]) -> pa.ListArray:
+    """``values`` (grouped contiguously, segments beginning at ``starts``) as one list per segment."""
+    if fill is not None:
+        values = pc.fill_null(values, fill)
+        lengths = np.diff(np.r_[starts, len(values)])
+    else:
+        valid = values.is_valid().to_numpy(zero_copy_only=False)
+        values = values.filter(pa.array(valid))
+        lengths = np.add.reduceat(valid, starts, dtype=np.int64) if len(starts) else starts
+    offsets = np.r_[0, np.cumsum(lengths)].astype(np.int32)
+    return pa.ListArray.from_arrays(pa.array(offsets), values)
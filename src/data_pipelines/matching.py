@@ -0,0 +1,99 @@
+"""
+Ad / NV Matching
+
+The join of ``ad nv data matching.py``: every deduplicated ad request is
+paired with the NV ranking of the same (session, minute, store, L1, L2) key,
+giving one row of ``final_blending_input`` per matched request. The stage
+reads the outputs of the ad and NV pipelines, and ``day_pipeline`` joins
+the three into the graph of one day: the ad and NV branches run
+concurrently and meet at the match.
+"""
+
+from typing import Any, Mapping, Optional, Sequence
+
+import pyarrow as pa
+
+from src.data_pipelines.ad_pipeline import AD_OUTPUT, AD_PARAMS, DEDUP_KEY_COLUMNS, ad_pipeline
+from src.data_pipelines.dag import Pipeline, PipelineRun, Stage, TableSource
+from src.data_pipelines.materialization import MaterializationCache
+from src.data_pipelines.nv_pipeline import NV_OUTPUT, NV_PARAMS, nv_pipeline
+from src.utils.list_parsing import RAW_LIST_COLUMNS
+
+FINAL_OUTPUT = "final_blending_input"
+DAY_PARAMS = {**AD_PARAMS, **NV_PARAMS}
+
+FINAL_SCHEMA = pa.schema([
+    ("AD_QUALITY_SCORE_LIST", pa.list_(pa.float64())),
+    ("AD_EXPECTED_VALUE_LIST", pa.list_(pa.float64())),
+    ("AD_CARD_POSITION_LIST", pa.list_(pa.int64())),
+    ("NV_PCTR_LIST", pa.list_(pa.float64())),
+    ("NV_CARD_POSITION_LIST", pa.list_(pa.int64())),
+    ("DD_SESSION_ID_MIN", pa.string()),
+    ("STORE_ID_MIN", pa.string()),
+    ("AD_REQUEST_ID", pa.string()),
+    ("NV_RANKING_ID", pa.string()),
+    ("L1_CATEGORY_ID_MIN", pa.string()),
+    ("L2_CATEGORY_ID_MIN", pa.string()),
+    ("AD_UNHASHED_BMS_ID_LIST", pa.list_(pa.string())),
+    ("NV_UNHASHED_BMS_ID_LIST", pa.list_(pa.string())),
+])
+
+MATCHING_SQL = f"""
+SELECT
+  ad.AD_QUALITY_SCORE_LIST,
+  ad.EXPECTED_VALUE_LIST AS AD_EXPECTED_VALUE_LIST,
+  ad.CARD_POSITION_LIST AS AD_CARD_POSITION_LIST,
+  nv.NV_PCTR_LIST,
+  nv.CARD_POSITION_LIST AS NV_CARD_POSITION_LIST,
+  ad.DD_SESSION_ID_MIN,
+  ad.STORE_ID_MIN,
+  ad.AD_REQUEST_ID,
+  nv.NV_RANKING_ID,
+  ad.L1_CATEGORY_ID_MIN,
+  ad.L2_CATEGORY_ID_MIN,
+  ad.UNHASHED_BMS_ID_LIST AS AD_UNHASHED_BMS_ID_LIST,
+  nv.UNHASHED_BMS_ID_LIST AS NV_UNHASHED_BMS_ID_LIST
+FROM {AD_OUTPUT} AS ad
+JOIN {NV_OUTPUT} AS nv
+  ON {" AND ".join(f"ad.{key} = nv.{key}" for key in DEDUP_KEY_COLUMNS)}
+"""
+
+
+def matching_stage() -> Stage:
+    return Stage(FINAL_OUTPUT, (AD_OUTPUT, NV_OUTPUT), sql=MATCHING_SQL, schema=FINAL_SCHEMA)
+
+
+def day_pipeline() -> Pipeline:
+    """Ad pipeline, NV pipeline and their match: the stages of one day of ``final_blending_input``."""
+    stages = list(ad_pipeline().stages.values()) + list(nv_pipeline().stages.values())
+    return Pipeline(stages + [matching_stage()])
+
+
+def run_day(
+    sources: Mapping[str, TableSource],
+    date: str,
+    targets: Sequence[str] = (FINAL_OUTPUT,),
+    max_workers: Optional[int] = None,
+    cache: Optional[MaterializationCache] = None,
+    dry_run: bool = False,
+    source_fingerprints: Optional[Mapping[str, str]] = None,
+    **params: Any,
+) -> PipelineRun:
+    """Run ``day_pipeline`` for one day; ``outputs[FINAL_OUTPUT]`` is its ``final_blending_input``.
+
+    ``params`` override ``DAY_PARAMS``; the other arguments are those of
+    ``Pipeline.run``.
+    """
+    return day_pipeline().run(
+        sources, dict(DAY_PARAMS, **params, date=date), targets=targets, max_workers=max_workers, cache=cache,
+        dry_run=dry_run, source_fingerprints=source_fingerprints,
+    )
+
+
+def to_parsed_columns(final: pa.Table) -> pa.Table:
+    """``final_blending_input`` with its list columns under the notebook's parsed array names.
+
+    The result feeds ``BlendingInput.from_arrow`` directly.
+    """
+    parsed = {raw: name for raw, name, _ in RAW_LIST_COLUMNS}
+    return final.rename_columns([parsed.get(name.lower(), name) for name in final.column_names])
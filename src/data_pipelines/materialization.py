@@ -0,0 +1,137 @@
+"""
+Stage Materialization Cache
+
+Stage outputs on local disk, keyed by a content hash of what produced them,
+so re-running a pipeline after changing one filter recomputes only the
+changed stage and the stages downstream of it.
+
+A stage's fingerprint (``Stage.fingerprint``) hashes its normalized SQL or
+function source, output schema, the run parameters it reads (date,
+placements, model ids, ...) and the fingerprints of its inputs. Source
+tables are fingerprinted by ``source_fingerprint``: Parquet files by path,
+size and modification time, in-memory Arrow tables by their rows in IPC form. Runs
+over the same sources (e.g. the days of a backfill) can hash them once with
+``source_fingerprints`` and pass the result to ``Pipeline.run``. Any
+change upstream therefore changes the fingerprint of every stage below it,
+while stages above keep theirs and are served from the cache.
+
+Entries are ``<root>/<stage>/<fingerprint>.parquet``, written to a
+temporary file and renamed into place, and are memory-mapped when read.
+"""
+
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+STATUS_RUN = "run"
+STATUS_CACHED = "cached"
+STATUS_SKIPPED = "skipped"
+
+
+def _hash_table(table: pa.Table, digest) -> None:
+    # IPC serialization writes only the rows of each batch, so slices sharing parent buffers hash apart.
+    digest.update(table.schema.to_string().encode())
+    for batch in table.to_batches():
+        digest.update(memoryview(batch.serialize()))
+
+
+def _hash_files(paths: Iterable[str], digest) -> None:
+    for path in sorted(paths):
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+
+
+def _hash_source(source: Any, digest) -> None:
+    if isinstance(source, str):
+        files = [source] if os.path.isfile(source) else [
+            os.path.join(root, name) for root, _, names in os.walk(source) for name in names
+        ]
+        _hash_files(files, digest)
+    elif isinstance(source, ds.FileSystemDataset):
+        _hash_files(source.files, digest)
+    elif isinstance(source, ds.UnionDataset):
+        for child in source.children:
+            _hash_source(child, digest)
+    elif isinstance(source, ds.InMemoryDataset):
+        _hash_table(source.to_table(), digest)
+    elif isinstance(source, pa.Table):
+        _hash_table(source, digest)
+    else:
+        raise TypeError(f"cannot fingerprint a source of type {type(source).__name__}")
+
+
+def source_fingerprint(source: Any) -> str:
+    """Hash of a source table: of its files for paths and file datasets, of its rows for Arrow tables.
+
+    Union datasets hash their children and in-memory datasets their table;
+    other dataset types raise ``TypeError``.
+    """
+    digest = hashlib.sha256()
+    _hash_source(source, digest)
+    return digest.hexdigest()[:32]
+
+
+def source_fingerprints(sources: Mapping[str, Any]) -> Dict[str, str]:
+    """``source_fingerprint`` of every source, to hash shared sources once for many runs."""
+    return {name: source_fingerprint(source) for name, source in sources.items()}
+
+
+@dataclass
+class StagePlan:
+    """What a run does with one stage: ``run`` it, load it from the cache (``cached``), or skip it
+    because every stage that reads it is cached (``skipped``)."""
+
+    stage: str
+    fingerprint: str
+    status: str
+
+
+def format_plan(plan: List[StagePlan]) -> str:
+    """One line per stage: status, fingerprint prefix and name."""
+    return "\n".join(f"{p.status:8s} {p.fingerprint[:12]}  {p.stage}" for p in plan)
+
+
+class MaterializationCache:
+    """Stage outputs under ``root``, one Parquet file per (stage, fingerprint)."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, stage: str, fingerprint: str) -> str:
+        return os.path.join(self.root, stage, f"{fingerprint}.parquet")
+
+    def __contains__(self, key) -> bool:
+        return os.path.exists(self.path(*key))
+
+    def get(self, stage: str, fingerprint: str) -> Optional[pa.Table]:
+        """Cached output, or None."""
+        path = self.path(stage, fingerprint)
+        if not os.path.exists(path):
+            return None
+        return pq.read_table(path, memory_map=True)
+
+    def put(self, stage: str, fingerprint: str, table: pa.Table) -> None:
+        directory = os.path.join(self.root, stage)
+        os.makedirs(directory, exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        os.close(handle)
+        try:
+            pq.write_table(table, temporary)
+            os.replace(temporary, self.path(stage, fingerprint))
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+    def fingerprints(self, stage: str) -> List[str]:
+        """Fingerprints cached for ``stage``."""
+        directory = os.path.join(self.root, stage)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-len(".parquet")] for name in os.listdir(directory) if name.endswith(".parquet"))
@@ -0,0 +1,188 @@
+"""
+NV Data Pipeline
+
+The steps of ``nv data pipeline.py`` as a ``Pipeline`` over local tables,
+in DuckDB SQL but for the grouping and the dedup:
+
+1. ``nv_impression``: organic category-page impressions in USD of the day,
+   with their ranking event id from ``OTHER_PROPERTIES``.
+2. ``nv_non_v2c_sibyl_log`` and ``nv_v2c_sibyl_log``: the pCTR predictions
+   of the two ranker models on retail category pages, read from the
+   ``sps_nv_consumer`` sibyl log (the notebook's Iceberg table), and
+   ``nv_union_sibyl_log``, their union. The three log stages run
+   concurrently with step 1.
+3. ``nv_joined_table``: impressions joined with their predictions on
+   (bms id, ranking event id).
+4. ``nv_grouped_table``: one row per ``NV_RANKING_ID`` with the ``MIN`` of
+   the key columns and the NV lists ordered by card position. The bms id
+   list, which the ad/NV matching reads, is gathered too. The lists share
+   one sort (``NV_GROUPING``, see ``grouping``).
+5. ``nv_final_table``: rankings whose (session, minute, store, L1, L2) key
+   no other ranking shares, as in the ad pipeline (``NV_DEDUP``).
+
+The run parameters are ``date`` and the predictor names, model ids and page
+source of ``NV_PARAMS``.
+"""
+
+from typing import Any, Mapping, Optional
+
+import pyarrow as pa
+
+from src.data_pipelines.ad_pipeline import DEDUP_KEY_COLUMNS, IMPRESSION_SOURCE
+from src.data_pipelines.dag import Pipeline, PipelineRun, Stage, TableSource
+from src.data_pipelines.dedup import UniqueKeyFilter
+from src.data_pipelines.grouping import ListColumn, ListGrouping, OrderKey
+from src.data_pipelines.materialization import MaterializationCache
+
+SIBYL_LOG_SOURCE = "sps_nv_consumer"
+NV_OUTPUT = "nv_final_table"
+NV_PARAMS = {
+    "ctr_predictor": "dsml-nv-store_item_ranker_ctr_mtml",
+    "ctr_model_id": "mtml_item_ranker_v2_ctr_1742750442",
+    "v2c_predictor": "dsml-nv-store_item_ranker_v2c_ctr_mtml",
+    "v2c_model_id": "mtml_v2c_ctr_1747176394",
+    "page_source": "RETAIL_CATEGORY_PAGE",
+}
+
+_KEY_FIELDS = [(name, pa.string()) for name in ("DD_SESSION_ID", "STORE_ID", "L1_CATEGORY_ID", "L2_CATEGORY_ID")]
+NV_IMPRESSION_SCHEMA = pa.schema(
+    [("CLIPPED_IMPRESSION_TIMESTAMP", pa.string()), ("CARD_POSITION", pa.int64())]
+    + _KEY_FIELDS
+    + [("UNHASHED_BMS_ID", pa.string()), ("NV_RANKING_ID", pa.string())]
+)
+NV_LOG_SCHEMA = pa.schema(
+    _KEY_FIELDS + [("NV_PCTR", pa.float64()), ("UNHASHED_BMS_ID", pa.string()), ("NV_RANKING_ID", pa.string())]
+)
+NV_JOINED_SCHEMA = pa.schema(
+    [("NV_RANKING_ID", pa.string()), ("CARD_POSITION", pa.int64()), ("CLIPPED_IMPRESSION_TIMESTAMP", pa.string())]
+    + _KEY_FIELDS
+    + [("NV_PCTR", pa.float64()), ("UNHASHED_BMS_ID", pa.string())]
+)
+NV_GROUPED_SCHEMA = pa.schema(
+    [("NV_RANKING_ID", pa.string())]
+    + [(name, pa.string()) for name in DEDUP_KEY_COLUMNS]
+    + [
+        ("NV_PCTR_LIST", pa.list_(pa.float64())),
+        ("CARD_POSITION_LIST", pa.list_(pa.int64())),
+        ("UNHASHED_BMS_ID_LIST", pa.list_(pa.string())),
+    ]
+)
+
+NV_IMPRESSION_SQL = """
+SELECT
+  STRFTIME(RECEIVED_AT, '%Y-%m-%d %H:%M') AS CLIPPED_IMPRESSION_TIMESTAMP,
+  CARD_POSITION,
+  COALESCE(DD_SESSION_ID, 'null') AS DD_SESSION_ID,
+  COALESCE(CAST(STORE_ID AS VARCHAR), 'null') AS STORE_ID,
+  COALESCE(L1_CATEGORY_ID, 'null') AS L1_CATEGORY_ID,
+  COALESCE(L2_CATEGORY_ID, 'null') AS L2_CATEGORY_ID,
+  BUSINESS_MERCHANT_SUPPLIED_ID AS UNHASHED_BMS_ID,
+  JSON_EXTRACT_STRING(OTHER_PROPERTIES, '$.ranking_event_id') AS NV_RANKING_ID
+FROM fact_item_card_view_dedup
+WHERE IS_SPONSORED = FALSE AND FEATURE = 'category'
+  AND CAST(RECEIVED_AT AS DATE) = DATE '{date}'
+  AND CURRENCY = 'USD'
+"""
+
+
+def sibyl_log_sql(model: str) -> str:
+    """Predictions of the ``{model}_predictor`` / ``{model}_model_id`` ranker on the ``page_source`` page."""
+    return f"""
+SELECT
+  features['dd_session_id'] AS DD_SESSION_ID,
+  features['store_id'] AS STORE_ID,
+  features['l1_category_id'] AS L1_CATEGORY_ID,
+  features['l2_category_id'] AS L2_CATEGORY_ID,
+  prediction_result AS NV_PCTR,
+  features['unhashed_business_merchant_supplied_id'] AS UNHASHED_BMS_ID,
+  features['ranking_event_id'] AS NV_RANKING_ID
+FROM sps_nv_consumer
+WHERE iguazu_partition_date = '{{date}}'
+  AND predictor_name = '{{{model}_predictor}}'
+  AND model_id = '{{{model}_model_id}}'
+  AND MAP_CONTAINS(features, 'page_source')
+  AND MAP_CONTAINS(features, 'ranking_event_id')
+  AND features['page_source'] = '{{page_source}}'
+"""
+
+
+_UNION_COLUMNS = """
+  COALESCE(DD_SESSION_ID, 'null') AS DD_SESSION_ID,
+  COALESCE(STORE_ID, 'null') AS STORE_ID,
+  COALESCE(L1_CATEGORY_ID, 'null') AS L1_CATEGORY_ID,
+  COALESCE(L2_CATEGORY_ID, 'null') AS L2_CATEGORY_ID,
+  NV_PCTR,
+  UNHASHED_BMS_ID,
+  NV_RANKING_ID"""
+
+NV_UNION_SQL = f"""
+SELECT{_UNION_COLUMNS}
+FROM nv_v2c_sibyl_log
+UNION ALL
+SELECT{_UNION_COLUMNS}
+FROM nv_non_v2c_sibyl_log
+"""
+
+NV_JOIN_SQL = """
+SELECT
+  nv_imp.NV_RANKING_ID AS NV_RANKING_ID,
+  nv_imp.CARD_POSITION AS CARD_POSITION,
+  nv_imp.CLIPPED_IMPRESSION_TIMESTAMP AS CLIPPED_IMPRESSION_TIMESTAMP,
+  nv_imp.DD_SESSION_ID AS DD_SESSION_ID,
+  nv_imp.STORE_ID AS STORE_ID,
+  nv_imp.L1_CATEGORY_ID AS L1_CATEGORY_ID,
+  nv_imp.L2_CATEGORY_ID AS L2_CATEGORY_ID,
+  nv_log.NV_PCTR AS NV_PCTR,
+  nv_imp.UNHASHED_BMS_ID AS UNHASHED_BMS_ID
+FROM nv_impression AS nv_imp
+JOIN nv_union_sibyl_log AS nv_log
+  ON nv_imp.UNHASHED_BMS_ID = nv_log.UNHASHED_BMS_ID
+     AND nv_imp.NV_RANKING_ID = nv_log.NV_RANKING_ID
+"""
+
+NV_GROUPING = ListGrouping(
+    "nv_joined_table",
+    "NV_RANKING_ID",
+    mins=tuple(key[:-len("_MIN")] for key in DEDUP_KEY_COLUMNS),
+    lists=(
+        ListColumn("NV_PCTR_LIST", "NV_PCTR"),
+        ListColumn("CARD_POSITION_LIST", "CARD_POSITION"),
+        ListColumn("UNHASHED_BMS_ID_LIST", "UNHASHED_BMS_ID"),
+    ),
+    order=(OrderKey("CARD_POSITION"),),
+)
+NV_DEDUP = UniqueKeyFilter("nv_grouped_table", DEDUP_KEY_COLUMNS)
+
+
+def nv_pipeline() -> Pipeline:
+    """The NV data pipeline's stages."""
+    return Pipeline([
+        Stage("nv_impression", (IMPRESSION_SOURCE,), sql=NV_IMPRESSION_SQL, schema=NV_IMPRESSION_SCHEMA),
+        Stage("nv_non_v2c_sibyl_log", (SIBYL_LOG_SOURCE,), sql=sibyl_log_sql("ctr"), schema=NV_LOG_SCHEMA),
+        Stage("nv_v2c_sibyl_log", (SIBYL_LOG_SOURCE,), sql=sibyl_log_sql("v2c"), schema=NV_LOG_SCHEMA),
+        Stage("nv_union_sibyl_log", ("nv_v2c_sibyl_log", "nv_non_v2c_sibyl_log"), sql=NV_UNION_SQL,
+              schema=NV_LOG_SCHEMA),
+        Stage("nv_joined_table", ("nv_impression", "nv_union_sibyl_log"), sql=NV_JOIN_SQL, schema=NV_JOINED_SCHEMA),
+        Stage("nv_grouped_table", ("nv_joined_table",), fn=NV_GROUPING, schema=NV_GROUPED_SCHEMA, params=()),
+        Stage(NV_OUTPUT, ("nv_grouped_table",), fn=NV_DEDUP, schema=NV_GROUPED_SCHEMA, params=()),
+    ])
+
+
+def run_nv_pipeline(
+    sources: Mapping[str, TableSource],
+    date: str,
+    max_workers: Optional[int] = None,
+    materialize: Optional[str] = None,
+    cache: Optional[MaterializationCache] = None,
+    dry_run: bool = False,
+    **params: Any,
+) -> PipelineRun:
+    """Run the NV pipeline for one day; ``outputs[NV_OUTPUT]`` is the deduplicated grouped table.
+
+    ``params`` override ``NV_PARAMS``; the other arguments are those of
+    ``Pipeline.run``.
+    """
+    return nv_pipeline().run(
+        sources, dict(NV_PARAMS, **params, date=date), max_workers=max_workers, materialize=materialize,
+        cache=cache, dry_run=dry_run,
+    )
@@ -0,0 +1,15 @@
+"""
+Evaluation Module
+
+Metrics and parameter-search tools for judging blending configurations.
+
+Modules:
+- blending_metrics: Top-K ads load and discounted utility sums, one K or a multi-K cube
+- spark_metrics: One-pass Spark metric pack, metric cube and ad slot histograms
+- quantile_sketch: Mergeable KLL sketches for metric percentiles across days and shards
+- alpha_sweep: Exact metric curves over an alpha range from per-request crossovers
+- grid_evaluation: Metric tables for a grid of configs over one parsed input
+- optimal_blending: Exact constrained-optimal top-K blend and the greedy's optimality gap
+- streaming: Batch-at-a-time blending of partitioned Parquet inputs into metric sketches and histograms
+- sharded_blending: Process-pool blending of one input shared through shared memory, with merged metrics
+"""
@@ -0,0 +1,163 @@
+"""
+Alpha Sweep
+
+Exact top-K metric curves over a whole range of ``alpha`` from a handful of
+blends, instead of one full re-blend per candidate value.
+
+Every ads-vs-NV comparison ``rev + alpha * eng > beta * nv_eng`` is linear in
+``alpha`` (with ``beta`` either fixed or tied to ``alpha``, as the notebook's
+``BETA = ALPHA``), so it flips at exactly one crossover. A request's blended
+list is therefore piecewise constant in ``alpha``. The sweep follows each
+request along the alpha axis: blend at the current alpha, note the nearest
+crossover above it among the comparisons that decided one of the top-K
+slots, and jump there. Later comparisons cannot change the top K (the blend
+stops once K items are placed), so each
+request needs one blend per distinct top-K list rather than one per
+candidate alpha. All requests still moving are re-blended together, so each
+round is a single ``blend_batch`` call.
+
+At a crossover itself the comparison is resolved as just above it, so every
+piece covers a half-open interval ``[start, next start)``. Values at an alpha
+equal to a crossover can differ from a direct blend, which uses the strict
+``>`` of the reference.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import numpy as np
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch, lengths_to_offsets
+from src.algorithms.interning import intern_ids
+from src.config.blending_config import BlendingConfig
+from src.evaluation.blending_metrics import METRIC_COLS, topk_metrics
+
+
+@dataclass
+class AlphaSweep:
+    """Per-request piecewise-constant top-K metrics over ``[alpha_min, alpha_max]``.
+
+    Request ``r`` owns pieces ``piece_offsets[r]:piece_offsets[r + 1]``;
+    piece ``p`` holds from ``piece_start[p]`` up to the next piece of the same
+    request (or ``alpha_max``). ``metrics`` maps the notebook metric names to
+    per-piece values.
+    """
+
+    alpha_min: float
+    alpha_max: float
+    piece_offsets: np.ndarray
+    piece_start: np.ndarray
+    metrics: Dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.piece_offsets) - 1
+
+    @property
+    def pieces_per_request(self) -> np.ndarray:
+        return np.diff(self.piece_offsets)
+
+    def at(self, alpha: float) -> Dict[str, np.ndarray]:
+        """Per-request metric values at ``alpha`` (within the swept range)."""
+        started = np.add.reduceat((self.piece_start <= alpha).astype(np.int64), self.piece_offsets[:-1])
+        piece = self.piece_offsets[:-1] + np.maximum(started, 1) - 1
+        return {name: values[piece] for name, values in self.metrics.items()}
+
+    def mean_curves(self) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Mean of each metric over requests, as a step function of alpha.
+
+        Returns:
+            ``(breakpoints, curves)``: the mean of metric ``name`` is
+            ``curves[name][m]`` on ``[breakpoints[m], breakpoints[m + 1])``
+            (the last interval ends at ``alpha_max``).
+        """
+        n = len(self)
+        first = self.piece_offsets[:-1]
+        later = np.ones(len(self.piece_start), dtype=bool)
+        later[first] = False
+        breakpoints, event = np.unique(self.piece_start[later], return_inverse=True)
+        breakpoints = np.concatenate([[self.alpha_min], breakpoints])
+        curves = {}
+        for name, values in self.metrics.items():
+            change = values[later] - values[np.flatnonzero(later) - 1]
+            steps = np.bincount(event, weights=change, minlength=len(breakpoints) - 1)
+            totals = values[first].sum() + np.concatenate([[0.0], np.cumsum(steps)])
+            curves[name] = totals / n
+        return breakpoints, curves
+
+
+class _CrossoverComparison:
+    """Comparison at per-request alphas that records the next top-K crossover.
+
+    The ad wins at ``alpha`` when ``c0 + c1 * alpha`` is positive, or zero
+    with ``c1 > 0`` (the limit from above), with ``c0 = rev`` and
+    ``c1 = eng - nv_eng`` when beta follows alpha, or ``c0 = rev - beta * nv_eng``
+    and ``c1 = eng`` for a fixed beta.
+    """
+
+    def __init__(self, inputs: BlendingInput, config: BlendingConfig, alpha: np.ndarray):
+        self.inputs = inputs
+        self.k = config.k
+        self.fixed_beta = float(config.beta) if config.beta else None
+        self.alpha = alpha
+        self.next_alpha = np.full(len(alpha), np.inf)
+
+    def __call__(self, req, ad_pos, nv_pos, n_placed):
+        rev = self.inputs.ad_expected_value[ad_pos]
+        eng = self.inputs.ad_quality_score[ad_pos]
+        nv_eng = self.inputs.nv_pctr[nv_pos]
+        if self.fixed_beta is None:
+            c0, c1 = rev, eng - nv_eng
+        else:
+            c0, c1 = rev - self.fixed_beta * nv_eng, eng
+        alpha = self.alpha[req]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            crossover = -c0 / c1
+        ad_wins = np.where(c1 > 0, alpha >= crossover, np.where(c1 < 0, alpha < crossover, c0 > 0))
+        ahead = (c1 != 0) & (crossover > alpha) & (n_placed < self.k)
+        np.minimum.at(self.next_alpha, req[ahead], crossover[ahead])
+        return ad_wins
+
+
+def alpha_sweep(
+    inputs: BlendingInput,
+    config: BlendingConfig = BlendingConfig(),
+    alpha_min: float = 0.0,
+    alpha_max: float = 100.0,
+) -> AlphaSweep:
+    """Exact top-``config.k`` metrics of every request for all alphas in ``[alpha_min, alpha_max]``.
+
+    ``config.alpha`` is ignored. ``beta`` follows alpha when ``config.beta`` is
+    unset (the notebook's ``BETA = ALPHA``) and stays fixed otherwise; the
+    block-size constraints come from ``config``. ``alpha_max`` may be
+    ``inf``, which follows every request to its last crossover.
+    """
+    n = len(inputs)
+    inputs = intern_ids(inputs)
+    piece_request, piece_start = [], []
+    piece_metrics = {name: [] for name in METRIC_COLS}
+
+    active = np.arange(n)
+    alpha = np.full(n, float(alpha_min))
+    while len(active):
+        batch = inputs.take(active)
+        comparison = _CrossoverComparison(batch, config, alpha)
+        metrics = topk_metrics(blend_batch(batch, config, compare=comparison, top_k=config.k), config.k)
+        piece_request.append(active)
+        piece_start.append(alpha)
+        for name in METRIC_COLS:
+            piece_metrics[name].append(metrics[name])
+        # Requests with no crossover ahead have next_alpha = inf, done even when alpha_max is inf.
+        moving = np.isfinite(comparison.next_alpha) & (comparison.next_alpha <= alpha_max)
+        active, alpha = active[moving], comparison.next_alpha[moving]
+
+    piece_request = np.concatenate(piece_request)
+    # Rounds append pieces in alpha order, so a stable sort by request keeps
+    # each request's pieces sorted by start.
+    order = np.argsort(piece_request, kind="stable")
+    return AlphaSweep(
+        alpha_min=float(alpha_min),
+        alpha_max=float(alpha_max),
+        piece_offsets=lengths_to_offsets(np.bincount(piece_request, minlength=n)),
+        piece_start=np.concatenate(piece_start)[order],
+        metrics={name: np.concatenate(values)[order] for name, values in piece_metrics.items()},
+    )
@@ -0,0 +1,252 @@
+"""
+Blending Metrics
+
+Per-request top-K metrics, computed on flat arrays. The names and formulas
+follow ``calculate_metric_pack`` of the reference notebook:
+
+- ads load: number of items with a positive revenue signal among the first K;
+- engagement / revenue util: sum of ``signal / log2(i + 2)`` over the first
+  K slots (slot ``i`` is 0-based).
+
+The ``*_blended`` metrics are taken over the blended ``merged_result`` list,
+the others over the fixed-slot order (``sorted_struct``: ads and NV items
+sorted by card position). ``metric_pack`` computes all six columns in one
+pass; ``spark_metrics`` holds the same computation for Spark.
+
+``metric_cube`` evaluates several cut-offs at once: the slot discounts do not
+depend on K, so per-request prefix sums over the slots give every metric at
+every K from one pass.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+from src.algorithms.batch_blending import SOURCE_ADS, BlendedBatch, BlendingInput, request_ids
+
+ADS_LOAD_COL = "ads_load_topk_blended"
+ENGAGEMENT_DCG_COL = "sum_engagement_util_topk_blended"
+REVENUE_DCG_COL = "sum_revenue_util_topk_blended"
+METRIC_COLS = (ADS_LOAD_COL, ENGAGEMENT_DCG_COL, REVENUE_DCG_COL)
+
+FIXED_ADS_LOAD_COL = "ads_load_topk"
+FIXED_ENGAGEMENT_DCG_COL = "sum_enga_util_topk"
+FIXED_REVENUE_DCG_COL = "sum_rev_util_topk"
+FIXED_METRIC_COLS = (FIXED_ADS_LOAD_COL, FIXED_ENGAGEMENT_DCG_COL, FIXED_REVENUE_DCG_COL)
+
+# (fixed-slot, blended) pairs in the row order of the notebook's metric table.
+METRIC_PAIRS = tuple(zip(FIXED_METRIC_COLS, METRIC_COLS))
+
+
+def slot_discounts(k: int) -> np.ndarray:
+    """``1 / log2(i + 2)`` for slots ``i = 0..k-1``."""
+    return 1.0 / np.log2(np.arange(k) + 2.0)
+
+
+def _topk_sums(owner, slot, revenue, engagement, k, n):
+    """Per-owner ``(ads load, engagement util, revenue util)`` of the items in slots below ``k``."""
+    top = slot < k
+    owner, slot = owner[top], slot[top]
+    revenue, engagement = revenue[top], engagement[top]
+    discount = slot_discounts(k)[slot]
+    return (
+        np.bincount(owner[revenue > 0], minlength=n),
+        np.bincount(owner, weights=engagement * discount, minlength=n),
+        np.bincount(owner, weights=revenue * discount, minlength=n),
+    )
+
+
+def _blended_items(blended: BlendedBatch, k: int):
+    """``(owner, slot, revenue, engagement)`` of the top-``k`` blended items."""
+    inputs = blended.inputs
+    slot = blended.slot
+    top = np.flatnonzero(slot < k)
+    return (
+        blended.owner[top],
+        slot[top],
+        blended.gather(inputs.ad_expected_value, None, top),
+        blended.gather(inputs.ad_quality_score, inputs.nv_pctr, top),
+    )
+
+
+def topk_metrics(blended: BlendedBatch, k: int) -> Dict[str, np.ndarray]:
+    """Per-request top-``k`` metrics of ``blended``, keyed by the notebook column names.
+
+    Signals are gathered for the top-``k`` items only.
+    """
+    sums = _topk_sums(*_blended_items(blended, k), k, len(blended))
+    return dict(zip(METRIC_COLS, sums))
+
+
+def ad_slot_histogram(blended: BlendedBatch, k: int) -> np.ndarray:
+    """Number of ads (non-zero revenue signal) in each of the top-``k`` slots, over all requests.
+
+    The data behind the notebook's ``plot_ad_slot_index_distribution_util_blending``.
+    """
+    slot = blended.slot
+    lo, hi = blended.offsets[0], blended.offsets[-1]
+    candidates = np.flatnonzero((slot < k) & (blended.source[lo:hi] == SOURCE_ADS))
+    revenue = blended.gather(blended.inputs.ad_expected_value, None, candidates)
+    return np.bincount(slot[candidates[revenue != 0]], minlength=k)
+
+
+def fixed_slot_histogram(inputs: BlendingInput, k: int) -> np.ndarray:
+    """Number of ads (non-zero revenue) in each of the top-``k`` fixed-slot positions, over all requests.
+
+    The data behind the notebook's ``plot_ad_slot_index_distribution_fixed_slot``.
+    """
+    _, slot, revenue, _ = _fixed_slot_items(inputs)
+    return np.bincount(slot[(slot < k) & (revenue != 0)], minlength=k)
+
+
+def _fixed_slot_order(owner, position, engagement, revenue) -> np.ndarray:
+    """``lexsort`` by ``(owner, position, engagement, revenue)``.
+
+    Owner and position are packed into one int64 key, so the full sort is a
+    single stable argsort; only items tied on that key are then ordered by
+    engagement and revenue.
+    """
+    position = position.astype(np.int64)
+    lo = position.min(initial=0)
+    if position.max(initial=0) - lo >= 2 ** 32:
+        return np.lexsort((revenue, engagement, position, owner))
+    key = (owner.astype(np.int64) << 32) | (position - lo)
+    order = np.argsort(key, kind="stable")
+    sorted_key = key[order]
+    tied = np.flatnonzero(sorted_key[1:] == sorted_key[:-1])
+    if len(tied):
+        # Tied runs are contiguous, so re-sorting just their members keeps
+        # them within the slots they already occupy.
+        members = np.union1d(tied, tied + 1)
+        sub = order[members]
+        order[members] = sub[np.lexsort((revenue[sub], engagement[sub], sorted_key[members]))]
+    return order
+
+
+def _fixed_slot_items(inputs: BlendingInput):
+    """``(owner, slot, revenue, engagement)`` of every item in the fixed-slot order."""
+    ad_lo, ad_hi = inputs.ad_offsets[0], inputs.ad_offsets[-1]
+    nv_lo, nv_hi = inputs.nv_offsets[0], inputs.nv_offsets[-1]
+    owner = np.concatenate([request_ids(inputs.ad_offsets), request_ids(inputs.nv_offsets)])
+    position = np.concatenate([inputs.ad_card_position[ad_lo:ad_hi], inputs.nv_card_position[nv_lo:nv_hi]])
+    engagement = np.concatenate([inputs.ad_quality_score[ad_lo:ad_hi], inputs.nv_pctr[nv_lo:nv_hi]])
+    revenue = np.concatenate([inputs.ad_expected_value[ad_lo:ad_hi], np.zeros(nv_hi - nv_lo)])
+
+    order = _fixed_slot_order(owner, position, engagement, revenue)
+    owner = owner[order]
+    starts = np.searchsorted(owner, np.arange(len(inputs)))
+    slot = np.arange(len(owner)) - starts[owner]
+    return owner, slot, revenue[order], engagement[order]
+
+
+def fixed_slot_metrics(inputs: BlendingInput, k: int) -> Dict[str, np.ndarray]:
+    """Per-request top-``k`` metrics of the fixed-slot order (``sorted_struct``).
+
+    Items are sorted like ``sort_array`` of ``(position, engagement, revenue)``
+    structs, with revenue 0 for NV items.
+    """
+    sums = _topk_sums(*_fixed_slot_items(inputs), k, len(inputs))
+    return dict(zip(FIXED_METRIC_COLS, sums))
+
+
+def metric_pack(blended: BlendedBatch, k: int) -> Dict[str, np.ndarray]:
+    """All six notebook metric columns of ``blended``, fixed-slot and blended, in one pass.
+
+    The top-``k`` items of both orders go through a single set of
+    ``bincount`` reductions (blended items are counted under owner ``n + r``).
+    Keys follow ``METRIC_PAIRS`` order, like the rows of the notebook's table.
+    """
+    return _metric_pack(blended, k)[0]
+
+
+def metric_pack_and_fixed_slots(blended: BlendedBatch, k: int) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """``metric_pack`` and ``fixed_slot_histogram`` of ``blended``, from one fixed-slot sort."""
+    values, fixed = _metric_pack(blended, k)
+    _, slot, revenue, _ = fixed
+    return values, np.bincount(slot[revenue != 0], minlength=k)
+
+
+def _metric_pack(blended: BlendedBatch, k: int):
+    """The metric pack and the top-``k`` fixed-slot items it was computed from."""
+    n = len(blended)
+    fixed = _fixed_slot_items(blended.inputs)
+    top = fixed[1] < k
+    fixed = [column[top] for column in fixed]
+    owner, slot, revenue, engagement = _blended_items(blended, k)
+    sums = _topk_sums(
+        np.concatenate([fixed[0], owner + n]),
+        np.concatenate([fixed[1], slot]),
+        np.concatenate([fixed[2], revenue]),
+        np.concatenate([fixed[3], engagement]),
+        k, 2 * n,
+    )
+    values = {}
+    for (fixed_col, blended_col), column in zip(METRIC_PAIRS, sums):
+        values[fixed_col], values[blended_col] = column[:n], column[n:]
+    return values, fixed
+
+
+@dataclass
+class MetricCube:
+    """Per-request metrics at several cut-offs.
+
+    ``values[name][r, i]`` is metric ``name`` (the notebook column names, in
+    ``METRIC_PAIRS`` order) of request ``r`` at ``K = ks[i]``.
+    """
+
+    ks: np.ndarray
+    values: Dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(next(iter(self.values.values())))
+
+    def at(self, k: int) -> Dict[str, np.ndarray]:
+        """Per-request metrics at ``K = k``, like ``metric_pack(blended, k)``."""
+        match = np.flatnonzero(self.ks == k)
+        if not len(match):
+            raise KeyError(f"K={k} is not in the cube (ks={self.ks.tolist()})")
+        return {name: values[:, match[0]] for name, values in self.values.items()}
+
+
+def _prefix_sums(owner, slot, revenue, engagement, k, n):
+    """Per-owner cumulative ``(ads load, engagement util, revenue util)`` over slots ``0..k-1``, each ``(n, k)``."""
+    top = slot < k
+    owner, slot = owner[top], slot[top]
+    revenue, engagement = revenue[top], engagement[top]
+    cell = owner * k + slot
+    discount = slot_discounts(k)[slot]
+    return tuple(
+        np.cumsum(np.bincount(cell, weights=weights, minlength=n * k).reshape(n, k), axis=1)
+        for weights in ((revenue > 0).astype(np.float64), engagement * discount, revenue * discount)
+    )
+
+
+def metric_cube(blended: BlendedBatch, ks: Iterable[int]) -> MetricCube:
+    """All six notebook metrics of ``blended`` at every cut-off in ``ks``, from one pass.
+
+    ``blended`` must hold at least ``max(ks)`` items per request (blend with
+    ``top_k=max(ks)`` or without truncation).
+    """
+    ks = np.unique(np.asarray(list(ks), dtype=np.int64))
+    if not len(ks) or ks[0] < 1:
+        raise ValueError(f"ks must be positive cut-offs, got {ks.tolist()}")
+    n, k_max = len(blended), int(ks[-1])
+    fixed = _fixed_slot_items(blended.inputs)
+    top = fixed[1] < k_max
+    fixed = [column[top] for column in fixed]
+    owner, slot, revenue, engagement = _blended_items(blended, k_max)
+    prefixes = _prefix_sums(
+        np.concatenate([fixed[0], owner + n]),
+        np.concatenate([fixed[1], slot]),
+        np.concatenate([fixed[2], revenue]),
+        np.concatenate([fixed[3], engagement]),
+        k_max, 2 * n,
+    )
+    values = {}
+    for (fixed_col, blended_col), prefix in zip(METRIC_PAIRS, prefixes):
+        at_ks = prefix[:, ks - 1]
+        values[fixed_col], values[blended_col] = at_ks[:n], at_ks[n:]
+    for name in (FIXED_ADS_LOAD_COL, ADS_LOAD_COL):
+        values[name] = values[name].astype(np.int64)
+    return MetricCube(ks=ks, values=values)
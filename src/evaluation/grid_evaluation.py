@@ -0,0 +1,192 @@
+"""
+Grid Evaluation
+
+Evaluates a whole grid of blending configurations against one parsed copy
+of the input requests. The raw list columns are parsed once into a
+``BlendingInput`` and its bms ids are interned once; each worker process
+receives that input once, through the pool initializer, and then blends it
+with every config it is handed. Each
+config yields the notebook's ``calculate_metric_pack`` table: one row per
+metric with ``mean``, ``median`` and the 25/50/75% ``quantiles``.
+"""
+
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.algorithms.interning import intern_ids
+from src.config.blending_config import BlendingConfig
+from src.evaluation.blending_metrics import (
+    METRIC_PAIRS,
+    MetricCube,
+    ad_slot_histogram,
+    fixed_slot_histogram,
+    fixed_slot_metrics,
+    metric_pack,
+    topk_metrics,
+)
+
+QUANTILES = (0.25, 0.50, 0.75)
+KNOB_COLS = ["k", "alpha", "beta", "max_ads_block_size", "min_nv_block_size"]
+
+# Input of the worker processes, set once by the pool initializer, and the
+# fixed-slot metrics computed from it so far (per K).
+_worker_inputs: Optional[BlendingInput] = None
+_worker_fixed: Dict[int, Dict[str, np.ndarray]] = {}
+
+
+def config_grid(
+    k: Iterable[int] = (12,),
+    alpha: Iterable[float] = (20.0,),
+    max_ads_block_size: Iterable[int] = (3,),
+    min_nv_block_size: Iterable[int] = (2,),
+    beta: Iterable[Optional[float]] = (None,),
+) -> List[BlendingConfig]:
+    """Cartesian product of the given knob values."""
+    return [
+        BlendingConfig(k=kk, alpha=a, beta=b, max_ads_block_size=m, min_nv_block_size=n)
+        for kk, a, b, m, n in itertools.product(k, alpha, beta, max_ads_block_size, min_nv_block_size)
+    ]
+
+
+def summarize_metrics(values: Mapping[str, np.ndarray]) -> pd.DataFrame:
+    """The notebook's metric table: ``metric``, ``mean``, ``median`` and ``quantiles`` per metric.
+
+    Quantiles are exact order statistics (the value ``percentile_approx``
+    converges to), not interpolated. All metrics, which share one length,
+    are sorted together in a single pass.
+    """
+    names = list(values)
+    table = np.array([np.asarray(values[name], dtype=np.float64) for name in names]).reshape(len(names), -1)
+    n = table.shape[1]
+    if n:
+        ranks = np.maximum(np.ceil(np.multiply(QUANTILES, n)).astype(np.int64) - 1, 0)
+        quantiles = np.sort(table, axis=1)[:, ranks]
+        means = table.mean(axis=1)
+    else:
+        quantiles = np.full((len(names), len(QUANTILES)), np.nan)
+        means = np.full(len(names), np.nan)
+    return pd.DataFrame({
+        "metric": names,
+        "mean": means,
+        "median": quantiles[:, QUANTILES.index(0.50)],
+        "quantiles": quantiles.tolist(),
+    }, columns=["metric", "mean", "median", "quantiles"])
+
+
+def summarize_cube(cube: MetricCube) -> pd.DataFrame:
+    """``summarize_metrics`` of every cut-off of ``cube``, stacked with a leading ``k`` column."""
+    frames = [summarize_metrics(cube.at(k)).assign(k=int(k)) for k in cube.ks]
+    stacked = pd.concat(frames, ignore_index=True)
+    return stacked[["k"] + [c for c in stacked.columns if c != "k"]]
+
+
+def evaluate_config(
+    inputs: BlendingInput,
+    config: BlendingConfig,
+    fixed: Optional[Mapping[str, np.ndarray]] = None,
+) -> pd.DataFrame:
+    """Metric table of one config; ``fixed`` reuses already computed fixed-slot metrics."""
+    blended = blend_batch(inputs, config, top_k=config.k)
+    if fixed is None:
+        return summarize_metrics(metric_pack(blended, config.k))
+    blended = topk_metrics(blended, config.k)
+    values = {}
+    for fixed_col, blended_col in METRIC_PAIRS:
+        values[fixed_col] = fixed[fixed_col]
+        values[blended_col] = blended[blended_col]
+    return summarize_metrics(values)
+
+
+def _init_worker(inputs: BlendingInput) -> None:
+    global _worker_inputs
+    _worker_inputs = inputs
+
+
+def _evaluate_in_worker(config: BlendingConfig) -> pd.DataFrame:
+    if config.k not in _worker_fixed:
+        _worker_fixed[config.k] = fixed_slot_metrics(_worker_inputs, config.k)
+    return evaluate_config(_worker_inputs, config, _worker_fixed[config.k])
+
+
+def evaluate_grid(
+    inputs: BlendingInput,
+    configs: Sequence[BlendingConfig],
+    max_workers: Optional[int] = None,
+) -> Dict[BlendingConfig, pd.DataFrame]:
+    """Metric table of every config in ``configs``, evaluated on the same parsed ``inputs``.
+
+    Args:
+        inputs: Parsed requests, shared by all configs.
+        configs: Configs to evaluate (e.g. from ``config_grid``).
+        max_workers: Worker processes; ``1`` evaluates in this process and
+            ``None`` uses one per CPU.
+
+    Returns:
+        Metric table per config, in ``configs`` order. ``config.table_suffix``
+        gives the notebook's per-config output table suffix.
+    """
+    inputs = intern_ids(inputs)
+    if max_workers == 1 or len(configs) <= 1:
+        fixed = {k: fixed_slot_metrics(inputs, k) for k in {c.k for c in configs}}
+        return {config: evaluate_config(inputs, config, fixed[config.k]) for config in configs}
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(inputs,)) as pool:
+        return dict(zip(configs, pool.map(_evaluate_in_worker, configs)))
+
+
+def _blended_histogram(inputs: BlendingInput, config: BlendingConfig) -> np.ndarray:
+    return ad_slot_histogram(blend_batch(inputs, config, top_k=config.k), config.k)
+
+
+def _histogram_in_worker(config: BlendingConfig) -> np.ndarray:
+    return _blended_histogram(_worker_inputs, config)
+
+
+def _knobs(config: BlendingConfig) -> Dict[str, object]:
+    return dict(
+        k=config.k,
+        alpha=config.alpha,
+        beta=config.effective_beta,
+        max_ads_block_size=config.max_ads_block_size,
+        min_nv_block_size=config.min_nv_block_size,
+    )
+
+
+def slot_histogram_grid(
+    inputs: BlendingInput,
+    configs: Sequence[BlendingConfig],
+    max_workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """Ad counts per top-K slot for every config, fixed-slot and blended order.
+
+    Returns one ``order == "fixed"`` and one ``order == "blended"`` row per
+    config: the knob columns, ``order``, then one count column per slot
+    ``0..max K - 1`` (zero past each config's K). The blended rows form the
+    (config x slot) matrix of the notebook's ad slot plots.
+    """
+    inputs = intern_ids(inputs)
+    if max_workers == 1 or len(configs) <= 1:
+        blended = [_blended_histogram(inputs, config) for config in configs]
+    else:
+        with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(inputs,)) as pool:
+            blended = list(pool.map(_histogram_in_worker, configs))
+    fixed = {k: fixed_slot_histogram(inputs, k) for k in {c.k for c in configs}}
+    k_max = max((c.k for c in configs), default=0)
+    rows = []
+    for config, counts in zip(configs, blended):
+        for order, values in (("fixed", fixed[config.k]), ("blended", counts)):
+            padded = np.zeros(k_max, dtype=np.int64)
+            padded[:config.k] = values
+            rows.append({**_knobs(config), "order": order, **dict(enumerate(padded.tolist()))})
+    return pd.DataFrame(rows, columns=KNOB_COLS + ["order"] + list(range(k_max)))
+
+
+def grid_results_frame(results: Mapping[BlendingConfig, pd.DataFrame]) -> pd.DataFrame:
+    """All per-config tables stacked into one, with the config knobs as leading columns."""
+    frames = [table.assign(**_knobs(config)) for config, table in results.items()]
+    stacked = pd.concat(frames, ignore_index=True)
+    return stacked[KNOB_COLS + [c for c in stacked.columns if c not in KNOB_COLS]]
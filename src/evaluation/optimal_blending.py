@@ -0,0 +1,428 @@
+"""
+Optimal Blending
+
+Exact solver for the best top-K arrangement of every request under the
+greedy's blending rules, as a yardstick for the greedy merge of
+``merge_sort_blending_dedup``.
+
+The objective is the one the greedy trades off at every step, summed over
+the top K slots with the metric discounts: an ad in slot ``s`` is worth
+``(expected_value + alpha * quality_score) / log2(s + 2)``, an NV item
+``beta * pctr / log2(s + 2)``. With ``beta == alpha`` this is
+``revenue util + alpha * engagement util`` of ``blending_metrics``.
+
+An arrangement is any order ``merge_sort_blending_dedup`` can produce when
+its ad-or-NV comparison is left free at every step. The greedy's own order is
+one of them, so the optimum is never below it. The rules are the greedy's:
+
+- items come from the head of the ad or NV list (each list keeps its order),
+  and an item whose bms id is already placed is skipped;
+- at most ``max_ads_block_size`` ads follow each other. A full ad block, or
+  an NV item placed after ads, forces more NV items: ``min_nv_block_size``
+  minus the NV items chosen since the last forced block, at least one;
+- forced NV items after the first, and the item placed right after them,
+  skip the id check, so they may repeat a placed id;
+- once the NV list is used up, ads are placed until the ad block is full;
+  once the ad list is used up, only the NV items still forced are placed
+  and the rest of the NV list is dropped.
+
+Every item passed over was either placed or skipped for a placed id, so the
+ids placed after passing ``i`` ads and ``j`` NV items are exactly the ids of
+``ads[:i]`` and ``nv[:j]``: whether an item repeats a placed id follows from
+``(i, j)``, and the slot of the next item is the number of those ids plus
+the repeats placed so far. The dynamic program runs over states ``(i, j,
+repeats, block counters)``, backwards from the cells whose slot reaches K,
+one ``(i, j)`` cell at a time for a whole chunk of requests; requests are
+chunked by how many repeats they could place, which keeps that axis short.
+Only the list prefixes holding the first K distinct ids can reach the top K,
+so the grid is about ``K x K`` cells whatever the list lengths.
+
+``optimality_gap`` blends the same requests with ``blend_batch`` and
+returns both values, the gap and the top-K metrics of both orders per
+request; ``summarize_gap`` condenses that into one row.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.algorithms.batch_blending import (
+    SOURCE_ADS,
+    SOURCE_NV,
+    BlendedBatch,
+    BlendingInput,
+    blend_batch,
+    request_ids,
+)
+from src.algorithms.interning import intern_ids
+from src.config.blending_config import BlendingConfig
+from src.evaluation.blending_metrics import METRIC_COLS, slot_discounts, topk_metrics
+from src.utils.ragged import lengths_to_offsets
+
+DEFAULT_CHUNK_SIZE = 1024
+GREEDY_VALUE_COL = "greedy_value"
+OPTIMAL_VALUE_COL = "optimal_value"
+GAP_COL = "gap"
+RELATIVE_GAP_COL = "relative_gap"
+
+
+def blend_value(blended: BlendedBatch, config: BlendingConfig, k: Optional[int] = None) -> np.ndarray:
+    """Per-request top-``k`` objective of a blended order (``config.k`` by default)."""
+    k = config.k if k is None else k
+    inputs = blended.inputs
+    slot = blended.slot
+    top = np.flatnonzero(slot < k)
+    is_ad = blended.source[blended.offsets[0] + top] == SOURCE_ADS
+    revenue = blended.gather(inputs.ad_expected_value, None, top)
+    engagement = blended.gather(inputs.ad_quality_score, inputs.nv_pctr, top)
+    weight = np.where(is_ad, config.alpha, config.effective_beta)
+    value = (revenue + weight * engagement) * slot_discounts(k)[slot[top]]
+    return np.bincount(blended.owner[top], weights=value, minlength=len(blended))
+
+
+class _Lists:
+    """Padded ``(n, width + 1)`` views of the list prefixes that can reach the top K.
+
+    ``first`` flags the first occurrence of an id within its list and
+    ``other`` is the position of the id's first occurrence in the other list
+    (``width + 1`` if absent or beyond the prefix); the last column is padding.
+    """
+
+    def __init__(self, offsets, ids, values, first_here, first_other, k):
+        n = len(offsets) - 1
+        lo, hi = offsets[0], offsets[-1]
+        owner = request_ids(offsets)
+        position = np.arange(hi - lo) - (offsets[:-1] - lo)[owner]
+        first = first_here[ids] == position
+        # Distinct ids before every item; the prefix stops at the k-th.
+        seen = np.zeros(len(first) + 1, dtype=np.int64)
+        np.cumsum(first, out=seen[1:])
+        keep = seen[:-1] - seen[offsets[:-1] - lo][owner] < k
+        self.length = np.bincount(owner[keep], minlength=n)
+        self.width = int(self.length.max(initial=0))
+
+        shape = (n, self.width + 1)
+        rows, cols = owner[keep], position[keep]
+        self.value = np.zeros(shape)
+        self.first = np.zeros(shape, dtype=bool)
+        self.other = np.full(shape, np.iinfo(np.int32).max, dtype=np.int64)
+        self.value[rows, cols] = values[keep]
+        self.first[rows, cols] = first[keep]
+        self.other[rows, cols] = first_other[ids[keep]]
+
+
+def _first_positions(offsets, keys, size) -> np.ndarray:
+    """Position of the first item of every key within its list (int32 max if absent)."""
+    owner = request_ids(offsets)
+    position = np.arange(len(keys)) - (offsets[:-1] - offsets[0])[owner]
+    first = np.full(size, np.iinfo(np.int32).max, dtype=np.int64)
+    np.minimum.at(first, keys, position)
+    return first
+
+
+def _lists(inputs: BlendingInput, config: BlendingConfig, k: int) -> Tuple[_Lists, _Lists]:
+    """Ad and NV prefixes; values are the per-item objective weights."""
+    ad_lo, ad_hi = inputs.ad_offsets[0], inputs.ad_offsets[-1]
+    nv_lo, nv_hi = inputs.nv_offsets[0], inputs.nv_offsets[-1]
+    id_base = lengths_to_offsets(inputs.n_ids)
+    ad_keys = id_base[request_ids(inputs.ad_offsets)] + inputs.ad_bms_id[ad_lo:ad_hi]
+    nv_keys = id_base[request_ids(inputs.nv_offsets)] + inputs.nv_bms_id[nv_lo:nv_hi]
+    ad_first = _first_positions(inputs.ad_offsets, ad_keys, id_base[-1])
+    nv_first = _first_positions(inputs.nv_offsets, nv_keys, id_base[-1])
+
+    ad_values = inputs.ad_expected_value[ad_lo:ad_hi] + config.alpha * inputs.ad_quality_score[ad_lo:ad_hi]
+    nv_values = config.effective_beta * inputs.nv_pctr[nv_lo:nv_hi]
+    ads = _Lists(inputs.ad_offsets, ad_keys, ad_values, ad_first, nv_first, k)
+    nv = _Lists(inputs.nv_offsets, nv_keys, nv_values, nv_first, ad_first, k)
+    return ads, nv
+
+
+def _prepare(inputs: BlendingInput, config: BlendingConfig, k: int) -> Tuple[_Lists, _Lists, np.ndarray]:
+    """Ad and NV prefixes and the slot of every ``(i, j)`` cell."""
+    ads, nv = _lists(inputs, config, k)
+
+    # Slot of cell (i, j): distinct ids of ads[:i] and nv[:j].
+    j = np.arange(nv.width + 1)
+    shared = ads.first[:, :-1, None] & (ads.other[:, :-1, None] < j)
+    slots = np.zeros((len(inputs), ads.width + 1, nv.width + 1), dtype=np.int32)
+    slots[:, 1:, :] -= np.cumsum(shared, axis=1, dtype=np.int32)
+    slots += np.concatenate([np.zeros((len(inputs), 1), np.int32), np.cumsum(ads.first[:, :-1], axis=1)], 1)[:, :, None]
+    slots += np.concatenate([np.zeros((len(inputs), 1), np.int32), np.cumsum(nv.first[:, :-1], axis=1)], 1)[:, None, :]
+    return ads, nv, slots
+
+
+def _cell(ads: _Lists, nv: _Lists, i, j):
+    """``(has ad, has NV, ad repeats a placed id, NV item repeats a placed id)`` at cell ``(i, j)``, per request."""
+    rows = np.arange(len(ads.length))
+    has_ad = i < ads.length
+    has_nv = j < nv.length
+    repeat_ad = has_ad & (~ads.first[rows, i] | (ads.other[rows, i] < j))
+    repeat_nv = has_nv & (~nv.first[rows, j] | (nv.other[rows, j] < i))
+    return has_ad, has_nv, repeat_ad, repeat_nv
+
+
+def _repeats(ads: _Lists, nv: _Lists) -> np.ndarray:
+    """Items of each request's prefixes that can repeat a placed id: the most repeats it can place."""
+
+    def count(lists: _Lists, other: _Lists) -> np.ndarray:
+        real = np.arange(lists.width) < lists.length[:, None]
+        return (real & (~lists.first[:, :-1] | (lists.other[:, :-1] < other.length[:, None]))).sum(axis=1)
+
+    return count(ads, nv) + count(nv, ads)
+
+
+class _Cell:
+    """Best values from one ``(i, j)`` cell on, by repeats placed ``d`` and phase.
+
+    ``top[:, d, ads, nv]`` is an ordinary step after ``ads`` consecutive ads
+    with ``nv`` NV items chosen since the last forced block (capped where the
+    forced count stops shrinking); ``must[:, d, f - 1]`` the step that starts
+    ``f`` forced NV items; ``forced[:, d, f - 1]`` the unchecked forced items
+    after the first; ``post[:, d]`` the unchecked step after a forced block.
+    """
+
+    def __init__(self, n: int, repeats: int, max_ads: int, forced: int):
+        self.top = np.zeros((n, repeats + 1, max_ads + 1, forced))
+        self.must = np.zeros((n, repeats + 1, forced))
+        self.forced = np.zeros((n, repeats + 1, forced))
+        self.post = np.zeros((n, repeats + 1))
+
+
+def _after(repeat: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """``values`` from the next state, one more repeat along for the requests placing one."""
+    shifted = np.zeros_like(values)
+    shifted[:, :-1] = values[:, 1:]
+    return np.where(repeat.reshape((-1,) + (1,) * (values.ndim - 1)), shifted, values)
+
+
+def _solve_chunk(inputs: BlendingInput, config: BlendingConfig, k: int):
+    n = len(inputs)
+    ads, nv, slots = _prepare(inputs, config, k)
+    max_ads = max(config.max_ads_block_size, 0)
+    forced = max(config.min_nv_block_size, 1)
+    repeats = min(k, int(_repeats(ads, nv).max(initial=0)))
+    # NV items chosen since the last forced block, after one more; and the forced count that follows.
+    chosen = np.minimum(np.arange(forced) + 1, forced - 1)
+    owed = forced - 1 - chosen
+    discounts = np.append(slot_discounts(k), 0.0)
+    depth = np.arange(repeats + 1)
+
+    chose_ad = np.zeros((n, ads.width + 1, nv.width + 1, repeats + 1, max(max_ads, 1), forced), dtype=bool)
+    post_ad = np.zeros((n, ads.width + 1, nv.width + 1, repeats + 1), dtype=bool)
+    below = [_Cell(n, repeats, max_ads, forced)] * (nv.width + 2)
+    for i in range(ads.width, -1, -1):
+        row = [None] * (nv.width + 1) + [_Cell(n, repeats, max_ads, forced)]
+        for j in range(nv.width, -1, -1):
+            has_ad, has_nv, repeat_ad, repeat_nv = _cell(ads, nv, i, j)
+            down, right, cell = below[j], row[j + 1], _Cell(n, repeats, max_ads, forced)
+            discount = discounts[np.minimum(slots[:, i, j, None] + depth, k)]
+            ad_gain = discount * ads.value[:, i, None]
+            nv_gain = discount * nv.value[:, j, None]
+            both = has_ad & has_nv
+
+            # After a forced block: unchecked, the block counters start over.
+            if max_ads:
+                post_take_ad = ad_gain + _after(repeat_ad, down.top[:, :, 1, 0])
+                post_take_nv = nv_gain + _after(repeat_nv, right.top[:, :, 0, min(1, forced - 1)])
+                post_ad[:, i, j] = post_take_ad > post_take_nv
+                cell.post = np.where(both[:, None], np.maximum(post_take_ad, post_take_nv),
+                                     np.where(has_ad[:, None], post_take_ad, 0.0))
+
+            # The first forced NV item is checked, the others are not.
+            next_forced = np.concatenate([right.post[:, :, None], right.forced[:, :, :-1]], axis=2)
+            cell.must = np.select(
+                [repeat_ad[:, None, None], repeat_nv[:, None, None], has_nv[:, None, None], has_ad[:, None, None]],
+                [down.must, right.must, nv_gain[:, :, None] + next_forced, cell.post[:, :, None]],
+            )
+            if not max_ads:
+                cell.post = np.where(both[:, None], cell.must[:, :, -1], cell.post)
+            cell.forced = np.where(has_nv[:, None, None], nv_gain[:, :, None] + _after(repeat_nv, next_forced),
+                                   cell.post[:, :, None])
+
+            # Ordinary step: skip a repeated id, fill a full ad block with NV, or choose.
+            take_ad = ad_gain[:, :, None, None] + down.top[:, :, 1:, :]
+            after_nv = np.concatenate([right.top[:, :, :1, chosen],
+                                       np.repeat(right.must[:, :, None, owed], max(max_ads - 1, 0), axis=2)], axis=2)
+            take_nv = nv_gain[:, :, None, None] + after_nv[:, :, :max_ads]
+            chose_ad[:, i, j, :, :max_ads] = take_ad > take_nv
+            step = np.zeros_like(cell.top)
+            step[:, :, :max_ads] = np.where(both[:, None, None, None], np.maximum(take_ad, take_nv), take_ad)
+            step[:, :, max_ads] = np.where(both[:, None, None], cell.must[:, :, ::-1], 0.0)
+            cell.top = np.select(
+                [repeat_ad[:, None, None, None], repeat_nv[:, None, None, None], has_ad[:, None, None, None]],
+                [down.top, right.top, step],
+            )
+            row[j] = cell
+        below = row
+    return ads, nv, slots, chose_ad, post_ad, below[0].top[:, 0, 0, 0]
+
+
+_TOP, _MUST, _FORCED, _POST = range(4)
+
+
+def _trace(ads: _Lists, nv: _Lists, slots, chose_ad, post_ad, config: BlendingConfig, k: int):
+    """``(n, k)`` sources and indexes (``-1`` past the end) of the optimal arrangements."""
+    n = len(ads.length)
+    rows = np.arange(n)
+    max_ads = max(config.max_ads_block_size, 0)
+    forced = max(config.min_nv_block_size, 1)
+    source = np.full((n, k), -1, dtype=np.int8)
+    index = np.full((n, k), -1, dtype=np.int32)
+    i, j, repeats, phase, ads_run, nv_run, left = (np.zeros(n, dtype=np.int64) for _ in range(7))
+    active = np.ones(n, dtype=bool)
+    for _ in range(4 * (ads.width + nv.width + 2)):
+        has_ad, has_nv, repeat_ad, repeat_nv = _cell(ads, nv, i, j)
+        slot = slots[rows, i, j] + repeats
+        checked = (phase == _TOP) | (phase == _MUST)
+        skip_ad = checked & repeat_ad
+        skip_nv = checked & ~repeat_ad & repeat_nv
+        fresh = ~skip_ad & ~skip_nv
+
+        # The step after a forced block is an ordinary one without the id check.
+        step = fresh & ((phase == _TOP) | (phase == _POST))
+        wants_ad = np.where(
+            phase == _POST,
+            post_ad[rows, i, j, repeats],
+            chose_ad[rows, i, j, repeats, np.minimum(ads_run, max(max_ads - 1, 0)), nv_run],
+        )
+        full = ads_run >= max_ads
+        place_ad = step & has_ad & ~full & (wants_ad | ~has_nv)
+        choose_nv = step & has_ad & has_nv & ~full & ~place_ad
+        to_must = step & has_ad & has_nv & full
+        force = fresh & ((phase == _MUST) | (phase == _FORCED))
+        force_nv = force & has_nv
+        to_post = force & ~has_nv
+        active &= (slot < k) & (skip_ad | skip_nv | place_ad | choose_nv | to_must | force_nv | to_post)
+        if not active.any():
+            break
+
+        place_nv = active & (choose_nv | force_nv)
+        place_ad &= active
+        placed = place_ad | place_nv
+        source[rows[placed], slot[placed]] = np.where(place_ad[placed], SOURCE_ADS, SOURCE_NV)
+        index[rows[placed], slot[placed]] = np.where(place_ad, i, j)[placed]
+        repeats += (place_ad & repeat_ad) | (place_nv & repeat_nv)
+
+        ends_block = choose_nv & (ads_run > 0)
+        nv_run = np.where(choose_nv, np.minimum(nv_run + 1, forced - 1), nv_run)
+        left = np.where(to_must | ends_block, forced - nv_run, np.where(force_nv, left - 1, left))
+        ads_run = np.where(place_ad, ads_run + 1, np.where(choose_nv | to_must, 0, ads_run))
+        new_phase = np.select(
+            [to_must | ends_block, force_nv & (left > 0), force_nv | to_post, place_ad | choose_nv],
+            [_MUST, _FORCED, _POST, _TOP],
+            phase,
+        )
+        nv_run[new_phase == _POST] = 0
+        phase = np.where(active, new_phase, phase)
+        i += active & (skip_ad | place_ad)
+        j += active & (skip_nv | place_nv)
+    return source, index
+
+
+def optimal_blend(
+    inputs: BlendingInput,
+    config: BlendingConfig = BlendingConfig(),
+    k: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Tuple[BlendedBatch, np.ndarray]:
+    """Best top-``k`` arrangement of every request and its objective value.
+
+    Args:
+        inputs: Requests to blend; bms ids are interned if they are not yet.
+        config: Blending knobs; ``config.k`` is the cut-off unless ``k`` is given.
+        k: Number of top slots the objective counts.
+        chunk_size: Requests solved together; the DP tables take up to
+            ``chunk_size * (K + 1)^3 * (max_ads_block_size + 1) * min_nv_block_size``
+            bytes.
+
+    Returns:
+        The optimal arrangements (at most ``k`` items per request, indexes as
+        in ``blend_batch``) and their per-request objective values.
+    """
+    k = config.k if k is None else k
+    inputs = intern_ids(inputs)
+    n = len(inputs)
+    # Chunks of requests with as many possible repeats keep the repeats axis of the DP short.
+    order = np.argsort(_repeats(*_lists(inputs, config, k)), kind="stable")
+    ordered = inputs.take(order)
+    source = np.full((n, k), -1, dtype=np.int8)
+    index = np.full((n, k), -1, dtype=np.int32)
+    values = np.zeros(n)
+    for start in range(0, n, chunk_size):
+        requests = order[start:start + chunk_size]
+        ads, nv, slots, chose_ad, post_ad, values[requests] = _solve_chunk(
+            ordered.slice(start, start + len(requests)), config, k
+        )
+        source[requests], index[requests] = _trace(ads, nv, slots, chose_ad, post_ad, config, k)
+
+    placed = source >= 0
+    longest = max(inputs.ad_lengths.max(initial=0), inputs.nv_lengths.max(initial=0))
+    index_dtype = np.int16 if longest <= np.iinfo(np.int16).max + 1 else np.int32
+    blended = BlendedBatch(
+        source=source[placed],
+        index=index[placed].astype(index_dtype),
+        offsets=lengths_to_offsets(placed.sum(axis=1)),
+        inputs=inputs,
+    )
+    return blended, values
+
+
+def optimality_gap(
+    inputs: BlendingInput,
+    config: BlendingConfig = BlendingConfig(),
+    k: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> pd.DataFrame:
+    """Per-request objective of the greedy blend and of the optimal one, and the gap between them.
+
+    The frame holds one row per request: ``greedy_value``, ``optimal_value``,
+    ``gap`` (optimal minus greedy), ``relative_gap`` (gap over the optimal
+    value, 0 where that is 0) and the top-K metrics of both orders, suffixed
+    ``_greedy`` and ``_optimal``.
+    """
+    k = config.k if k is None else k
+    inputs = intern_ids(inputs)
+    greedy = blend_batch(inputs, config, top_k=k)
+    optimal, optimal_value = optimal_blend(inputs, config, k=k, chunk_size=chunk_size)
+    greedy_value = blend_value(greedy, config, k)
+    gap = optimal_value - greedy_value
+    columns = {
+        GREEDY_VALUE_COL: greedy_value,
+        OPTIMAL_VALUE_COL: optimal_value,
+        GAP_COL: gap,
+        RELATIVE_GAP_COL: np.divide(gap, optimal_value, out=np.zeros(len(gap)), where=optimal_value > 0),
+    }
+    for name, blended in (("greedy", greedy), ("optimal", optimal)):
+        for col, values in topk_metrics(blended, k).items():
+            columns[f"{col}_{name}"] = values
+    return pd.DataFrame(columns)
+
+
+def summarize_gap(gaps: pd.DataFrame, tolerance: float = 1e-9) -> pd.Series:
+    """Aggregate of an ``optimality_gap`` frame.
+
+    ``share_of_optimum`` is the summed greedy value over the summed optimal
+    value; ``optimal_share`` counts the requests the greedy solves within
+    ``tolerance`` (relative); ``above_optimum`` counts those where the
+    greedy beats the optimum, which would mean a solver bug.
+    """
+    relative = gaps[RELATIVE_GAP_COL]
+    summary = {
+        "requests": len(gaps),
+        "greedy_value_mean": gaps[GREEDY_VALUE_COL].mean(),
+        "optimal_value_mean": gaps[OPTIMAL_VALUE_COL].mean(),
+        "gap_mean": gaps[GAP_COL].mean(),
+        "share_of_optimum": gaps[GREEDY_VALUE_COL].sum() / gaps[OPTIMAL_VALUE_COL].sum() if len(gaps) else 1.0,
+        "optimal_share": (relative <= tolerance).mean(),
+        "above_optimum": int((relative < -tolerance).sum()),
+        "relative_gap_mean": relative.mean(),
+        "relative_gap_p50": relative.quantile(0.50),
+        "relative_gap_p90": relative.quantile(0.90),
+        "relative_gap_p99": relative.quantile(0.99),
+        "relative_gap_max": relative.max(),
+    }
+    for col in METRIC_COLS:
+        summary[f"{col}_greedy_mean"] = gaps[f"{col}_greedy"].mean()
+        summary[f"{col}_optimal_mean"] = gaps[f"{col}_optimal"].mean()
+    return pd.Series(summary)
@@ -0,0 +1,207 @@
+"""
+Quantile Sketch
+
+Mergeable KLL quantile sketches for the metric pack columns, so that
+percentiles over several days, shards or configs come from merging small
+per-partition sketches instead of rescanning the raw rows.
+
+A KLL sketch keeps a stack of compactors: level ``h`` holds items of weight
+``2 ** h``. When a level outgrows its capacity it is sorted and every other
+item (from a random offset) is promoted to the next level. Capacities shrink
+geometrically (factor 2/3) from the top level down, so a sketch holds about
+``3 * k`` items whatever the stream length; the rank error is on the order of
+``1 / k`` (about 1% for the default ``k = 200``). Until the first compaction
+a sketch is exact, and its quantiles are the same order statistics as
+``summarize_metrics``. Counts and sums are tracked exactly, so means of
+merged sketches are exact too.
+
+Sketches serialize to a small ``.npz`` byte string (``to_bytes``), which can
+be stored per daily partition of ``final_blending_input_{date}`` in any
+binary column or file.
+"""
+
+import io
+from typing import Dict, Iterable, Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SKETCH_K = 200
+_CAPACITY_DECAY = 2.0 / 3.0
+_MIN_CAPACITY = 2
+
+
+class KLLSketch:
+    """Mergeable quantile sketch of a stream of floats.
+
+    Args:
+        k: Capacity of the top compactor; larger is more accurate.
+        seed: Seed of the coin flips choosing which half of a compacted level
+            survives.
+    """
+
+    def __init__(self, k: int = DEFAULT_SKETCH_K, seed: Optional[int] = None):
+        if k < _MIN_CAPACITY:
+            raise ValueError(f"k must be at least {_MIN_CAPACITY}, got {k}")
+        self.k = int(k)
+        self.levels = [np.empty(0)]
+        self.n = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def num_retained(self) -> int:
+        return sum(len(level) for level in self.levels)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.n if self.n else np.nan
+
+    def _capacity(self, h: int) -> int:
+        depth = len(self.levels) - h - 1
+        return max(int(np.ceil(self.k * _CAPACITY_DECAY ** depth)), _MIN_CAPACITY)
+
+    def _compress(self) -> None:
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                level = np.sort(level)
+                # An odd item stays behind so the promoted pairs keep the total weight.
+                kept, paired = level[:len(level) % 2], level[len(level) % 2:]
+                promoted = paired[self._rng.integers(2)::2]
+                self.levels[h] = kept
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    def update(self, values) -> "KLLSketch":
+        """Add ``values`` (NaNs are skipped, like nulls in ``percentile_approx``)."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.n += len(values)
+            self.total += float(values.sum())
+            self.min = min(self.min, float(values.min()))
+            self.max = max(self.max, float(values.max()))
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """Fold ``other`` into this sketch (in place) and return it; both must share ``k``."""
+        if self.k != other.k:
+            raise ValueError(f"cannot merge a sketch with k={other.k} into one with k={self.k}")
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.n += other.n
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """Approximate ``inverted_cdf`` quantile(s): the smallest item whose weighted rank reaches ``q * n``."""
+        q = np.asarray(q, dtype=np.float64)
+        if not self.n:
+            return np.full(q.shape, np.nan) if q.ndim else np.nan
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h, dtype=np.int64) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        ranks = np.cumsum(weights[order])
+        index = np.minimum(np.searchsorted(ranks, np.maximum(q * self.n, 1), side="left"), len(items) - 1)
+        return items[order][index]
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez(buffer, **self._arrays())
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, seed: Optional[int] = None) -> "KLLSketch":
+        with np.load(io.BytesIO(data)) as arrays:
+            return cls._from_arrays(arrays, seed)
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            "header": np.array([self.k, self.n], dtype=np.int64),
+            "stats": np.array([self.total, self.min, self.max]),
+            "level_sizes": np.array([len(level) for level in self.levels], dtype=np.int64),
+            "items": np.concatenate(self.levels),
+        }
+
+    @classmethod
+    def _from_arrays(cls, arrays: Mapping[str, np.ndarray], seed: Optional[int] = None) -> "KLLSketch":
+        k, n = arrays["header"].tolist()
+        sketch = cls(k, seed)
+        sketch.n = n
+        sketch.total, sketch.min, sketch.max = arrays["stats"].tolist()
+        bounds = np.cumsum(arrays["level_sizes"])[:-1]
+        sketch.levels = list(np.split(arrays["items"], bounds))
+        return sketch
+
+
+def metric_sketches(
+    values: Mapping[str, np.ndarray],
+    k: int = DEFAULT_SKETCH_K,
+    seed: Optional[int] = None,
+) -> Dict[str, KLLSketch]:
+    """One sketch per metric column (e.g. of ``metric_pack``)."""
+    return {name: KLLSketch(k, seed).update(column) for name, column in values.items()}
+
+
+def merge_metric_sketches(parts: Iterable[Mapping[str, KLLSketch]]) -> Dict[str, KLLSketch]:
+    """Merge per-partition sketch sets metric by metric; the inputs are not modified."""
+    merged: Dict[str, KLLSketch] = {}
+    for part in parts:
+        for name, sketch in part.items():
+            if name not in merged:
+                merged[name] = KLLSketch(sketch.k)
+            merged[name].merge(sketch)
+    return merged
+
+
+def sketches_to_bytes(sketches: Mapping[str, KLLSketch]) -> bytes:
+    """Serialize a set of metric sketches to one ``.npz`` byte string."""
+    buffer = io.BytesIO()
+    arrays = {
+        f"{name}/{field}": array for name, sketch in sketches.items() for field, array in sketch._arrays().items()
+    }
+    np.savez(buffer, names=np.array(list(sketches)), **arrays)
+    return buffer.getvalue()
+
+
+def sketches_from_bytes(data: bytes) -> Dict[str, KLLSketch]:
+    with np.load(io.BytesIO(data)) as arrays:
+        return {
+            name: KLLSketch._from_arrays(
+                {f: arrays[f"{name}/{f}"] for f in ("header", "stats", "level_sizes", "items")}
+            )
+            for name in arrays["names"].tolist()
+        }
+
+
+def sketch_summary(
+    sketches: Mapping[str, KLLSketch],
+    quantiles: Sequence[float] = (0.25, 0.50, 0.75),
+) -> pd.DataFrame:
+    """The notebook's metric table (``metric``, ``mean``, ``median``, ``quantiles``) from sketches."""
+    rows = []
+    for name, sketch in sketches.items():
+        values = np.asarray(sketch.quantile(np.asarray(quantiles))).tolist()
+        rows.append({
+            "metric": name,
+            "mean": sketch.mean,
+            "median": float(sketch.quantile(0.5)),
+            "quantiles": values,
+        })
+    return pd.DataFrame(rows, columns=["metric", "mean", "median", "quantiles"])
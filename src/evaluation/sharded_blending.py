@@ -0,0 +1,164 @@
+"""
+Sharded Blending
+
+Local multi-core blending of one parsed input, for what-if runs outside
+Databricks. The input's bms ids are interned, which leaves every field a
+numeric array, and the arrays are copied once into a single
+``multiprocessing.shared_memory`` block. Worker processes attach to the
+block by name when the pool starts and view the arrays in place, so no
+array is pickled: a task is a ``(start, stop)`` request range, and its
+result is the shard's ``StreamingMetrics`` accumulator (sketches and slot
+histograms of a few kilobytes). The accumulators are merged in shard order.
+
+Shards cut the requests into ranges of about equal item counts, several per
+worker, so a slow shard does not hold up the pool.
+"""
+
+import dataclasses
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.algorithms.interning import intern_ids
+from src.config.blending_config import BlendingConfig
+from src.evaluation.quantile_sketch import DEFAULT_SKETCH_K
+from src.evaluation.streaming import StreamingMetrics
+
+SHARDS_PER_WORKER = 4
+_ALIGNMENT = 64
+
+# Shared input of the worker processes, attached once by the pool initializer.
+_worker_shared: Optional["SharedBlendingInput"] = None
+
+
+class SharedBlendingInput:
+    """An interned ``BlendingInput`` whose arrays live in one shared memory block.
+
+    Created from an input in the parent (``SharedBlendingInput.create``) and
+    attached to by name in workers (``SharedBlendingInput.attach`` with the
+    parent's ``layout``). ``inputs`` views the block without copying. The
+    creator unlinks the block on ``close``; use it as a context manager.
+    """
+
+    def __init__(self, block: shared_memory.SharedMemory, layout: Dict[str, Tuple[int, str, int]], owner: bool):
+        self.block = block
+        self.layout = layout
+        self.owner = owner
+        fields = {
+            name: np.ndarray((length,), dtype=np.dtype(dtype), buffer=block.buf, offset=offset)
+            for name, (offset, dtype, length) in layout.items()
+        }
+        self.inputs = BlendingInput(**fields)
+
+    @classmethod
+    def create(cls, inputs: BlendingInput) -> "SharedBlendingInput":
+        """Copy ``inputs`` (interned first if needed) into a new shared memory block."""
+        inputs = intern_ids(inputs)
+        arrays = {field.name: np.ascontiguousarray(getattr(inputs, field.name)) for field in dataclasses.fields(inputs)}
+        layout, size = {}, 0
+        for name, array in arrays.items():
+            layout[name] = (size, array.dtype.str, len(array))
+            size += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+        block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        shared = cls(block, layout, owner=True)
+        for name, array in arrays.items():
+            getattr(shared.inputs, name)[:] = array
+        return shared
+
+    @classmethod
+    def attach(cls, name: str, layout: Dict[str, Tuple[int, str, int]]) -> "SharedBlendingInput":
+        """View of a block created by another process."""
+        return cls(shared_memory.SharedMemory(name=name), layout, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.block.name
+
+    def close(self) -> None:
+        """Drop the views and the mapping; the creator also frees the block."""
+        self.inputs = None
+        self.block.close()
+        if self.owner:
+            self.block.unlink()
+
+    def __enter__(self) -> "SharedBlendingInput":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def shard_bounds(inputs: BlendingInput, n_shards: int) -> List[Tuple[int, int]]:
+    """Non-empty ``(start, stop)`` request ranges with about equal numbers of ad and NV items."""
+    n = len(inputs)
+    if n == 0:
+        return []
+    items = np.cumsum(inputs.ad_lengths + inputs.nv_lengths + 1)
+    targets = items[-1] * np.arange(1, n_shards) / n_shards
+    cuts = np.unique(np.concatenate([[0], np.searchsorted(items, targets, side="right"), [n]]))
+    return [(int(start), int(stop)) for start, stop in zip(cuts[:-1], cuts[1:])]
+
+
+def blend_shard(
+    inputs: BlendingInput,
+    config: BlendingConfig,
+    bounds: Tuple[int, int],
+    sketch_k: int = DEFAULT_SKETCH_K,
+    seed: Optional[int] = None,
+) -> StreamingMetrics:
+    """Metrics of requests ``bounds[0]:bounds[1]`` of ``inputs``, blended to ``config.k``."""
+    blended = blend_batch(inputs.slice(*bounds), config, top_k=config.k)
+    return StreamingMetrics(config.k, sketch_k, seed).update(blended)
+
+
+def _init_worker(name: str, layout: Dict[str, Tuple[int, str, int]]) -> None:
+    global _worker_shared
+    _worker_shared = SharedBlendingInput.attach(name, layout)
+
+
+def _blend_in_worker(task: Tuple[BlendingConfig, Tuple[int, int], int, Optional[int]]) -> StreamingMetrics:
+    config, bounds, sketch_k, seed = task
+    return blend_shard(_worker_shared.inputs, config, bounds, sketch_k, seed)
+
+
+def sharded_blend(
+    inputs: BlendingInput,
+    config: BlendingConfig = BlendingConfig(),
+    max_workers: Optional[int] = None,
+    n_shards: Optional[int] = None,
+    sketch_k: int = DEFAULT_SKETCH_K,
+    seed: Optional[int] = None,
+) -> StreamingMetrics:
+    """Blend ``inputs`` across worker processes and merge the per-shard metrics.
+
+    Args:
+        inputs: Parsed requests.
+        config: Blending knobs; ``config.k`` is the metric cut-off.
+        max_workers: Worker processes; ``1`` blends in this process and
+            ``None`` uses one per CPU.
+        n_shards: Request ranges to blend (``SHARDS_PER_WORKER`` per worker
+            when None).
+        sketch_k, seed: Parameters of the metric sketches.
+
+    Returns:
+        The metrics of all requests, as from ``stream_blend`` over the same
+        rows.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    bounds = shard_bounds(inputs, n_shards or SHARDS_PER_WORKER * workers)
+    metrics = StreamingMetrics(config.k, sketch_k, seed)
+    if workers == 1 or len(bounds) <= 1:
+        inputs = intern_ids(inputs)
+        for shard in bounds:
+            metrics.merge(blend_shard(inputs, config, shard, sketch_k, seed))
+        return metrics
+    with SharedBlendingInput.create(inputs) as shared:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(shared.name, shared.layout)) as pool:
+            tasks = [(config, shard, sketch_k, seed) for shard in bounds]
+            for shard_metrics in pool.map(_blend_in_worker, tasks):
+                metrics.merge(shard_metrics)
+    return metrics
@@ -0,0 +1,307 @@
+"""
+Spark Metrics
+
+The notebook's ``calculate_metric_pack`` as one fused Spark computation.
+
+The notebook adds each metric column with its own ``withColumn`` and then
+runs one ``selectExpr`` aggregation per metric, glued with ``unionByName``:
+six scans of the blended data. Here each request's two lists are folded
+once each with ``aggregate`` (ads load, engagement util and revenue util
+accumulated together over the top K), and every summary statistic of the
+six metrics is computed in a single ``agg``. The median is read from the
+0.5 quantile of the same ``percentile_approx`` call, which is the value the
+separate ``percentile_approx(col, 0.5)`` of the notebook returns.
+
+``metric_cube_summary`` does the same for several cut-offs at once: the fold
+runs to the largest K and snapshots its running sums as it passes each
+smaller one.
+
+``slot_histograms`` replaces the notebook's ``posexplode`` + ``groupBy`` +
+``toPandas`` ad slot plots: each partition bincounts the ad slots of the
+fixed-slot order and of any number of blended columns (one per config) in a
+single ``mapInArrow`` pass, and the driver adds up the partition counts.
+
+``metric_pack_sketches`` computes the same six columns but reduces them to
+mergeable KLL sketches (one small set per Arrow batch stream, merged on the
+driver), to be stored per daily partition and merged across days or configs.
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyspark.sql import Column, DataFrame
+from pyspark.sql import functions as F
+
+from src.algorithms.batch_blending import (
+    AD_CARD_POSITION_COL,
+    AD_EXPECTED_VALUE_COL,
+    AD_QUALITY_SCORE_COL,
+    NV_CARD_POSITION_COL,
+    NV_PCTR_COL,
+)
+from src.evaluation.blending_metrics import FIXED_METRIC_COLS, METRIC_COLS, METRIC_PAIRS
+from src.evaluation.grid_evaluation import QUANTILES
+from src.evaluation.quantile_sketch import (
+    DEFAULT_SKETCH_K,
+    KLLSketch,
+    merge_metric_sketches,
+    sketches_from_bytes,
+    sketches_to_bytes,
+)
+
+_FIXED_PACK_COL = "_fixed_metric_pack"
+_BLENDED_PACK_COL = "_blended_metric_pack"
+_PACK_FIELDS = ("load", "engagement", "revenue")
+
+
+def _col(name: str) -> str:
+    return f"`{name}`"
+
+
+def fixed_slot_sql() -> str:
+    """The notebook's ``sorted_struct``: ads and NV items sorted by (position, engagement, revenue).
+
+    Null arrays are treated as empty.
+    """
+    def arr(name):
+        return f"coalesce({_col(name)}, array())"
+
+    return f"""
+        sort_array(transform(
+            arrays_zip(
+                concat({arr(AD_CARD_POSITION_COL)}, {arr(NV_CARD_POSITION_COL)}),
+                concat({arr(AD_QUALITY_SCORE_COL)}, {arr(NV_PCTR_COL)}),
+                concat({arr(AD_EXPECTED_VALUE_COL)}, array_repeat(0.0, size({arr(NV_CARD_POSITION_COL)})))
+            ),
+            x -> named_struct('position', x['0'], 'engagement', x['1'], 'revenue', x['2'])
+        ))
+    """
+
+
+def _pack_sql(items: str, k: int, revenue: str, engagement: str) -> str:
+    """One fold over the first ``k`` items accumulating all three metrics."""
+    k = int(k)
+    return f"""
+        aggregate(
+            slice({items}, 1, {k}),
+            named_struct('slot', 0, 'load', 0, 'engagement', 0D, 'revenue', 0D),
+            (acc, x) -> named_struct(
+                'slot', acc.slot + 1,
+                'load', acc.load + IF(x.{revenue} > 0, 1, 0),
+                'engagement', acc.engagement + x.{engagement} / log2(acc.slot + 2),
+                'revenue', acc.revenue + x.{revenue} / log2(acc.slot + 2)
+            )
+        )
+    """
+
+
+def metric_pack_columns(k: int, merged_col: str = "merged_result") -> Dict[str, Column]:
+    """The two fused per-request folds: fixed-slot and blended metric structs."""
+    return {
+        _FIXED_PACK_COL: F.expr(_pack_sql(fixed_slot_sql(), k, "revenue", "engagement")),
+        _BLENDED_PACK_COL: F.expr(_pack_sql(_col(merged_col), k, "revenue_signal", "engagement_signal")),
+    }
+
+
+def _metric_columns() -> Dict[str, Column]:
+    columns = {}
+    for pack, names in ((_FIXED_PACK_COL, FIXED_METRIC_COLS), (_BLENDED_PACK_COL, METRIC_COLS)):
+        for field, name in zip(_PACK_FIELDS, names):
+            columns[name] = F.col(pack)[field]
+    return columns
+
+
+def with_metric_pack(df: DataFrame, k: int, merged_col: str = "merged_result") -> DataFrame:
+    """Add the six notebook metric columns to ``df`` (parsed arrays plus ``merged_col``)."""
+    metrics = _metric_columns()
+    return (
+        df.withColumns(metric_pack_columns(k, merged_col))
+        .select("*", *(column.alias(name) for name, column in metrics.items()))
+        .drop(_FIXED_PACK_COL, _BLENDED_PACK_COL)
+    )
+
+
+def _one_pass_summary(
+    values: DataFrame,
+    metrics: Sequence[Tuple[Tuple[str, ...], Column]],
+    label_cols: Sequence[str],
+    accuracy: int,
+) -> DataFrame:
+    """Mean and quartiles of every ``(labels, column)`` in one ``agg``, stacked into one row per column.
+
+    ``labels`` are SQL literals filling ``label_cols``.
+    """
+    quantiles = F.array(*(F.lit(q) for q in QUANTILES))
+    aggregated = values.agg(
+        *(F.mean(column).alias(f"mean_{i}") for i, (_, column) in enumerate(metrics)),
+        *(F.percentile_approx(column, quantiles, accuracy).alias(f"quantiles_{i}")
+          for i, (_, column) in enumerate(metrics)),
+    )
+    median = QUANTILES.index(0.50)
+    rows = ", ".join(
+        f"{', '.join(labels)}, CAST(mean_{i} AS DOUBLE), CAST(quantiles_{i}[{median}] AS DOUBLE),"
+        f" CAST(quantiles_{i} AS ARRAY<DOUBLE>)"
+        for i, (labels, _) in enumerate(metrics)
+    )
+    columns = ", ".join([*label_cols, "mean", "median", "quantiles"])
+    return aggregated.selectExpr(f"stack({len(metrics)}, {rows}) AS ({columns})")
+
+
+def metric_pack_summary(
+    df: DataFrame,
+    k: int,
+    merged_col: str = "merged_result",
+    accuracy: int = 10000,
+) -> DataFrame:
+    """The notebook's metric table (``metric``, ``mean``, ``median``, ``quantiles``) in one aggregation.
+
+    ``accuracy`` is passed to ``percentile_approx`` (10000 is Spark's default).
+    """
+    metrics = _metric_columns()
+    packs = df.select(*metric_pack_columns(k, merged_col).values()).toDF(_FIXED_PACK_COL, _BLENDED_PACK_COL)
+    names = [name for pair in METRIC_PAIRS for name in pair]
+    return _one_pass_summary(packs, [((f"'{name}'",), metrics[name]) for name in names], ["metric"], accuracy)
+
+
+def _cube_sql(items: str, ks: List[int], revenue: str, engagement: str) -> str:
+    """One fold over the first ``max(ks)`` items, snapshotting the running sums at each K.
+
+    A snapshot for K is taken at the step that sees K items already summed;
+    lists shorter than K (and the largest K) take the final sums.
+    """
+    k_set = ", ".join(str(k) for k in ks)
+    snapshot = f"acc.slot IN ({k_set})"
+    fields = (("load", "INT"), ("engagement", "DOUBLE"), ("revenue", "DOUBLE"))
+    steps = {
+        "load": f"acc.load + IF(x.{revenue} > 0, 1, 0)",
+        "engagement": f"acc.engagement + x.{engagement} / log2(acc.slot + 2)",
+        "revenue": f"acc.revenue + x.{revenue} / log2(acc.slot + 2)",
+    }
+    zero = ", ".join(
+        ["'slot', 0, 'load', 0, 'engagement', 0D, 'revenue', 0D"]
+        + [f"'{f}_at', CAST(array() AS ARRAY<{t}>)" for f, t in fields]
+    )
+    step = ", ".join(
+        ["'slot', acc.slot + 1"]
+        + [f"'{f}', {steps[f]}" for f, _ in fields]
+        + [f"'{f}_at', IF({snapshot}, concat(acc.{f}_at, array(acc.{f})), acc.{f}_at)" for f, _ in fields]
+    )
+    finish = ", ".join(
+        f"'{f}', concat(acc.{f}_at, array_repeat(acc.{f}, {len(ks)} - size(acc.{f}_at)))" for f, _ in fields
+    )
+    return f"""
+        aggregate(
+            slice({items}, 1, {ks[-1]}),
+            named_struct({zero}),
+            (acc, x) -> named_struct({step}),
+            acc -> named_struct({finish})
+        )
+    """
+
+
+def metric_cube_columns(ks: Iterable[int], merged_col: str = "merged_result") -> Dict[str, Column]:
+    """Fixed-slot and blended folds whose fields hold one value per K (sorted ``ks``)."""
+    ks = sorted({int(k) for k in ks})
+    if not ks or ks[0] < 1:
+        raise ValueError(f"ks must be positive cut-offs, got {ks}")
+    return {
+        _FIXED_PACK_COL: F.expr(_cube_sql(fixed_slot_sql(), ks, "revenue", "engagement")),
+        _BLENDED_PACK_COL: F.expr(_cube_sql(_col(merged_col), ks, "revenue_signal", "engagement_signal")),
+    }
+
+
+def metric_cube_summary(
+    df: DataFrame,
+    ks: Iterable[int],
+    merged_col: str = "merged_result",
+    accuracy: int = 10000,
+) -> DataFrame:
+    """The notebook's metric table at every cut-off in ``ks`` (leading ``k`` column), in one aggregation.
+
+    ``merged_col`` must hold at least ``max(ks)`` items per request where
+    available (blend with ``top_k=max(ks)`` or without truncation).
+    """
+    ks = sorted({int(k) for k in ks})
+    metrics = _metric_columns()
+    packs = df.select(*metric_cube_columns(ks, merged_col).values()).toDF(_FIXED_PACK_COL, _BLENDED_PACK_COL)
+    names = [name for pair in METRIC_PAIRS for name in pair]
+    columns = [((str(k), f"'{name}'"), metrics[name][i]) for i, k in enumerate(ks) for name in names]
+    return _one_pass_summary(packs, columns, ["k", "metric"], accuracy)
+
+
+def metric_pack_sketches(
+    df: DataFrame,
+    k: int,
+    merged_col: str = "merged_result",
+    sketch_k: int = DEFAULT_SKETCH_K,
+) -> Dict[str, KLLSketch]:
+    """Mergeable quantile sketches of the six notebook metric columns of ``df``.
+
+    Each Spark partition sketches its rows in a ``mapInArrow`` task and ships
+    one serialized sketch set; the driver merges them. Pass the result to
+    ``quantile_sketch.sketch_summary`` for the metric table, or store it with
+    ``quantile_sketch.sketches_to_bytes``.
+    """
+    metrics = _metric_columns()
+    names = [name for pair in METRIC_PAIRS for name in pair]
+    values = df.select(*metric_pack_columns(k, merged_col).values()).toDF(_FIXED_PACK_COL, _BLENDED_PACK_COL)
+    values = values.select(*(metrics[name].cast("double").alias(name) for name in names))
+
+    def sketch_batches(batches):
+        sketches = {name: KLLSketch(sketch_k) for name in names}
+        for batch in batches:
+            for name in names:
+                sketches[name].update(batch.column(name).to_numpy(zero_copy_only=False))
+        yield pa.RecordBatch.from_pydict({"sketches": [sketches_to_bytes(sketches)]})
+
+    parts = values.mapInArrow(sketch_batches, "sketches binary").collect()
+    return merge_metric_sketches(sketches_from_bytes(row.sketches) for row in parts)
+
+
+def _slot_counts(revenue: pa.ListArray, k: int) -> np.ndarray:
+    """Lists with a non-zero (non-null) revenue at each slot ``0..k-1`` of an Arrow list column."""
+    offsets = revenue.offsets.to_numpy()
+    values = revenue.values.fill_null(0).to_numpy(zero_copy_only=False)
+    starts, lengths = offsets[:-1], np.diff(offsets)
+    counts = np.zeros(k, dtype=np.int64)
+    for slot in range(k):
+        counts[slot] = np.count_nonzero(values[starts[lengths > slot] + slot])
+    return counts
+
+
+def slot_histograms(
+    df: DataFrame,
+    k: int,
+    merged_cols: Union[str, Sequence[str]] = "merged_result",
+    fixed_col: Optional[str] = None,
+) -> pd.DataFrame:
+    """Ad counts per top-``k`` slot of the fixed-slot order and of every blended column, in one pass.
+
+    Blend several configs into separate columns (``with_merged_result(...,
+    output_col=...)``) to histogram them all at once. ``fixed_col`` names an
+    existing ``sorted_struct`` column; without it the fixed-slot order is
+    built from the parsed arrays. Returns an ``order x slot`` count frame:
+    row ``"fixed"`` then one row per merged column, columns ``0..k-1``.
+    """
+    merged_cols = [merged_cols] if isinstance(merged_cols, str) else list(merged_cols)
+    k = int(k)
+    fixed = fixed_slot_sql() if fixed_col is None else _col(fixed_col)
+    revenues = [F.expr(f"transform(slice({fixed}, 1, {k}), x -> x.revenue)")]
+    revenues += [F.expr(f"transform(slice({_col(c)}, 1, {k}), x -> x.revenue_signal)") for c in merged_cols]
+    names = [f"_revenue_{i}" for i in range(len(revenues))]
+    values = df.select(*(column.alias(name) for column, name in zip(revenues, names)))
+
+    def count_batches(batches):
+        counts = np.zeros((len(names), k), dtype=np.int64)
+        for batch in batches:
+            for i, name in enumerate(names):
+                counts[i] += _slot_counts(batch.column(name), k)
+        yield pa.RecordBatch.from_pydict({"counts": [counts.ravel().tolist()]})
+
+    parts = values.mapInArrow(count_batches, "counts array<bigint>").collect()
+    counts = np.zeros((len(names), k), dtype=np.int64)
+    for row in parts:
+        counts += np.asarray(row.counts, dtype=np.int64).reshape(len(names), k)
+    return pd.DataFrame(counts, index=pd.Index(["fixed"] + merged_cols, name="order"), columns=range(k))
@@ -0,0 +1,262 @@
+"""
+Streaming Evaluation
+
+Blends a partitioned Parquet dataset of blending inputs (e.g. one
+``date=...`` directory per ``final_blending_input_{date}`` snapshot) one
+record batch at a time, so memory is bounded by the batch size and not by
+the number of days scanned:
+
+- ``iter_input_batches`` scans the dataset lazily and yields record batches
+  holding the parsed array columns; raw ``*_list`` text columns are decoded
+  batch by batch.
+- ``StreamingMetrics`` folds blended batches into KLL sketches of the
+  metric pack (``quantile_sketch``) and the blended and fixed-slot ad slot
+  histograms; both are a few kilobytes whatever the number of requests, and
+  accumulators of several shards or groups merge.
+- ``stream_blend`` ties them together, with one accumulator per value of a
+  grouping column (such as the ``date`` partition) and, optionally, the
+  blended batches written back out as Parquet with the ``merged_result``
+  column and the per-request metric pack.
+
+Files are scanned one at a time and the Parquet writers flush every batch
+as it is written, so peak memory stays that of one Parquet row group and one
+blended batch whether one day or a month is processed.
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.algorithms.batch_blending import AD_COLUMNS, NV_COLUMNS, BlendedBatch, BlendingInput, blend_batch
+from src.config.blending_config import BlendingConfig
+from src.evaluation.blending_metrics import ad_slot_histogram, metric_pack_and_fixed_slots
+from src.evaluation.grid_evaluation import QUANTILES
+from src.evaluation.quantile_sketch import DEFAULT_SKETCH_K, KLLSketch, sketch_summary
+from src.utils.list_decoding import decode_raw_columns
+from src.utils.list_parsing import RAW_LIST_COLUMNS
+
+DEFAULT_BATCH_SIZE = 65536
+MERGED_RESULT_COL = "merged_result"
+PARSED_COLUMNS = AD_COLUMNS + NV_COLUMNS
+
+DatasetSource = Union[str, Sequence[str], ds.Dataset]
+
+
+def open_input_dataset(source: DatasetSource) -> ds.Dataset:
+    """A Parquet dataset with hive partitioning (``date=2025-07-21/...``) from paths, or ``source`` itself."""
+    if isinstance(source, ds.Dataset):
+        return source
+    return ds.dataset(source, format="parquet", partitioning="hive")
+
+
+def iter_input_batches(
+    source: DatasetSource,
+    extra_columns: Sequence[str] = (),
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    filter: Optional[pc.Expression] = None,
+) -> Iterator[pa.RecordBatch]:
+    """Record batches of the parsed array columns followed by ``extra_columns``.
+
+    The dataset holds either the parsed array columns or the raw ``*_list``
+    text columns of the input tables; raw columns are decoded per batch.
+    ``filter`` (e.g. ``ds.field("date") >= "2025-07-01"``) prunes partitions
+    and rows before they are read. Files are read one at a time on the
+    calling thread: the multi-threaded dataset scanner decodes ahead of a
+    slow consumer without bound, so its memory would grow with the days
+    scanned. A batch never spans two files, and the memory of a read is that
+    of one Parquet row group.
+    """
+    dataset = open_input_dataset(source)
+    names = set(dataset.schema.names)
+    raw = not set(PARSED_COLUMNS) <= names
+    columns = [name for name, _, _ in RAW_LIST_COLUMNS] if raw else list(PARSED_COLUMNS)
+    missing = [name for name in columns + list(extra_columns) if name not in names]
+    if missing:
+        raise KeyError(f"input dataset lacks columns {missing}")
+
+    for fragment in dataset.get_fragments(filter=filter):
+        batches = fragment.to_batches(
+            schema=dataset.schema,
+            columns=columns + list(extra_columns),
+            filter=filter,
+            batch_size=batch_size,
+            use_threads=False,
+        )
+        for batch in batches:
+            if not batch.num_rows:
+                continue
+            parsed = decode_raw_columns(batch) if raw else batch.select(list(PARSED_COLUMNS))
+            yield pa.RecordBatch.from_arrays(
+                parsed.columns + [batch.column(name) for name in extra_columns],
+                names=parsed.schema.names + list(extra_columns),
+            )
+
+
+@dataclass
+class StreamingMetrics:
+    """Bounded-size accumulator of the metric pack and ad slot histograms of blended batches.
+
+    Args:
+        k: Top-K cut-off of the metrics and histograms.
+        sketch_k: Accuracy parameter of the metric sketches.
+        seed: Seed of the sketches' compaction coin flips.
+    """
+
+    k: int
+    sketch_k: int = DEFAULT_SKETCH_K
+    seed: Optional[int] = None
+    requests: int = 0
+    sketches: Dict[str, KLLSketch] = field(default_factory=dict)
+    ad_slots: np.ndarray = None
+    fixed_ad_slots: np.ndarray = None
+
+    def __post_init__(self):
+        if self.ad_slots is None:
+            self.ad_slots = np.zeros(self.k, dtype=np.int64)
+        if self.fixed_ad_slots is None:
+            self.fixed_ad_slots = np.zeros(self.k, dtype=np.int64)
+
+    def update(
+        self,
+        blended: BlendedBatch,
+        values: Optional[Dict[str, np.ndarray]] = None,
+        fixed_ad_slots: Optional[np.ndarray] = None,
+    ) -> "StreamingMetrics":
+        """Fold one blended batch in.
+
+        ``values`` and ``fixed_ad_slots`` are its ``metric_pack_and_fixed_slots``
+        at ``k``, if already computed.
+        """
+        if values is None or fixed_ad_slots is None:
+            values, fixed_ad_slots = metric_pack_and_fixed_slots(blended, self.k)
+        for name, column in values.items():
+            if name not in self.sketches:
+                self.sketches[name] = KLLSketch(self.sketch_k, self.seed)
+            self.sketches[name].update(column)
+        self.ad_slots += ad_slot_histogram(blended, self.k)
+        self.fixed_ad_slots += fixed_ad_slots
+        self.requests += len(blended)
+        return self
+
+    def merge(self, other: "StreamingMetrics") -> "StreamingMetrics":
+        """Fold another accumulator (same ``k``) into this one."""
+        if other.k != self.k:
+            raise ValueError(f"cannot merge metrics at K={other.k} into K={self.k}")
+        for name, sketch in other.sketches.items():
+            if name not in self.sketches:
+                self.sketches[name] = KLLSketch(sketch.k, self.seed)
+            self.sketches[name].merge(sketch)
+        self.ad_slots += other.ad_slots
+        self.fixed_ad_slots += other.fixed_ad_slots
+        self.requests += other.requests
+        return self
+
+    def summary(self, quantiles: Sequence[float] = QUANTILES) -> pd.DataFrame:
+        """The notebook's metric table, from the sketches."""
+        return sketch_summary(self.sketches, quantiles)
+
+
+def _split_groups(batch: pa.RecordBatch, group_by: Optional[str]) -> Iterator[Tuple[Any, pa.RecordBatch]]:
+    """``(group value, rows)`` of a batch; batches of one partition are not copied."""
+    if group_by is None:
+        yield None, batch
+        return
+    column = batch.column(group_by)
+    values = pc.unique(column)
+    if len(values) == 1:
+        yield values[0].as_py(), batch
+        return
+    for value in values:
+        yield value.as_py(), batch.filter(pc.equal(column, value))
+
+
+class _GroupWriters:
+    """One Parquet file per group, under ``group_by=value`` directories like the input."""
+
+    def __init__(self, root: str, group_by: Optional[str]):
+        self.root = root
+        self.group_by = group_by
+        self.writers: Dict[Any, pq.ParquetWriter] = {}
+
+    def write(self, key: Any, batch: pa.RecordBatch) -> None:
+        writer = self.writers.get(key)
+        if writer is None:
+            directory = self.root if self.group_by is None else os.path.join(self.root, f"{self.group_by}={key}")
+            os.makedirs(directory, exist_ok=True)
+            writer = pq.ParquetWriter(os.path.join(directory, "part-00000.parquet"), batch.schema)
+            self.writers[key] = writer
+        writer.write_batch(batch)
+
+    def close(self) -> None:
+        for writer in self.writers.values():
+            writer.close()
+
+
+def stream_blend(
+    source: DatasetSource,
+    config: BlendingConfig = BlendingConfig(),
+    group_by: Optional[str] = None,
+    output: Optional[str] = None,
+    keep_columns: Sequence[str] = (),
+    top_k: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    filter: Optional[pc.Expression] = None,
+    sketch_k: int = DEFAULT_SKETCH_K,
+    seed: Optional[int] = None,
+) -> Dict[Any, StreamingMetrics]:
+    """Blend a partitioned input dataset batch by batch and accumulate its metrics.
+
+    Args:
+        source: Dataset path(s) or ``pyarrow.dataset.Dataset`` (see
+            ``iter_input_batches``).
+        config: Blending knobs; ``config.k`` is the metric cut-off.
+        group_by: Column (e.g. the ``date`` partition) with one accumulator
+            per value; everything goes to key ``None`` when not given.
+        output: Directory to write the blended batches to, one Parquet file
+            per group, with ``keep_columns``, ``merged_result`` and the metric
+            pack per request. Nothing is written when None.
+        keep_columns: Input columns copied to the output (e.g. request keys).
+        top_k: Length of the written blends (full blends when None). The
+            metrics always see the first ``config.k`` items, and without
+            ``output`` only those are blended.
+        batch_size: Rows per scanned batch; peak memory scales with it.
+        filter: Row / partition filter pushed into the scan.
+        sketch_k, seed: Parameters of the metric sketches.
+
+    Returns:
+        The accumulated metrics per group value.
+    """
+    extra = list(dict.fromkeys(list(keep_columns) + ([group_by] if group_by is not None else [])))
+    if output is None:
+        blend_k = config.k
+    else:
+        blend_k = None if top_k is None else max(top_k, config.k)
+    metrics: Dict[Any, StreamingMetrics] = {}
+    writers = _GroupWriters(output, group_by) if output is not None else None
+    try:
+        for batch in iter_input_batches(source, extra, batch_size, filter):
+            for key, rows in _split_groups(batch, group_by):
+                blended = blend_batch(BlendingInput.from_arrow(rows), config, top_k=blend_k)
+                values, fixed_ad_slots = metric_pack_and_fixed_slots(blended, config.k)
+                if key not in metrics:
+                    metrics[key] = StreamingMetrics(config.k, sketch_k, seed)
+                metrics[key].update(blended, values, fixed_ad_slots)
+                if writers is not None:
+                    merged = blended.to_arrow()
+                    if top_k is not None and top_k < blend_k:
+                        merged = pc.list_slice(merged, 0, top_k)
+                    columns = [rows.column(name) for name in keep_columns] + [merged]
+                    columns += [pa.array(column) for column in values.values()]
+                    names = list(keep_columns) + [MERGED_RESULT_COL] + list(values)
+                    writers.write(key, pa.RecordBatch.from_arrays(columns, names=names))
+    finally:
+        if writers is not None:
+            writers.close()
+    return metrics
@@ -0,0 +1,177 @@
+"""
+List Column Decoding
+
+Columnar decoder for the Snowflake ``ARRAY_AGG`` list columns of the
+blending input. Where ``list_parsing.parse_list`` (and the notebook's
+``from_json(regexp_replace(col, "\\n|\\s", ""))``) pays for a regex pass and a
+generic JSON parse on every row, this decodes a whole column at once with
+Arrow compute kernels straight into flat values plus offsets:
+
+- numeric lists: split on ``,``, trim whitespace and brackets, cast; no regex
+  and no JSON parser;
+- string lists: whitespace removed as in the notebook, outer ``["`` / ``"]``
+  cut off and the rest split on ``","``. Without a backslash in the text an
+  unescaped ``","`` can only separate two elements, so this is exact; rows
+  with escapes go through ``parse_list``.
+
+Rows the fast path cannot read (not a bracketed list, or tokens that do not
+cast) fall back to ``parse_list`` as well, so the result always equals the
+row-at-a-time parse. Float lists are rounded to float32 like Spark's
+``FloatType``.
+"""
+
+from typing import Any, Mapping, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from src.algorithms.batch_blending import BlendingInput
+from src.utils.list_parsing import RAW_LIST_COLUMNS, parse_list
+
+# Arrow element type of each list kind, as the notebook's columns_to_cast.
+ARROW_TYPES = {"int": pa.int32(), "float": pa.float32(), "string": pa.string()}
+
+# Characters matched by the notebook's regex "\\s".
+_WHITESPACE = " \t\n\x0b\f\r"
+_TRIM = _WHITESPACE + "[]"
+# Separators between the quoted elements of a string list: first, middle, last, and "[]" alone.
+_SEPARATORS = pa.array(["[", ",", "]", "[]"])
+
+
+def _as_string_array(texts) -> pa.Array:
+    if isinstance(texts, pa.ChunkedArray):
+        texts = texts.combine_chunks()
+    if not isinstance(texts, pa.Array):
+        texts = pa.array(texts, type=pa.string())
+    if pa.types.is_large_string(texts.type):
+        texts = texts.cast(pa.string())
+    return texts
+
+
+def _contains_any(strings: pa.Array, chars: str) -> bool:
+    """Whether any of the ASCII ``chars`` occurs in ``strings``, from one pass over the data buffer."""
+    _, offsets, data = strings.buffers()
+    if data is None or not len(strings):
+        return False
+    offsets = np.frombuffer(offsets, dtype=np.int32)[strings.offset:strings.offset + len(strings) + 1]
+    table = np.zeros(256, dtype=bool)
+    table[list(chars.encode())] = True
+    return bool(table[np.frombuffer(data, dtype=np.uint8)[offsets[0]:offsets[-1]]].any())
+
+
+def _split_numeric(texts: pa.Array):
+    """Element tokens, per-row token counts, validity and empty-list flags of numeric lists."""
+    stripped = pc.utf8_trim_whitespace(texts)
+    valid = pc.and_(pc.starts_with(stripped, "["), pc.ends_with(stripped, "]"))
+    tokens = pc.split_pattern(texts, ",")
+    lengths = pc.fill_null(pc.list_value_length(tokens), 0).to_numpy(zero_copy_only=False).astype(np.int64)
+    tokens = pc.utf8_trim(pc.list_flatten(tokens), characters=_TRIM)
+    valid = pc.fill_null(valid, True).to_numpy(zero_copy_only=False)
+
+    # "[]" splits into one empty token; any other empty token is malformed.
+    token_rows = np.repeat(np.arange(len(texts)), lengths)
+    has_empty = np.zeros(len(texts), dtype=bool)
+    has_empty[token_rows[pc.equal(tokens, "").to_numpy(zero_copy_only=False)]] = True
+    empty = has_empty & (lengths == 1)
+    return tokens, lengths, valid & (empty | ~has_empty), empty
+
+
+def _split_strings(texts: pa.Array):
+    """Element tokens, per-row token counts, validity and empty-list flags of string lists.
+
+    Split on ``"``, a list without escapes alternates separators (``[``, ``,``,
+    ``]`` plus whitespace) and element contents.
+    """
+    parts = pc.split_pattern(texts, '"')
+    counts = pc.fill_null(pc.list_value_length(parts), 0).to_numpy(zero_copy_only=False).astype(np.int64)
+    parts = pc.list_flatten(parts)
+    starts = np.zeros(len(texts), dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    index = np.arange(len(parts)) - np.repeat(starts, counts)
+    last = index == np.repeat(counts - 1, counts)
+    separator = pc.index_in(pc.utf8_trim(parts, characters=_WHITESPACE), value_set=_SEPARATORS)
+    separator = pc.fill_null(separator, -1).to_numpy(zero_copy_only=False)
+    expected = np.where(index == 0, np.where(last, 3, 0), np.where(last, 2, 1))
+    is_content = index % 2 == 1
+    good = is_content | (separator == expected)
+
+    rows = np.repeat(np.arange(len(texts)), counts)
+    valid = (counts % 2 == 1) & (np.bincount(rows, weights=~good, minlength=len(texts)) == 0)
+    if _contains_any(texts, "\\"):
+        valid &= ~pc.fill_null(pc.match_substring(texts, "\\"), False).to_numpy(zero_copy_only=False)
+    tokens = parts.filter(pa.array(is_content))
+    if _contains_any(tokens, _WHITESPACE):
+        tokens = pc.replace_substring_regex(tokens, r"\s", "")  # whitespace is stripped, as in the notebook
+    return tokens, counts // 2, valid | (counts == 0), np.zeros(len(texts), dtype=bool)
+
+
+def decode_list_array(texts, kind: str) -> pa.ListArray:
+    """Decode a column of serialized lists into an Arrow list array.
+
+    Args:
+        texts: Arrow string array, pandas Series or sequence of ``str``/``None``.
+        kind: ``"int"``, ``"float"`` or ``"string"``.
+
+    Returns:
+        ``list<int32>``, ``list<float>`` or ``list<string>``; null texts give
+        null lists, like ``from_json``.
+    """
+    texts = _as_string_array(texts)
+    value_type = ARROW_TYPES[kind]
+    split = _split_strings if kind == "string" else _split_numeric
+    tokens, lengths, valid, empty = split(texts)
+
+    is_null = texts.is_null().to_numpy(zero_copy_only=False)
+    token_rows = np.repeat(np.arange(len(texts)), lengths)
+    tokens = tokens.filter(pa.array(valid[token_rows] & ~empty[token_rows]))
+    lengths = np.where(valid & ~empty & ~is_null, lengths, 0)
+    try:
+        if kind == "float":
+            values = pc.cast(pc.cast(tokens, pa.float64()), value_type)
+        else:
+            values = pc.cast(tokens, value_type)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        # Some token is not a plain literal: decode every row the slow way.
+        return pa.array([parse_list(t, kind) for t in texts.to_pylist()], type=pa.list_(value_type))
+
+    offsets = np.zeros(len(texts) + 1, dtype=np.int32)
+    np.cumsum(lengths, out=offsets[1:])
+    decoded = pa.ListArray.from_arrays(pa.array(offsets), values, mask=pa.array(is_null))
+    fallback = np.flatnonzero(~valid & ~is_null)
+    if not len(fallback):
+        return decoded
+    rows = decoded.to_pylist()
+    for r in fallback.tolist():
+        rows[r] = parse_list(texts[r].as_py(), kind)
+    return pa.array(rows, type=pa.list_(value_type))
+
+
+def decode_list_column(texts, kind: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode a column of serialized lists into flat NumPy values and ``n + 1`` int64 offsets.
+
+    Null texts are empty lists. Values are int64, float64 (float32-rounded)
+    or object (``str``), the dtypes ``BlendingInput`` holds.
+    """
+    decoded = decode_list_array(texts, kind)
+    lengths = pc.fill_null(pc.list_value_length(decoded), 0).to_numpy(zero_copy_only=False).astype(np.int64)
+    offsets = np.zeros(len(decoded) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    values = decoded.flatten().to_numpy(zero_copy_only=False)
+    dtype = {"int": np.int64, "float": np.float64, "string": object}[kind]
+    return values.astype(dtype), offsets
+
+
+def decode_raw_columns(columns: Mapping[str, Any]) -> pa.RecordBatch:
+    """Raw ``*_list`` columns (a mapping such as a pandas DataFrame or Arrow batch) -> parsed array columns."""
+    if isinstance(columns, (pa.RecordBatch, pa.Table)):
+        columns = {name: columns.column(name) for name in columns.schema.names}
+    return pa.RecordBatch.from_arrays(
+        [decode_list_array(columns[raw], kind) for raw, _, kind in RAW_LIST_COLUMNS],
+        names=[parsed for _, parsed, _ in RAW_LIST_COLUMNS],
+    )
+
+
+def blending_input_from_raw(columns: Mapping[str, Any]) -> BlendingInput:
+    """Build a ``BlendingInput`` straight from the raw ``*_list`` columns, without per-row objects."""
+    return BlendingInput.from_arrow(decode_raw_columns(columns))
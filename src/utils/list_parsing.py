@@ -0,0 +1,58 @@
+"""
+List Column Parsing
+
+Decodes the Snowflake ``ARRAY_AGG`` list columns of the blending input
+tables (``*_LIST`` columns, serialized as JSON text) into the parsed array
+columns used by the blending code. Mirrors the notebook's input prep, which
+strips all whitespace and applies ``from_json`` with the ``columns_to_cast``
+types; float lists are rounded to float32 like Spark's ``FloatType``.
+"""
+
+import json
+import re
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+import numpy as np
+
+from src.algorithms.batch_blending import (
+    AD_BMS_ID_COL,
+    AD_CARD_POSITION_COL,
+    AD_EXPECTED_VALUE_COL,
+    AD_QUALITY_SCORE_COL,
+    NV_BMS_ID_COL,
+    NV_CARD_POSITION_COL,
+    NV_PCTR_COL,
+)
+
+# (raw list column, parsed array column, element type) as in the notebook's columns_to_cast.
+RAW_LIST_COLUMNS = (
+    ("ad_card_position_list", AD_CARD_POSITION_COL, "int"),
+    ("nv_card_position_list", NV_CARD_POSITION_COL, "int"),
+    ("ad_quality_score_list", AD_QUALITY_SCORE_COL, "float"),
+    ("ad_expected_value_list", AD_EXPECTED_VALUE_COL, "float"),
+    ("nv_pctr_list", NV_PCTR_COL, "float"),
+    ("ad_unhashed_bms_id_list", AD_BMS_ID_COL, "string"),
+    ("nv_unhashed_bms_id_list", NV_BMS_ID_COL, "string"),
+)
+
+_WHITESPACE = re.compile(r"\s")
+
+
+def parse_list(text: Optional[str], kind: str) -> Optional[List[Any]]:
+    """Decode one serialized list; ``kind`` is ``"int"``, ``"float"`` or ``"string"``."""
+    if text is None:
+        return None
+    values = json.loads(_WHITESPACE.sub("", text))
+    if kind == "int":
+        return [int(v) for v in values]
+    if kind == "float":
+        return np.asarray(values, dtype=np.float32).astype(np.float64).tolist()
+    return [str(v) for v in values]
+
+
+def parse_raw_rows(rows: Iterable[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+    """Rows with raw ``*_list`` columns -> rows keyed by the parsed array column names."""
+    return [
+        {parsed: parse_list(row[raw], kind) for raw, parsed, kind in RAW_LIST_COLUMNS}
+        for row in rows
+    ]
@@ -0,0 +1,309 @@
+"""
+Query Cache
+
+Local on-disk cache of warehouse query results, so that re-running the
+notebook with a different blending knob does not re-download the same
+``FINAL_BLENDING_LONG_INPUT`` snapshot from Snowflake.
+
+Each entry is one directory under the cache root, named by a hash of the
+normalized query (whitespace collapsed and keywords lower-cased outside
+quoted literals and identifiers, trailing ``;`` dropped) and an optional
+namespace such as ``"proddb.duocheng"`` for unqualified table names. It
+holds the result as part files plus a ``meta.json``:
+
+- Arrow IPC part files (``put_table``, the local path): reopened
+  memory-mapped, so a cached table is readable without copying it into
+  memory;
+- Parquet part files (``load_spark``, written by Spark itself in parallel):
+  read back with ``spark.read.parquet``, or locally with ``read_table``.
+
+Entries are written to a temporary directory and renamed into place, so a
+crashed run never leaves a half-written entry behind. Every hit refreshes the
+entry's access time; after each write the least recently used entries are
+evicted until the cache fits ``max_bytes`` (the entry just written is kept
+even if it alone is larger).
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DEFAULT_MAX_BYTES = 50 * 2 ** 30
+DEFAULT_ROWS_PER_FILE = 1_000_000
+META_FILE = "meta.json"
+FORMAT_ARROW = "arrow"
+FORMAT_PARQUET = "parquet"
+
+# Single-quoted literals and double-quoted identifiers (doubled quotes escape).
+_QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Query text with whitespace and case folded outside quotes, without a trailing ``;``."""
+    parts = _QUOTED.split(query.strip())
+    # split() with a capturing group alternates unquoted and quoted parts.
+    parts = [part if i % 2 else _SPACE.sub(" ", part).lower() for i, part in enumerate(parts)]
+    return "".join(parts).strip().rstrip(";").rstrip()
+
+
+def query_key(query: str, namespace: str = "") -> str:
+    """Cache key of ``query``: 32 hex digits of the SHA-256 of namespace and normalized query."""
+    text = f"{namespace.lower()}\n{normalize_query(query)}"
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+
+@dataclass
+class CacheEntry:
+    """One cached query result on disk."""
+
+    key: str
+    path: str
+    query: str
+    file_format: str
+    num_rows: int
+    nbytes: int
+    last_access: float
+
+
+def _dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+class QueryCache:
+    """Size-bounded LRU cache of query results under ``root``.
+
+    Args:
+        root: Cache directory (created if missing). For ``load_spark`` on a
+            cluster it must be shared by the driver and the executors.
+        max_bytes: Size budget of all entries together.
+        namespace: Folded into every key, e.g. the default database and
+            schema unqualified table names resolve against.
+    """
+
+    def __init__(self, root: str, max_bytes: int = DEFAULT_MAX_BYTES, namespace: str = ""):
+        self.root = os.path.abspath(root)
+        self.max_bytes = int(max_bytes)
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def key(self, query: str) -> str:
+        return query_key(query, self.namespace)
+
+    def path(self, query: str) -> str:
+        return os.path.join(self.root, self.key(query))
+
+    def __contains__(self, query: str) -> bool:
+        return os.path.exists(os.path.join(self.path(query), META_FILE))
+
+    def _entry(self, key: str) -> CacheEntry:
+        """The entry of ``key`` from its meta file; ``OSError`` or ``ValueError`` if it is not complete."""
+        meta_path = os.path.join(self.root, key, META_FILE)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        return CacheEntry(
+            key=key,
+            path=os.path.join(self.root, key),
+            query=meta["query"],
+            file_format=meta["format"],
+            num_rows=meta["num_rows"],
+            nbytes=meta["nbytes"],
+            last_access=os.path.getmtime(meta_path),
+        )
+
+    def entries(self) -> List[CacheEntry]:
+        """All complete entries, least recently used first."""
+        entries = []
+        for name in os.listdir(self.root):
+            try:
+                entries.append(self._entry(name))
+            except (OSError, ValueError):
+                continue  # temporary directory or an entry being evicted
+        return sorted(entries, key=lambda e: e.last_access)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(entry.nbytes for entry in self.entries())
+
+    def _lookup(self, query: str) -> Optional[CacheEntry]:
+        key = self.key(query)
+        try:
+            os.utime(os.path.join(self.root, key, META_FILE))  # refresh the LRU position
+            entry = self._entry(key)
+        except (OSError, ValueError):
+            self.misses += 1  # absent, or evicted by another process meanwhile
+            return None
+        self.hits += 1
+        return entry
+
+    def read_table(self, query: str) -> Optional[pa.Table]:
+        """Cached result of ``query`` as an Arrow table (memory-mapped for Arrow entries), or ``None``."""
+        entry = self._lookup(query)
+        return None if entry is None else _read_entry(entry)
+
+    def put_table(
+        self,
+        query: str,
+        data: Union[pa.Table, Iterable[pa.RecordBatch]],
+        rows_per_file: int = DEFAULT_ROWS_PER_FILE,
+    ) -> pa.Table:
+        """Store ``data`` (a table or a stream of record batches) as the result of ``query``.
+
+        Returns the stored result, reopened memory-mapped from the cache.
+        """
+        schema = None
+        if isinstance(data, pa.Table):
+            schema, data = data.schema, data.to_batches(max_chunksize=rows_per_file)
+
+        def write(tmp):
+            num_rows, part, writer, writer_rows = 0, 0, None, 0
+            for batch in data:
+                if writer is None or writer_rows + batch.num_rows > rows_per_file:
+                    if writer is not None:
+                        writer.close()
+                    writer = pa.ipc.new_file(os.path.join(tmp, f"part-{part:05d}.arrow"), batch.schema)
+                    part, writer_rows = part + 1, 0
+                writer.write_batch(batch)
+                writer_rows += batch.num_rows
+                num_rows += batch.num_rows
+            if writer is None and schema is not None:
+                # Keeps the schema of an empty result.
+                writer = pa.ipc.new_file(os.path.join(tmp, "part-00000.arrow"), schema)
+            if writer is not None:
+                writer.close()
+            return num_rows
+
+        entry = self._commit(query, FORMAT_ARROW, write)
+        return _read_entry(entry)
+
+    def load(self, query: str, loader: Callable[[str], Any]) -> pa.Table:
+        """Result of ``query`` from the cache, running ``loader(query)`` and caching it on a miss.
+
+        ``loader`` returns an Arrow table, an iterable of record batches or a
+        pandas DataFrame.
+        """
+        table = self.read_table(query)
+        if table is not None:
+            return table
+        data = loader(query)
+        if isinstance(data, pd.DataFrame):
+            data = pa.Table.from_pandas(data, preserve_index=False)
+        return self.put_table(query, data)
+
+    def load_spark(self, spark, query: str, loader: Callable[[str], Any]):
+        """Spark DataFrame of ``query``: cached Parquet if present, else ``loader(query)`` written to the cache.
+
+        ``loader`` is e.g. the notebook's ``load_data_from_snowflake``. On a
+        miss the warehouse result is written once by Spark and the returned
+        DataFrame reads it back, so later actions do not query Snowflake
+        again either.
+        """
+        entry = self._lookup(query)
+        if entry is None:
+            df = loader(query)
+
+            def write(tmp):
+                path = os.path.join(tmp, "data")
+                df.write.mode("overwrite").parquet(path)
+                return spark.read.parquet(path).count()
+
+            entry = self._commit(query, FORMAT_PARQUET, write)
+        elif entry.file_format != FORMAT_PARQUET:
+            raise ValueError(f"cache entry {entry.key} holds {entry.file_format} files, which Spark does not read")
+        return spark.read.parquet(os.path.join(entry.path, "data"))
+
+    def wrap(self, loader: Callable[[str], Any], spark=None) -> Callable[[str], Any]:
+        """Drop-in cached version of ``loader``.
+
+        ``load_data_from_snowflake = cache.wrap(load_data_from_snowflake, spark)``
+        """
+        if spark is None:
+            return lambda query: self.load(query, loader)
+        return lambda query: self.load_spark(spark, query, loader)
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """Remove least recently used entries (never ``keep``) until the cache fits ``max_bytes``."""
+        entries = self.entries()
+        total = sum(entry.nbytes for entry in entries)
+        evicted = []
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry.key == keep:
+                continue
+            self._remove(entry.path)
+            total -= entry.nbytes
+            evicted.append(entry.key)
+        return evicted
+
+    def clear(self) -> None:
+        for entry in self.entries():
+            self._remove(entry.path)
+
+    def _remove(self, path: str) -> None:
+        # Drop the marker first so readers never see an entry with missing files.
+        try:
+            os.remove(os.path.join(path, META_FILE))
+        except FileNotFoundError:
+            pass
+        shutil.rmtree(path, ignore_errors=True)
+
+    def _commit(self, query: str, file_format: str, write: Callable[[str], int]) -> CacheEntry:
+        key = self.key(query)
+        tmp = tempfile.mkdtemp(prefix=f".tmp-{key}-", dir=self.root)
+        try:
+            num_rows = write(tmp)
+            meta = {
+                "query": query,
+                "namespace": self.namespace,
+                "format": file_format,
+                "num_rows": num_rows,
+                "nbytes": _dir_size(tmp),
+                "created": time.time(),
+            }
+            with open(os.path.join(tmp, META_FILE), "w") as f:
+                json.dump(meta, f)
+            final = os.path.join(self.root, key)
+            if os.path.exists(final):
+                self._remove(final)
+            os.replace(tmp, final)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.evict(keep=key)
+        mtime = os.path.getmtime(os.path.join(final, META_FILE))
+        return CacheEntry(key, final, query, file_format, num_rows, meta["nbytes"], mtime)
+
+
+def _part_files(path: str, suffix: str) -> List[str]:
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(path)
+        for name in names
+        if name.endswith(suffix)
+    )
+
+
+def _read_entry(entry: CacheEntry) -> pa.Table:
+    if entry.file_format == FORMAT_PARQUET:
+        return pa.concat_tables([pq.read_table(p, memory_map=True) for p in _part_files(entry.path, ".parquet")])
+    batches, schema = [], None
+    for part in _part_files(entry.path, ".arrow"):
+        reader = pa.ipc.open_file(pa.memory_map(part))
+        schema = reader.schema
+        batches.extend(reader.get_batch(i) for i in range(reader.num_record_batches))
+    if schema is None:
+        return pa.table({})
+    return pa.Table.from_batches(batches, schema)
@@ -0,0 +1,197 @@
+"""
+Ragged Arrays
+
+Columnar container for per-request lists (ad scores, NV pCTRs, card
+positions, bms ids, ...). Every field is one contiguous NumPy values buffer,
+and fields that are aligned per request (all ad fields, or all NV fields)
+share one ``n + 1`` int64 offsets buffer: request ``r`` owns
+``values[offsets[r]:offsets[r + 1]]`` of every field.
+
+Offsets are absolute positions into the values buffers, so ``offsets[0]``
+does not have to be zero. That makes slicing a range of requests zero-copy
+(a view of the offsets, the same values buffers), and lets Arrow list arrays
+be read without copying their child values. This is the layout
+``BlendingInput`` holds its ad and NV fields in; ``BlendingInput.ads`` and
+``BlendingInput.nv`` expose them as ``RaggedArrays``.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+def lengths_to_offsets(lengths: np.ndarray) -> np.ndarray:
+    """Turn per-request list lengths into an ``n + 1`` int64 offsets array."""
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def request_ids(offsets: np.ndarray) -> np.ndarray:
+    """Request number of every flat value described by ``offsets``."""
+    lengths = np.diff(offsets)
+    return np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+
+
+def take_segments(offsets: np.ndarray, requests: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Flat positions and new offsets of the segments of ``requests``, in that order."""
+    starts = offsets[requests]
+    lengths = offsets[np.asarray(requests) + 1] - starts
+    new_offsets = lengths_to_offsets(lengths)
+    flat = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+    return flat, new_offsets
+
+
+def _list_array(column) -> pa.Array:
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    if not (pa.types.is_list(column.type) or pa.types.is_large_list(column.type)):
+        raise TypeError(f"expected an Arrow list array, got {column.type}")
+    return column
+
+
+def _read_list(column: pa.Array) -> Tuple[np.ndarray, np.ndarray]:
+    """Values buffer and absolute int64 offsets of one list array (null lists are empty).
+
+    Without nulls the child values are used as they are (zero-copy for
+    numeric types); with nulls they are flattened, since a null list may
+    still cover child values.
+    """
+    if column.null_count:
+        lengths = pc.fill_null(pc.list_value_length(column), 0).to_numpy(zero_copy_only=False)
+        return column.flatten().to_numpy(zero_copy_only=False), lengths_to_offsets(lengths)
+    offsets = column.offsets.to_numpy(zero_copy_only=False).astype(np.int64, copy=False)
+    return column.values.to_numpy(zero_copy_only=False), offsets
+
+
+@dataclass
+class RaggedArrays:
+    """Aligned per-request lists: named values buffers sharing one offsets buffer.
+
+    Args:
+        offsets: ``n + 1`` int64 absolute offsets into every values buffer.
+        fields: Values buffer per field name, each covering at least
+            ``offsets[0]:offsets[-1]``.
+    """
+
+    offsets: np.ndarray
+    fields: Dict[str, np.ndarray]
+
+    def __post_init__(self):
+        self.offsets = np.asarray(self.offsets, dtype=np.int64)
+        for name, values in self.fields.items():
+            if len(values) < self.offsets[-1]:
+                raise ValueError(f"field {name} has {len(values)} values, offsets need {self.offsets[-1]}")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.fields[name]
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.fields)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory of the offsets and of the values the requests cover (object payloads excluded)."""
+        covered = int(self.offsets[-1] - self.offsets[0])
+        return self.offsets.nbytes + sum(values.itemsize * covered for values in self.fields.values())
+
+    def values(self, name: str) -> np.ndarray:
+        """Flat values of field ``name`` covered by the requests (a view)."""
+        return self.fields[name][self.offsets[0]:self.offsets[-1]]
+
+    def slice(self, start: int, stop: int) -> "RaggedArrays":
+        """Requests ``start:stop``, sharing this container's buffers (zero-copy)."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        return RaggedArrays(self.offsets[start:max(start, stop) + 1], self.fields)
+
+    def take(self, requests: np.ndarray) -> "RaggedArrays":
+        """Copy of the given request numbers, in that order."""
+        flat, offsets = take_segments(self.offsets, requests)
+        return RaggedArrays(offsets, {name: values[flat] for name, values in self.fields.items()})
+
+    def compact(self) -> "RaggedArrays":
+        """Copy holding only the covered values, with offsets starting at zero."""
+        lo, hi = self.offsets[0], self.offsets[-1]
+        return RaggedArrays(self.offsets - lo, {name: values[lo:hi].copy() for name, values in self.fields.items()})
+
+    def row(self, r: int) -> Dict[str, list]:
+        """Request ``r`` as Python lists keyed by field name."""
+        lo, hi = self.offsets[r], self.offsets[r + 1]
+        return {name: values[lo:hi].tolist() for name, values in self.fields.items()}
+
+    def to_arrow(self, large: bool = False) -> Dict[str, pa.Array]:
+        """Each field as an Arrow list array.
+
+        Numeric values buffers are shared with Arrow without copying.
+        ``large=True`` gives ``large_list`` arrays, which take the int64
+        offsets as they are; the default ``list`` type (what Spark's
+        ``ArrayType`` maps to) needs them as int32.
+        """
+        offsets = pa.array(self.offsets if large else self.offsets.astype(np.int32))
+        array_type = pa.LargeListArray if large else pa.ListArray
+        return {name: array_type.from_arrays(offsets, pa.array(values)) for name, values in self.fields.items()}
+
+    @classmethod
+    def from_arrow(cls, columns: Mapping[str, Any], names: Optional[Sequence[str]] = None) -> "RaggedArrays":
+        """Read aligned Arrow list columns (a mapping, ``RecordBatch`` or ``Table``).
+
+        Args:
+            columns: List (or large list) arrays by name; null lists are empty.
+            names: Columns to read, all of them by default.
+
+        Raises:
+            ValueError: If the columns' per-row lengths differ.
+        """
+        if isinstance(columns, (pa.RecordBatch, pa.Table)):
+            columns = {name: columns.column(name) for name in columns.schema.names}
+        names = list(columns) if names is None else list(names)
+        fields = {}
+        offsets = None
+        for name in names:
+            values, column_offsets = _read_list(_list_array(columns[name]))
+            if offsets is None:
+                offsets = column_offsets
+            elif not np.array_equal(column_offsets, offsets):
+                # Same lengths over differently placed child values: rebase all fields to zero.
+                if not np.array_equal(np.diff(column_offsets), np.diff(offsets)):
+                    raise ValueError(f"list column {name} is not aligned with {names[0]}")
+                fields = {n: v[offsets[0]:offsets[-1]] for n, v in fields.items()}
+                values = values[column_offsets[0]:column_offsets[-1]]
+                offsets = offsets - offsets[0]
+            fields[name] = values
+        if offsets is None:
+            raise ValueError("no list columns to read")
+        return cls(offsets, fields)
+
+    @classmethod
+    def from_lists(
+        cls, columns: Mapping[str, Iterable[Any]], dtypes: Optional[Mapping[str, Any]] = None
+    ) -> "RaggedArrays":
+        """Build from per-request Python lists (``None`` is an empty list), e.g. object pandas columns."""
+        dtypes = dtypes or {}
+        fields = {}
+        lengths = None
+        for name, lists in columns.items():
+            lists = list(lists)
+            column_lengths = np.array([len(x) if x is not None else 0 for x in lists], dtype=np.int64)
+            if lengths is None:
+                lengths = column_lengths
+            elif not np.array_equal(column_lengths, lengths):
+                raise ValueError(f"list column {name} is not aligned with {next(iter(columns))}")
+            flat = [v for lst in lists for v in (lst if lst is not None else ())]
+            dtype = dtypes.get(name)
+            fields[name] = np.asarray(flat, dtype=dtype) if flat else np.zeros(0, dtype=dtype or np.float64)
+        if lengths is None:
+            raise ValueError("no list columns to read")
+        return cls(lengths_to_offsets(lengths), fields)
@@ -0,0 +1,42 @@
+"""
+Spark List Parsing
+
+Runs ``list_decoding`` inside Spark through ``mapInArrow``: each Python worker
+decodes the raw ``*_list`` columns of a whole Arrow batch with the columnar
+decoder, in place of the notebook's per-row
+``from_json(regexp_replace(col, "\\n|\\s", ""), arr_type)``.
+"""
+
+from typing import Iterator
+
+import pyarrow as pa
+from pyspark.sql import DataFrame
+from pyspark.sql.types import StructField, StructType
+
+from src.algorithms.spark_blending import PARSED_INPUT_SCHEMA
+from src.utils.list_decoding import decode_raw_columns
+from src.utils.list_parsing import RAW_LIST_COLUMNS
+
+
+def with_parsed_lists(df: DataFrame, drop_raw: bool = False) -> DataFrame:
+    """Add the parsed array columns (``ad_quality_score_array``, ...) decoded from the raw ``*_list`` columns.
+
+    Same result types as the notebook's ``columns_to_cast`` prep
+    (``spark_blending.PARSED_INPUT_SCHEMA``); ``drop_raw`` drops the raw
+    string columns from the output.
+    """
+    raw_names = {raw for raw, _, _ in RAW_LIST_COLUMNS}
+    kept = [f for f in df.schema.fields if not (drop_raw and f.name in raw_names)]
+    parsed = [StructField(p, PARSED_INPUT_SCHEMA[p].dataType) for _, p, _ in RAW_LIST_COLUMNS]
+    schema = StructType(kept + parsed)
+    kept_names = [f.name for f in kept]
+
+    def parse_batches(batches: Iterator[pa.RecordBatch]) -> Iterator[pa.RecordBatch]:
+        for batch in batches:
+            decoded = decode_raw_columns(batch)
+            yield pa.RecordBatch.from_arrays(
+                [batch.column(name) for name in kept_names] + decoded.columns,
+                names=kept_names + decoded.schema.names,
+            )
+
+    return df.mapInArrow(parse_batches, schema)
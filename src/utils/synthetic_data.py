@@ -0,0 +1,258 @@
+"""
+Synthetic Blending Data
+
+Generates category-page requests shaped like rows of
+``FINAL_BLENDING_LONG_INPUT``, and the raw event tables the data pipelines
+start from, for tests and benchmarks that must run without Snowflake access.
+"""
+
+import json
+from typing import Any, Dict, List
+
+import numpy as np
+import pyarrow as pa
+
+from src.utils.list_parsing import RAW_LIST_COLUMNS
+
+IMPRESSION_TABLE = "fact_item_card_view_dedup"
+AD_FUNNEL_TABLE = "fact_ads_item_request_funnel"
+NV_LOG_TABLE = "sps_nv_consumer"
+NV_CTR_PREDICTOR = ("dsml-nv-store_item_ranker_ctr_mtml", "mtml_item_ranker_v2_ctr_1742750442")
+NV_V2C_PREDICTOR = ("dsml-nv-store_item_ranker_v2c_ctr_mtml", "mtml_v2c_ctr_1747176394")
+
+
+def make_synthetic_requests(
+    n_requests: int,
+    seed: int = 0,
+    max_ads: int = 15,
+    max_nv: int = 120,
+    id_pool_size: int = 200,
+) -> List[Dict[str, Any]]:
+    """Random requests keyed by the notebook's parsed array column names.
+
+    Bms ids are drawn from a small per-request pool, so ads and NV lists
+    share items often enough to exercise dedup.
+
+    Args:
+        n_requests: Number of requests to generate.
+        seed: Random seed.
+        max_ads: Maximum ad list length.
+        max_nv: Maximum NV list length.
+        id_pool_size: Number of distinct bms ids per request pool.
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for _ in range(n_requests):
+        n_ads = int(rng.integers(0, max_ads + 1))
+        n_nv = int(rng.integers(0, max_nv + 1))
+        pool = rng.integers(0, 10**9, size=id_pool_size)
+        ad_positions = np.sort(rng.choice(200, size=n_ads, replace=False))
+        ad_positions[rng.random(n_ads) < 0.2] = 99999
+        rows.append({
+            "ad_quality_score_array": rng.beta(1.2, 30, n_ads).tolist(),
+            "ad_expected_value_array": (rng.beta(1.2, 30, n_ads) * rng.gamma(2.0, 1.5, n_ads)).tolist(),
+            "ad_sorted_card_position_array": np.sort(ad_positions).tolist(),
+            "ad_unhashed_bms_id_array": [str(x) for x in rng.choice(pool, size=n_ads)],
+            "nv_pctr_array": rng.beta(1.5, 25, n_nv).tolist(),
+            "nv_sorted_card_position_array": np.sort(rng.choice(400, size=n_nv, replace=False)).tolist(),
+            "nv_unhashed_bms_id_array": [str(x) for x in rng.choice(pool, size=n_nv)],
+        })
+    return rows
+
+
+def to_raw_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Render parsed requests as raw ``*_list`` columns, serialized like Snowflake ``ARRAY_AGG``."""
+    return [
+        {raw: json.dumps(row[parsed], indent=2) for raw, parsed, _ in RAW_LIST_COLUMNS}
+        for row in rows
+    ]
+
+
+def _request_keys(n_requests: int, seed: int, duplicate_key_rate: float) -> Dict[str, np.ndarray]:
+    """(session, minute, store, L1, L2) key of every request, shared by the ad and NV events of a seed."""
+    rng = np.random.default_rng([seed, 1])
+    keys = {
+        "session": rng.integers(0, 10**9, n_requests).astype(str).astype(object),
+        "minute": rng.integers(0, 24 * 60, n_requests),
+        "store": rng.integers(0, 500, n_requests),
+        "l1": rng.integers(0, 20, n_requests).astype(str),
+        "l2": rng.integers(0, 200, n_requests).astype(str),
+    }
+    keys["session"][rng.random(n_requests) < 0.01] = None
+    copy = np.flatnonzero(rng.random(n_requests) < duplicate_key_rate)
+    source = rng.integers(0, n_requests, len(copy))
+    for values in keys.values():
+        values[copy] = values[source]
+    return keys
+
+
+def _ranked_items(rng: np.random.Generator, n_requests: int, max_items: int):
+    """Owner request of every item and a random permutation of card positions within each request."""
+    n_items = rng.integers(1, max_items + 1, n_requests)
+    owner = np.repeat(np.arange(n_requests), n_items)
+    starts = np.repeat(np.cumsum(n_items) - n_items, n_items)
+    return owner, np.argsort(rng.random(len(owner)) + owner) - starts
+
+
+def _impressions(keys: Dict[str, np.ndarray], owner: np.ndarray, **columns: Any) -> pa.Table:
+    """``fact_item_card_view_dedup`` rows of items owned by the given requests."""
+    n = len(owner)
+    return pa.table({
+        "RECEIVED_AT": columns["received_at"],
+        "CARD_POSITION": columns["card_position"],
+        "DD_SESSION_ID": keys["session"][owner],
+        "STORE_ID": keys["store"][owner],
+        "L1_CATEGORY_ID": keys["l1"][owner],
+        "L2_CATEGORY_ID": keys["l2"][owner],
+        "ID": columns["ids"],
+        "IS_SPONSORED": columns["sponsored"],
+        "FEATURE": columns.get("feature", np.full(n, "category", dtype=object)),
+        "CURRENCY": columns.get("currency", np.full(n, "USD", dtype=object)),
+        "BUSINESS_MERCHANT_SUPPLIED_ID": columns["bms_id"],
+        "OTHER_PROPERTIES": pa.array(columns.get("other_properties", [None] * n), type=pa.string()),
+    })
+
+
+def make_synthetic_ad_events(
+    n_requests: int,
+    date: str = "2025-07-23",
+    seed: int = 0,
+    max_ads: int = 15,
+    duplicate_key_rate: float = 0.05,
+) -> Dict[str, pa.Table]:
+    """Raw ``fact_item_card_view_dedup`` and ``fact_ads_item_request_funnel`` tables of one day.
+
+    Every request auctions up to ``max_ads`` category ads; about 60% of them
+    get an impression, at distinct card positions. ``duplicate_key_rate`` of
+    the requests copy the (session, minute, store, L1, L2) key of another
+    request, which the pipeline's dedup step drops. Both tables also hold
+    rows the pipeline filters out (organic, search, other currency, other
+    placement and previous-day rows).
+
+    Returns:
+        Tables keyed by their Snowflake names, with upper-case columns.
+    """
+    rng = np.random.default_rng([seed, 2])
+    keys = _request_keys(n_requests, seed, duplicate_key_rate)
+    day = np.datetime64(date, "s")
+    owner, card_position = _ranked_items(rng, n_requests, max_ads)
+    n = len(owner)
+    bms_id = rng.integers(0, 5000, n).astype(str)
+
+    impressed = rng.random(n) < 0.6
+    impression_id = np.array([f"imp-{date}-{i}" for i in range(n)], dtype=object)
+    received_at = day + (keys["minute"][owner] * 60 + rng.integers(0, 60, n)).astype("timedelta64[s]")
+    shown = np.flatnonzero(impressed)
+    # Rows the impression filter drops: copies of shown ads marked organic,
+    # on search or in another currency.
+    noise = rng.choice(shown, size=min(len(shown), n_requests // 4), replace=False)
+    kind = rng.integers(0, 3, len(noise))
+    rows = np.concatenate([shown, noise])
+    impressions = _impressions(
+        keys, owner[rows],
+        received_at=received_at[rows],
+        card_position=card_position[rows],
+        ids=np.concatenate([impression_id[shown], [f"imp-noise-{date}-{i}" for i in range(len(noise))]]),
+        sponsored=np.concatenate([np.ones(len(shown), dtype=bool), kind != 0]),
+        feature=np.concatenate([np.full(len(shown), "category"), np.where(kind == 1, "search", "category")]),
+        currency=np.concatenate([np.full(len(shown), "USD"), np.where(kind == 2, "CAD", "USD")]),
+        bms_id=bms_id[rows],
+    )
+
+    expected_value = rng.beta(1.2, 30, n) * rng.gamma(2.0, 1.5, n)
+    placement = np.where(rng.random(n) < 0.5, "PLACEMENT_TYPE_SPONSORED_PRODUCTS_CATEGORY_L1",
+                         "PLACEMENT_TYPE_SPONSORED_PRODUCTS_CATEGORY_L2").astype(object)
+    auction_at = day + (keys["minute"][owner] * 60).astype("timedelta64[s]")
+    placement[rng.random(n) < 0.05] = "PLACEMENT_TYPE_SPONSORED_PRODUCTS_SEARCH"
+    auction_at[rng.random(n) < 0.05] -= np.timedelta64(1, "D")
+    funnel = pa.table({
+        "AD_REQUEST_ID": np.array([f"req-{date}-{r}" for r in range(n_requests)], dtype=object)[owner],
+        "AD_QUALITY_SCORE": rng.beta(1.2, 30, n),
+        "EXPECTED_VALUE": expected_value,
+        "TRUE_BID": expected_value * rng.uniform(1.0, 3.0, n),
+        "BUSINESS_MERCHANT_SUPPLIED_ID": bms_id,
+        "PRICING_METADATA": [json.dumps({"adRank": int(r)}) for r in rng.integers(1, 30, n)],
+        "IMPRESSION_EVENT_ID": np.where(impressed, impression_id, None),
+        "AUCTION_OCCURRED_AT": pa.array(auction_at),
+        "PLACEMENT": placement,
+    })
+    return {IMPRESSION_TABLE: impressions, AD_FUNNEL_TABLE: funnel}
+
+
+def make_synthetic_nv_events(
+    n_requests: int,
+    date: str = "2025-07-23",
+    seed: int = 0,
+    max_nv: int = 40,
+    duplicate_key_rate: float = 0.05,
+) -> Dict[str, pa.Table]:
+    """Raw organic ``fact_item_card_view_dedup`` rows and ``sps_nv_consumer`` sibyl logs of one day.
+
+    Requests have the same keys as those of ``make_synthetic_ad_events``
+    with the same seed, so the two pipelines' outputs match. Every request
+    shows up to ``max_nv`` organic items, each logged with a pCTR by one of
+    the two ranker models; the logs also hold rows of other predictors,
+    pages and days.
+    """
+    rng = np.random.default_rng([seed, 3])
+    keys = _request_keys(n_requests, seed, duplicate_key_rate)
+    day = np.datetime64(date, "s")
+    owner, card_position = _ranked_items(rng, n_requests, max_nv)
+    n = len(owner)
+    # Distinct within a ranking, so the (bms id, ranking id) join matches one log row.
+    bms_id = ((rng.integers(0, 5000, n_requests)[owner] + 37 * card_position) % 5000).astype(str)
+    ranking_id = np.array([f"rank-{date}-{r}" for r in range(n_requests)], dtype=object)[owner]
+    received_at = day + (keys["minute"][owner] * 60 + rng.integers(0, 60, n)).astype("timedelta64[s]")
+    impressions = _impressions(
+        keys, owner,
+        received_at=received_at,
+        card_position=card_position,
+        ids=[f"nv-imp-{date}-{i}" for i in range(n)],
+        sponsored=np.zeros(n, dtype=bool),
+        bms_id=bms_id,
+        other_properties=[json.dumps({"ranking_event_id": r}) for r in ranking_id],
+    )
+
+    # One log row per item, plus rows the sibyl filters drop.
+    noise = rng.choice(n, size=n // 10, replace=False)
+    kind = rng.integers(0, 3, len(noise))
+    logged = np.concatenate([np.arange(n), noise])
+    v2c = rng.random(len(logged)) < 0.5
+    predictor = np.where(v2c, NV_V2C_PREDICTOR[0], NV_CTR_PREDICTOR[0]).astype(object)
+    model_id = np.where(v2c, NV_V2C_PREDICTOR[1], NV_CTR_PREDICTOR[1]).astype(object)
+    partition_date = np.full(len(logged), date, dtype=object)
+    page_source = np.full(len(logged), "RETAIL_CATEGORY_PAGE", dtype=object)
+    predictor[n:][kind == 0] = "dsml-nv-store_item_ranker_cvr_mtml"
+    page_source[n:][kind == 1] = "SEARCH_PAGE"
+    partition_date[n:][kind == 2] = str(np.datetime64(date) - 1)
+    feature_names = ["page_source", "ranking_event_id", "dd_session_id", "store_id", "l1_category_id",
+                     "l2_category_id", "unhashed_business_merchant_supplied_id"]
+    feature_values = np.column_stack([
+        page_source, ranking_id[logged], keys["session"][owner[logged]],
+        keys["store"][owner[logged]].astype(str), keys["l1"][owner[logged]], keys["l2"][owner[logged]],
+        bms_id[logged],
+    ]).ravel()
+    features = pa.MapArray.from_arrays(
+        np.arange(len(logged) + 1, dtype=np.int32) * len(feature_names),
+        pa.array(feature_names).take(np.tile(np.arange(len(feature_names)), len(logged))),
+        pa.array(feature_values, type=pa.string()),
+    )
+    logs = pa.table({
+        "iguazu_partition_date": partition_date,
+        "predictor_name": predictor,
+        "model_id": model_id,
+        "features": features,
+        "prediction_result": rng.beta(1.5, 25, len(logged)),
+    })
+    return {IMPRESSION_TABLE: impressions, NV_LOG_TABLE: logs}
+
+
+def make_synthetic_events(n_requests: int, date: str = "2025-07-23", seed: int = 0, **kwargs) -> Dict[str, pa.Table]:
+    """Source tables of both pipelines for one day: impressions (ad and organic), ad funnel and NV logs."""
+    ads = make_synthetic_ad_events(n_requests, date, seed, **kwargs)
+    nv = make_synthetic_nv_events(n_requests, date, seed)
+    return {
+        IMPRESSION_TABLE: pa.concat_tables([ads[IMPRESSION_TABLE], nv[IMPRESSION_TABLE]]),
+        AD_FUNNEL_TABLE: ads[AD_FUNNEL_TABLE],
+        NV_LOG_TABLE: nv[NV_LOG_TABLE],
+    }
@@ -0,0 +1,56 @@
+"""
+Tests for the single-pass alpha sweep.
+"""
+import numpy as np
+import pytest
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.config.blending_config import BlendingConfig
+from src.evaluation.alpha_sweep import alpha_sweep
+from src.evaluation.blending_metrics import METRIC_COLS, topk_metrics
+from src.utils.synthetic_data import make_synthetic_requests
+
+
+@pytest.fixture(scope="module")
+def inputs():
+    return BlendingInput.from_rows(make_synthetic_requests(300, seed=11, max_ads=12, max_nv=40, id_pool_size=40))
+
+
+@pytest.mark.parametrize("config", [
+    BlendingConfig(k=12),
+    BlendingConfig(k=6, beta=15, max_ads_block_size=1, min_nv_block_size=3),
+])
+def test_sweep_matches_direct_blends(inputs, config):
+    sweep = alpha_sweep(inputs, config, alpha_min=0.0, alpha_max=60.0)
+    assert (sweep.pieces_per_request >= 1).all()
+    for alpha in np.random.default_rng(0).uniform(0.0, 60.0, size=15):
+        direct = topk_metrics(
+            blend_batch(inputs, BlendingConfig(
+                k=config.k, alpha=alpha, beta=config.beta,
+                max_ads_block_size=config.max_ads_block_size,
+                min_nv_block_size=config.min_nv_block_size,
+            )),
+            config.k,
+        )
+        swept = sweep.at(alpha)
+        for name in METRIC_COLS:
+            np.testing.assert_allclose(swept[name], direct[name], err_msg=f"{name} at alpha={alpha}")
+
+
+def test_mean_curves_agree_with_pointwise_values(inputs):
+    sweep = alpha_sweep(inputs, BlendingConfig(), alpha_min=1.0, alpha_max=40.0)
+    breakpoints, curves = sweep.mean_curves()
+    assert breakpoints[0] == 1.0 and np.all(np.diff(breakpoints) > 0)
+    for m in [0, len(breakpoints) // 2, len(breakpoints) - 1]:
+        values = sweep.at(breakpoints[m])
+        for name in METRIC_COLS:
+            assert curves[name][m] == pytest.approx(values[name].mean())
+
+
+def test_unbounded_sweep_stops_at_the_last_crossover(inputs):
+    bounded = alpha_sweep(inputs, BlendingConfig(), alpha_max=60.0)
+    unbounded = alpha_sweep(inputs, BlendingConfig(), alpha_max=np.inf)
+    assert np.isfinite(unbounded.piece_start).all()
+    assert (unbounded.pieces_per_request >= bounded.pieces_per_request).all()
+    for name, values in unbounded.at(30.0).items():
+        np.testing.assert_array_equal(values, bounded.at(30.0)[name])
@@ -0,0 +1,84 @@
+"""
+Tests for the ad / NV matching stage and the multi-day backfill scheduler.
+"""
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from src.algorithms.batch_blending import BlendingInput
+from src.data_pipelines.ad_pipeline import AD_OUTPUT, DEDUP_KEY_COLUMNS
+from src.data_pipelines.backfill import DAY_DONE, DAY_FAILED, DAY_SKIPPED, backfill, date_range, day_path
+from src.data_pipelines.matching import FINAL_OUTPUT, FINAL_SCHEMA, run_day, to_parsed_columns
+from src.data_pipelines.nv_pipeline import NV_OUTPUT
+from src.utils.synthetic_data import make_synthetic_events
+
+DATES = ["2025-07-22", "2025-07-23", "2025-07-24"]
+
+
+@pytest.fixture(scope="module")
+def events():
+    days = [make_synthetic_events(150, date=date, seed=seed) for seed, date in enumerate(DATES)]
+    return {name: pa.concat_tables([day[name] for day in days]) for name in days[0]}
+
+
+def test_date_range_is_inclusive():
+    assert date_range("2025-02-27", "2025-03-01") == ["2025-02-27", "2025-02-28", "2025-03-01"]
+    assert date_range("2025-03-01", "2025-03-01") == ["2025-03-01"]
+
+
+def test_matching_joins_ad_and_nv_outputs_on_the_dedup_key(events):
+    run = run_day(events, DATES[1], targets=(AD_OUTPUT, NV_OUTPUT, FINAL_OUTPUT))
+    final = run.outputs[FINAL_OUTPUT]
+    assert final.schema == FINAL_SCHEMA
+    assert final.num_rows > 0
+
+    ad = run.outputs[AD_OUTPUT].to_pandas()
+    nv = run.outputs[NV_OUTPUT].to_pandas()
+    expected = ad.merge(nv, on=list(DEDUP_KEY_COLUMNS))
+    assert sorted(final.column("AD_REQUEST_ID").to_pylist()) == sorted(expected["AD_REQUEST_ID"])
+    assert len(set(final.column("NV_RANKING_ID").to_pylist())) == final.num_rows
+
+
+def test_final_table_feeds_blending_input(events):
+    final = run_day(events, DATES[0]).outputs[FINAL_OUTPUT]
+    inputs = BlendingInput.from_arrow(to_parsed_columns(final))
+    assert len(inputs) == final.num_rows
+
+
+def test_backfill_writes_every_day_with_timings(events, tmp_path):
+    report = backfill(events, DATES[0], DATES[-1], str(tmp_path), max_workers=2)
+    assert [day.date for day in report.days] == DATES
+    assert {day.status for day in report.days} == {DAY_DONE}
+    assert report.failed == []
+    for day in report.days:
+        assert day.seconds > 0 and FINAL_OUTPUT in day.stage_seconds
+        assert pq.read_table(day_path(str(tmp_path), day.date)).num_rows == day.rows
+        assert day.rows == run_day(events, day.date).outputs[FINAL_OUTPUT].num_rows
+    assert list(report.frame()["status"]) == [DAY_DONE] * len(DATES)
+    assert not [name for _, _, names in os.walk(tmp_path) for name in names if name.endswith(".tmp")]
+
+
+def test_backfill_resumes_with_the_failed_days(events, tmp_path):
+    def sources(date):
+        if date == DATES[1]:
+            raise OSError("warehouse unavailable")
+        return events
+
+    report = backfill(sources, DATES[0], DATES[-1], str(tmp_path), max_workers=3)
+    assert report.failed == [DATES[1]]
+    assert "warehouse unavailable" in report.days[1].error
+    assert not os.path.exists(day_path(str(tmp_path), DATES[1]))
+
+    resumed = backfill(events, DATES[0], DATES[-1], str(tmp_path))
+    assert [day.status for day in resumed.days] == [DAY_SKIPPED, DAY_DONE, DAY_SKIPPED]
+
+    rebuilt = backfill(events, DATES[0], DATES[0], str(tmp_path), resume=False)
+    assert rebuilt.days[0].status == DAY_DONE
+
+
+def test_backfill_reports_a_failing_stage(events, tmp_path):
+    report = backfill(events, DATES[0], DATES[0], str(tmp_path), placements=())
+    assert report.failed == [DATES[0]]
+    assert report.days[0].status == DAY_FAILED
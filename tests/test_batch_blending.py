@@ -0,0 +1,102 @@
+"""
+Tests for the vectorized batch blending engine.
+"""
+import dataclasses
+
+import numpy as np
+import pytest
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.algorithms.blending_algorithm import merge_sort_blending_dedup
+from src.config.blending_config import BlendingConfig
+from src.utils.synthetic_data import make_synthetic_requests
+
+
+def reference_blend(row, config):
+    return merge_sort_blending_dedup(
+        row["ad_quality_score_array"],
+        row["ad_expected_value_array"],
+        row["nv_pctr_array"],
+        config.alpha,
+        config.beta,
+        row["ad_sorted_card_position_array"],
+        row["nv_sorted_card_position_array"],
+        config.max_ads_block_size,
+        config.min_nv_block_size,
+        row["ad_unhashed_bms_id_array"],
+        row["nv_unhashed_bms_id_array"],
+    )
+
+
+CONFIGS = [
+    BlendingConfig(),
+    BlendingConfig(alpha=5, beta=30, max_ads_block_size=1, min_nv_block_size=3),
+    BlendingConfig(alpha=50, max_ads_block_size=2, min_nv_block_size=1),
+    BlendingConfig(alpha=0.5, max_ads_block_size=4, min_nv_block_size=4),
+]
+
+
+@pytest.mark.parametrize("config", CONFIGS)
+def test_matches_reference(config):
+    rows = make_synthetic_requests(300, seed=1, max_ads=10, max_nv=30, id_pool_size=25)
+    blended = blend_batch(BlendingInput.from_rows(rows), config)
+    for r, row in enumerate(rows):
+        assert blended.to_records(r) == reference_blend(row, config)
+
+
+def test_edge_cases():
+    def row(ad_scores, ad_values, ad_ids, nv_pctrs, nv_ids):
+        return {
+            "ad_quality_score_array": ad_scores,
+            "ad_expected_value_array": ad_values,
+            "ad_sorted_card_position_array": list(range(len(ad_scores))),
+            "ad_unhashed_bms_id_array": ad_ids,
+            "nv_pctr_array": nv_pctrs,
+            "nv_sorted_card_position_array": list(range(len(nv_pctrs))),
+            "nv_unhashed_bms_id_array": nv_ids,
+        }
+
+    rows = [
+        row([], [], [], [], []),
+        row([0.1, 0.2, 0.3, 0.4, 0.5], [1.0] * 5, list("abcde"), [], []),
+        row([], [], [], [0.1, 0.2], ["x", "y"]),
+        row([0.1, 0.1], [5.0, 5.0], ["a", "a"], [0.01, 0.01, 0.01], ["a", "b", "b"]),
+        row([0.01] * 4, [0.0] * 4, list("abcd"), [0.5] * 6, list("abcdef")),
+        row([0.3] * 6, [2.0] * 6, list("abcdef"), [0.01, 0.01, 0.01], ["c", "x", "y"]),
+    ]
+    config = BlendingConfig()
+    blended = blend_batch(BlendingInput.from_rows(rows), config)
+    for r, raw in enumerate(rows):
+        assert blended.to_records(r) == reference_blend(raw, config)
+
+
+def test_offsets_need_not_start_at_zero():
+    rows = make_synthetic_requests(40, seed=2, max_ads=6, max_nv=12, id_pool_size=10)
+    full = BlendingInput.from_rows(rows)
+    tail = dataclasses.replace(full, ad_offsets=full.ad_offsets[25:], nv_offsets=full.nv_offsets[25:])
+    blended = blend_batch(tail)
+    for r, row in enumerate(rows[25:]):
+        assert blended.to_records(r) == reference_blend(row, BlendingConfig())
+    assert np.array_equal(blended.lengths, blend_batch(full).lengths[25:])
+
+
+@pytest.mark.parametrize("top_k", [0, 1, 5, 12])
+def test_top_k_keeps_the_first_k_items(top_k):
+    rows = make_synthetic_requests(200, seed=4, max_ads=10, max_nv=30, id_pool_size=25)
+    config = CONFIGS[1]
+    blended = blend_batch(BlendingInput.from_rows(rows), config, top_k=top_k)
+    assert blended.lengths.max() <= top_k
+    for r, row in enumerate(rows):
+        assert blended.to_records(r) == reference_blend(row, config)[:top_k]
+
+
+def test_compact_result_gathers_signals_lazily():
+    rows = make_synthetic_requests(50, seed=5, max_ads=10, max_nv=30, id_pool_size=25)
+    inputs = BlendingInput.from_rows(rows)
+    blended = blend_batch(inputs)
+    assert blended.source.dtype == np.int8 and blended.index.dtype == np.int16
+    assert blended.nbytes == 3 * len(blended.source) + blended.offsets.nbytes
+    ads = np.flatnonzero(blended.source == 1)
+    np.testing.assert_array_equal(
+        blended.gather(inputs.ad_expected_value, None, ads), blended.revenue_signal[ads]
+    )
@@ -0,0 +1,94 @@
+"""
+Tests for the content-addressed blend memo.
+"""
+import numpy as np
+import pytest
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.algorithms.blend_memo import BlendMemo, memoize_blending, request_fingerprints
+from src.algorithms.interning import intern_ids
+from src.config.blending_config import BlendingConfig
+from src.utils.synthetic_data import make_synthetic_requests
+from tests.test_batch_blending import CONFIGS, reference_blend
+
+
+def with_duplicates(n, seed):
+    rows = make_synthetic_requests(n, seed=seed, max_nv=30, id_pool_size=25)
+    rng = np.random.default_rng(seed)
+    copies = [dict(rows[i]) for i in rng.integers(0, n, size=n // 2)]
+    for row in copies[::2]:
+        # Card positions only label the output, so these still share a blend.
+        row["nv_sorted_card_position_array"] = [p + 1000 for p in row["nv_sorted_card_position_array"]]
+    return rows + copies
+
+
+def assert_same_blend(got, expected):
+    assert len(got) == len(expected)
+    assert [got.to_records(r) for r in range(len(got))] == [expected.to_records(r) for r in range(len(expected))]
+
+
+def test_fingerprints_follow_content():
+    rows = make_synthetic_requests(50, seed=31, max_nv=30)
+    inputs = BlendingInput.from_rows(rows + rows[:10])
+    fingerprints = request_fingerprints(inputs)
+    assert fingerprints.shape == (60, 2) and fingerprints.dtype == np.uint64
+    np.testing.assert_array_equal(fingerprints[50:], fingerprints[:10])
+    np.testing.assert_array_equal(request_fingerprints(inputs.slice(40, 60)), fingerprints[40:60])
+    np.testing.assert_array_equal(request_fingerprints(inputs.take(np.array([3, 1]))), fingerprints[[3, 1]])
+
+    row = next(r for r in rows if len(r["nv_pctr_array"]) > 1)
+    swapped = dict(row, nv_pctr_array=row["nv_pctr_array"][::-1])
+    shorter = {k: v[:-1] if k.startswith("nv_") else v for k, v in row.items()}
+    distinct = request_fingerprints(BlendingInput.from_rows([row, swapped, shorter]))
+    assert len({tuple(fp) for fp in distinct.tolist()}) == 3
+
+
+@pytest.mark.parametrize("config", CONFIGS)
+@pytest.mark.parametrize("interned", [False, True])
+def test_memo_blend_matches_blend_batch(config, interned):
+    inputs = BlendingInput.from_rows(with_duplicates(200, seed=32))
+    if interned:
+        inputs = intern_ids(inputs)
+    memo = BlendMemo()
+    for top_k in (None, config.k):
+        assert_same_blend(memo.blend(inputs, config, top_k=top_k), blend_batch(inputs, config, top_k=top_k))
+    part = inputs.slice(150, 300)
+    assert_same_blend(memo.blend(part, config, top_k=config.k), blend_batch(part, config, top_k=config.k))
+
+
+def test_stats_and_eviction():
+    inputs = BlendingInput.from_rows(with_duplicates(100, seed=33))
+    distinct = len({tuple(fp) for fp in request_fingerprints(inputs).tolist()})
+    config = BlendingConfig()
+    memo = BlendMemo(max_entries=distinct)
+    memo.blend(inputs, config)
+    assert (memo.stats.requests, memo.stats.distinct, memo.stats.misses) == (150, distinct, distinct)
+    assert memo.stats.hits == 0 and memo.stats.hit_rate == pytest.approx(1 - distinct / 150)
+
+    memo.blend(inputs, config)
+    assert memo.stats.hits == distinct and memo.stats.misses == distinct
+    assert memo.stats.duplicate_rate == pytest.approx(1 - distinct / 150)
+
+    # Another top-K is another key: the memo stays at its bound.
+    memo.blend(inputs, config, top_k=5)
+    assert len(memo) == distinct and memo.stats.evictions == distinct
+    assert memo.stats.as_dict()["misses"] == 2 * distinct
+
+    no_memo = BlendMemo(max_entries=0)
+    assert_same_blend(no_memo.blend(inputs, config), blend_batch(inputs, config))
+    assert len(no_memo) == 0 and no_memo.stats.misses == distinct
+
+
+def test_memoized_reference_blend(monkeypatch):
+    rows = with_duplicates(60, seed=34)
+    config = BlendingConfig()
+    expected = [reference_blend(row, config) for row in rows]
+    memoized = memoize_blending(maxsize=1000)
+    monkeypatch.setattr("tests.test_batch_blending.merge_sort_blending_dedup", memoized)
+    assert [reference_blend(row, config) for row in rows] == expected
+
+    info = memoized.cache_info()
+    assert info.hits + info.misses == 90 and info.hits >= 15 and info.currsize == info.misses
+    # Hits hand out new lists: modifying one leaves the memo intact.
+    reference_blend(rows[0], config).clear()
+    assert reference_blend(rows[0], config) == expected[0]
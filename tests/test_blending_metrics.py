@@ -0,0 +1,71 @@
+"""
+Tests for the blending metrics on the compact blended result.
+"""
+import numpy as np
+import pytest
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.config.blending_config import BlendingConfig
+from src.evaluation.blending_metrics import (
+    ad_slot_histogram,
+    fixed_slot_histogram,
+    metric_cube,
+    metric_pack,
+    metric_pack_and_fixed_slots,
+    topk_metrics,
+)
+from src.utils.synthetic_data import make_synthetic_requests
+from tests.test_batch_blending import reference_blend
+
+
+def test_ad_slot_histogram_matches_reference_lists():
+    rows = make_synthetic_requests(200, seed=9, max_ads=10, max_nv=30, id_pool_size=25)
+    config = BlendingConfig()
+    expected = np.zeros(config.k, dtype=np.int64)
+    for row in rows:
+        for slot, item in enumerate(reference_blend(row, config)[:config.k]):
+            expected[slot] += item["revenue_signal"] != 0
+    blended = blend_batch(BlendingInput.from_rows(rows), config)
+    np.testing.assert_array_equal(ad_slot_histogram(blended, config.k), expected)
+
+
+def test_top_k_blend_gives_the_same_metrics():
+    inputs = BlendingInput.from_rows(make_synthetic_requests(200, seed=10))
+    config = BlendingConfig(k=8)
+    full = topk_metrics(blend_batch(inputs, config), config.k)
+    truncated = topk_metrics(blend_batch(inputs, config, top_k=config.k), config.k)
+    for name, values in full.items():
+        np.testing.assert_array_equal(truncated[name], values)
+
+
+def test_metric_cube_matches_metric_pack_at_every_k():
+    inputs = BlendingInput.from_rows(make_synthetic_requests(200, seed=11, max_nv=30))
+    blended = blend_batch(inputs, BlendingConfig(), top_k=24)
+    cube = metric_cube(blended, [24, 1, 2, 12, 2])
+    assert cube.ks.tolist() == [1, 2, 12, 24] and len(cube) == 200
+    for k in cube.ks:
+        expected = metric_pack(blended, k)
+        assert list(cube.at(k)) == list(expected)
+        for name, values in expected.items():
+            np.testing.assert_array_equal(cube.at(k)[name], values)
+    with pytest.raises(KeyError):
+        cube.at(3)
+
+
+def test_fixed_slot_histogram_matches_sorted_structs():
+    rows = make_synthetic_requests(200, seed=12, max_nv=30)
+    k = 12
+    expected = np.zeros(k, dtype=np.int64)
+    for row in rows:
+        fixed = sorted(
+            list(zip(row["ad_sorted_card_position_array"], row["ad_quality_score_array"],
+                     row["ad_expected_value_array"]))
+            + [(p, e, 0.0) for p, e in zip(row["nv_sorted_card_position_array"], row["nv_pctr_array"])]
+        )
+        for slot, (_, _, revenue) in enumerate(fixed[:k]):
+            expected[slot] += revenue != 0
+    inputs = BlendingInput.from_rows(rows)
+    np.testing.assert_array_equal(fixed_slot_histogram(inputs, k), expected)
+    values, fixed_slots = metric_pack_and_fixed_slots(blend_batch(inputs, BlendingConfig(k=k)), k)
+    np.testing.assert_array_equal(fixed_slots, expected)
+    assert list(values) == list(metric_pack(blend_batch(inputs, BlendingConfig(k=k)), k))
@@ -0,0 +1,152 @@
+"""
+Tests for the pipeline DAG and the local ad data pipeline.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from src.data_pipelines.ad_pipeline import AD_OUTPUT, DEDUP_KEY_COLUMNS, ad_pipeline, run_ad_pipeline
+from src.data_pipelines.dag import Pipeline, Stage, render_sql
+from src.data_pipelines.nv_pipeline import NV_OUTPUT, run_nv_pipeline
+from src.utils.synthetic_data import make_synthetic_ad_events, make_synthetic_events
+
+DATE = "2025-07-23"
+
+
+@pytest.fixture(scope="module")
+def events():
+    return make_synthetic_ad_events(800, date=DATE, seed=81)
+
+
+def pandas_ad_pipeline(events):
+    """The notebook's four steps in pandas."""
+    imp = events["fact_item_card_view_dedup"].to_pandas()
+    imp = imp[imp["IS_SPONSORED"] & (imp["FEATURE"] == "category") & (imp["CURRENCY"] == "USD")
+              & (imp["RECEIVED_AT"].dt.strftime("%Y-%m-%d") == DATE)]
+    imp = pd.DataFrame({
+        "CLIPPED_IMPRESSION_TIMESTAMP": imp["RECEIVED_AT"].dt.strftime("%Y-%m-%d %H:%M"),
+        "CARD_POSITION": imp["CARD_POSITION"],
+        "DD_SESSION_ID": imp["DD_SESSION_ID"].fillna("null"),
+        "STORE_ID": imp["STORE_ID"].astype(str),
+        "L1_CATEGORY_ID": imp["L1_CATEGORY_ID"],
+        "L2_CATEGORY_ID": imp["L2_CATEGORY_ID"],
+        "IMPRESSION_EVENT_ID": imp["ID"],
+    })
+    funnel = events["fact_ads_item_request_funnel"].to_pandas()
+    funnel = funnel[(funnel["AUCTION_OCCURRED_AT"].dt.strftime("%Y-%m-%d") == DATE)
+                    & funnel["PLACEMENT"].str.startswith("PLACEMENT_TYPE_SPONSORED_PRODUCTS_CATEGORY_L")]
+    joined = funnel.merge(imp, on="IMPRESSION_EVENT_ID", how="left")
+    joined["unshown"] = joined["CARD_POSITION"].isna()
+    joined["tail_order"] = np.where(joined["unshown"], -joined["EXPECTED_VALUE"], 0.0)
+    joined = joined.sort_values(["AD_REQUEST_ID", "unshown", "CARD_POSITION", "tail_order"])
+    joined["CARD_POSITION"] = joined["CARD_POSITION"].fillna(99999).astype(int)
+    grouped = joined.groupby("AD_REQUEST_ID", sort=True).agg(
+        DD_SESSION_ID_MIN=("DD_SESSION_ID", "min"),
+        CLIPPED_IMPRESSION_TIMESTAMP_MIN=("CLIPPED_IMPRESSION_TIMESTAMP", "min"),
+        STORE_ID_MIN=("STORE_ID", "min"),
+        L1_CATEGORY_ID_MIN=("L1_CATEGORY_ID", "min"),
+        L2_CATEGORY_ID_MIN=("L2_CATEGORY_ID", "min"),
+        EXPECTED_VALUE_LIST=("EXPECTED_VALUE", list),
+        UNHASHED_BMS_ID_LIST=("BUSINESS_MERCHANT_SUPPLIED_ID", list),
+        CARD_POSITION_LIST=("CARD_POSITION", list),
+    ).reset_index()
+    # Requests without impressions have NULL keys, which the join back drops.
+    grouped = grouped.dropna(subset=list(DEDUP_KEY_COLUMNS))
+    keys = grouped[list(DEDUP_KEY_COLUMNS)].agg("|".join, axis=1)
+    return grouped[keys.map(keys.value_counts()) == 1]
+
+
+def sorted_rows(table, columns):
+    return sorted(table.select(columns).to_pylist(), key=lambda row: row["AD_REQUEST_ID"])
+
+
+def test_ad_pipeline_matches_pandas(events):
+    run = run_ad_pipeline(events, DATE)
+    output = run.outputs[AD_OUTPUT]
+    expected = pandas_ad_pipeline(events)
+    columns = ["AD_REQUEST_ID", *DEDUP_KEY_COLUMNS, "EXPECTED_VALUE_LIST", "UNHASHED_BMS_ID_LIST",
+               "CARD_POSITION_LIST"]
+    assert 0 < output.num_rows < 800
+    assert sorted_rows(output, columns) == sorted_rows(pa.Table.from_pandas(expected, preserve_index=False), columns)
+    assert set(run.seconds) == set(ad_pipeline().order)
+
+
+def test_nv_pipeline_lists_are_ordered_and_keys_unique():
+    events = make_synthetic_events(600, date=DATE, seed=82)
+    output = run_nv_pipeline(events, DATE).outputs[NV_OUTPUT].to_pylist()
+    assert 0 < len(output) < 600
+    logs = events["sps_nv_consumer"].to_pylist()
+    pctr = {(dict(r["features"])["ranking_event_id"], dict(r["features"])["unhashed_business_merchant_supplied_id"]):
+            r["prediction_result"] for r in logs if r["predictor_name"].endswith("ctr_mtml")
+            and r["iguazu_partition_date"] == DATE and dict(r["features"])["page_source"] == "RETAIL_CATEGORY_PAGE"}
+    for row in output:
+        positions = row["CARD_POSITION_LIST"]
+        assert positions == sorted(positions)
+        assert len(row["NV_PCTR_LIST"]) == len(positions) == len(row["UNHASHED_BMS_ID_LIST"])
+        expected = [pctr[(row["NV_RANKING_ID"], bms_id)] for bms_id in row["UNHASHED_BMS_ID_LIST"]]
+        assert row["NV_PCTR_LIST"] == expected
+    keys = [tuple(row[key] for key in DEDUP_KEY_COLUMNS) for row in output]
+    assert len(set(keys)) == len(keys)
+
+    # Another model id finds no predictions, so no ranking survives the join.
+    assert run_nv_pipeline(events, DATE, v2c_model_id="x", ctr_model_id="y").outputs[NV_OUTPUT].num_rows == 0
+
+
+def test_materialized_and_parquet_sources_match(events, tmp_path):
+    expected = run_ad_pipeline(events, DATE).outputs[AD_OUTPUT]
+    paths = {}
+    for name, table in events.items():
+        paths[name] = str(tmp_path / "sources" / name)
+        pq.write_to_dataset(table, paths[name])
+    run = run_ad_pipeline(paths, DATE, max_workers=1, materialize=str(tmp_path / "stages"))
+    assert sorted_rows(run.outputs[AD_OUTPUT], expected.column_names) == sorted_rows(expected, expected.column_names)
+    assert (tmp_path / "stages" / "ad_impression.parquet").exists()
+
+
+def test_independent_stages_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def meet(tables, params):
+        barrier.wait()  # deadlocks unless both branches run at once
+        return tables["source"]
+
+    pipeline = Pipeline([
+        Stage("lhs", ("source",), fn=meet),
+        Stage("rhs", ("source",), fn=meet),
+        Stage("both", ("lhs", "rhs"), sql="SELECT COUNT(*) AS n, {scale} AS scale FROM lhs, rhs"),
+    ])
+    assert pipeline.order[-1] == "both" and pipeline.sources == ["source"] and pipeline.sinks == ["both"]
+    run = pipeline.run({"source": pa.table({"x": [1, 2, 3]})}, params={"scale": 2})
+    assert run.outputs["both"].to_pylist() == [{"n": 9, "scale": 2}]
+    assert pipeline.downstream(["lhs"]) == ["lhs", "both"] and pipeline.upstream(["lhs"]) == ["lhs"]
+    assert render_sql("x IN ({values}) AND d = '{date}'", {"values": ("a", 2), "date": DATE}) == (
+        f"x IN ('a', 2) AND d = '{DATE}'"
+    )
+    # Quotes inside string params are escaped, not closing the literal.
+    quoted = Pipeline([Stage("q", ("source",), sql="SELECT x FROM source WHERE y IN ({ids}) OR y = '{id}'")])
+    rows = pa.table({"x": [1, 2, 3], "y": ["a'b", "c", "d' OR '1'='1"]})
+    run = quoted.run({"source": rows}, params={"ids": ("a'b",), "id": "d' OR '1'='1"})
+    assert run.outputs["q"].column("x").to_pylist() == [1, 3]
+
+
+def test_pipeline_errors():
+    source = {"source": pa.table({"x": [1]})}
+    with pytest.raises(ValueError, match="cycle"):
+        Pipeline([Stage("a", ("b",), sql="SELECT 1"), Stage("b", ("a",), sql="SELECT 1")])
+    with pytest.raises(ValueError, match="duplicate"):
+        Pipeline([Stage("a", (), sql="SELECT 1"), Stage("a", (), sql="SELECT 2")])
+    with pytest.raises(ValueError):
+        Stage("a", ())
+    with pytest.raises(KeyError):
+        Pipeline([Stage("a", ("source",), sql="SELECT * FROM source")]).run({})
+    schema = pa.schema([("x", pa.int64())])
+    typed = Pipeline([Stage("a", ("source",), sql="SELECT 'x' AS x FROM source", schema=schema)])
+    with pytest.raises(ValueError, match="schema"):
+        typed.run(source)
+    failing = Pipeline([Stage("a", ("source",), sql="SELECT * FROM no_such_table")])
+    with pytest.raises(Exception):
+        failing.run(source)
@@ -0,0 +1,66 @@
+"""
+Tests for the single-pass unique-key filter.
+"""
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from src.data_pipelines.ad_pipeline import AD_DEDUP, AD_PARAMS, ad_pipeline
+from src.data_pipelines.dedup import DUPLICATE_ROWS, UniqueKeyFilter, key_hashes
+from src.utils.synthetic_data import make_synthetic_ad_events
+
+DATE = "2025-07-23"
+
+FILTER = UniqueKeyFilter("rows", ("SESSION", "STORE"))
+
+ROWS = pa.table({
+    "SESSION": ["s1", "s1", "s2", None, "s3", "s1", "s4", "s4", "s4"],
+    "STORE": ["a", "a", "a", "a", "b", "b", "c", "c", "c"],
+    "VALUE": list(range(9)),
+})
+
+
+def query(sql, name, rows):
+    connection = duckdb.connect()
+    connection.register(name, rows)
+    return connection.execute(sql).to_arrow_table()
+
+
+def values(table, column="VALUE"):
+    return sorted(table.column(column).to_pylist())
+
+
+def test_apply_keeps_unique_keys_in_order_and_reports_the_rest():
+    kept, report = FILTER.apply(ROWS)
+    assert kept.column("VALUE").to_pylist() == [2, 4, 5]
+    assert (report.rows, report.kept, report.removed, report.null_key_rows) == (9, 3, 6, 1)
+    assert report.duplicates.to_pylist() == [
+        {"SESSION": "s4", "STORE": "c", DUPLICATE_ROWS: 3},
+        {"SESSION": "s1", "STORE": "a", DUPLICATE_ROWS: 2},
+    ]
+
+
+def test_hashes_depend_on_every_key_column():
+    hashes, valid = key_hashes(ROWS, FILTER.keys)
+    assert hashes[0] == hashes[1] and hashes[0] != hashes[5] and hashes[0] != hashes[2]
+    assert valid.tolist() == [True, True, True, False] + [True] * 5
+
+
+@pytest.mark.parametrize("rows", [ROWS, ROWS.slice(0, 0), pa.concat_tables([ROWS.slice(0, 4), ROWS.slice(4)])])
+def test_local_and_window_forms_match_the_join(rows):
+    expected = values(query(FILTER.sql(window=False), "rows", rows))
+    assert values(FILTER.apply(rows)[0]) == expected
+    assert values(query(FILTER.sql(), "rows", rows)) == expected
+
+
+def test_ad_dedup_matches_the_notebook_join():
+    events = make_synthetic_ad_events(600, date=DATE, seed=13, duplicate_key_rate=0.2)
+    run = ad_pipeline().run(events, dict(AD_PARAMS, date=DATE), targets=[AD_DEDUP.table])
+    grouped = run.outputs[AD_DEDUP.table]
+    kept, report = AD_DEDUP.apply(grouped)
+    expected = values(query(AD_DEDUP.sql(window=False), AD_DEDUP.table, grouped), "AD_REQUEST_ID")
+    assert values(kept, "AD_REQUEST_ID") == expected
+    assert values(query(AD_DEDUP.sql(), AD_DEDUP.table, grouped), "AD_REQUEST_ID") == expected
+    assert report.duplicates.num_rows > 0
+    assert report.removed == report.null_key_rows + int(np.sum(report.duplicates.column(DUPLICATE_ROWS)))
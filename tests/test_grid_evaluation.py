@@ -0,0 +1,95 @@
+"""
+Tests for grid evaluation, the blending metrics and raw list parsing.
+"""
+import math
+
+import numpy as np
+import pytest
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.config.blending_config import BlendingConfig
+from src.evaluation.blending_metrics import ad_slot_histogram, fixed_slot_histogram
+from src.evaluation.grid_evaluation import (
+    config_grid,
+    evaluate_config,
+    evaluate_grid,
+    grid_results_frame,
+    slot_histogram_grid,
+)
+from src.utils.list_parsing import parse_raw_rows
+from src.utils.synthetic_data import make_synthetic_requests, to_raw_rows
+from tests.test_batch_blending import reference_blend
+
+
+def notebook_metrics(row, config):
+    """The notebook's metric columns for one request, computed with plain Python."""
+    k = config.k
+    merged = reference_blend(row, config)[:k]
+    fixed = sorted(
+        list(zip(row["ad_sorted_card_position_array"], row["ad_quality_score_array"],
+                 row["ad_expected_value_array"]))
+        + [(p, e, 0.0) for p, e in zip(row["nv_sorted_card_position_array"], row["nv_pctr_array"])]
+    )[:k]
+    return {
+        "ads_load_topk": sum(rev > 0 for _, _, rev in fixed),
+        "ads_load_topk_blended": sum(x["revenue_signal"] > 0 for x in merged),
+        "sum_enga_util_topk": sum(e / math.log2(i + 2) for i, (_, e, _) in enumerate(fixed)),
+        "sum_engagement_util_topk_blended": sum(
+            x["engagement_signal"] / math.log2(i + 2) for i, x in enumerate(merged)),
+        "sum_rev_util_topk": sum(r / math.log2(i + 2) for i, (_, _, r) in enumerate(fixed)),
+        "sum_revenue_util_topk_blended": sum(
+            x["revenue_signal"] / math.log2(i + 2) for i, x in enumerate(merged)),
+    }
+
+
+@pytest.fixture(scope="module")
+def rows():
+    return parse_raw_rows(to_raw_rows(make_synthetic_requests(150, seed=8, max_nv=40, id_pool_size=40)))
+
+
+def test_parse_raw_rows_rounds_floats_like_spark(rows):
+    raw = make_synthetic_requests(3, seed=1)
+    parsed = parse_raw_rows(to_raw_rows(raw))
+    assert parsed[0]["ad_unhashed_bms_id_array"] == raw[0]["ad_unhashed_bms_id_array"]
+    assert parsed[0]["nv_pctr_array"] == np.float32(raw[0]["nv_pctr_array"]).tolist()
+
+
+@pytest.mark.parametrize("config", [BlendingConfig(), BlendingConfig(k=4, alpha=5, max_ads_block_size=1)])
+def test_metric_table_matches_notebook_formulas(rows, config):
+    table = evaluate_config(BlendingInput.from_rows(rows), config).set_index("metric")
+    expected = [notebook_metrics(row, config) for row in rows]
+    assert list(table.index) == list(expected[0])
+    for name in table.index:
+        values = np.array([m[name] for m in expected])
+        assert table.loc[name, "mean"] == pytest.approx(values.mean())
+        assert table.loc[name, "median"] == pytest.approx(np.sort(values)[(len(values) + 1) // 2 - 1])
+
+
+def test_worker_pool_matches_serial(rows):
+    inputs = BlendingInput.from_rows(rows)
+    configs = config_grid(k=(6, 12), alpha=(5.0, 20.0), max_ads_block_size=(1, 3))
+    serial = evaluate_grid(inputs, configs, max_workers=1)
+    pooled = evaluate_grid(inputs, configs, max_workers=2)
+    assert list(pooled) == configs
+    for config in configs:
+        assert pooled[config].equals(serial[config])
+    stacked = grid_results_frame(pooled)
+    assert len(stacked) == 6 * len(configs)
+    assert list(stacked.columns[:5]) == ["k", "alpha", "beta", "max_ads_block_size", "min_nv_block_size"]
+
+
+def test_slot_histogram_grid(rows):
+    inputs = BlendingInput.from_rows(rows)
+    configs = config_grid(k=(4, 12), alpha=(5.0, 20.0))
+    frame = slot_histogram_grid(inputs, configs, max_workers=2)
+    assert frame.equals(slot_histogram_grid(inputs, configs, max_workers=1))
+    knobs = ["k", "alpha", "beta", "max_ads_block_size", "min_nv_block_size"]
+    assert list(frame.columns) == knobs + ["order"] + list(range(12))
+    for i, config in enumerate(configs):
+        fixed, blended = frame.iloc[2 * i], frame.iloc[2 * i + 1]
+        assert (fixed.order, blended.order) == ("fixed", "blended") and fixed.k == config.k
+        counts = blended[list(range(12))].to_numpy(dtype=np.int64)
+        np.testing.assert_array_equal(counts[:config.k], ad_slot_histogram(blend_batch(inputs, config), config.k))
+        np.testing.assert_array_equal(counts[config.k:], 0)
+        np.testing.assert_array_equal(
+            fixed[list(range(config.k))].to_numpy(dtype=np.int64), fixed_slot_histogram(inputs, config.k))
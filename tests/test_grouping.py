@@ -0,0 +1,98 @@
+"""
+Tests for the single-sort list grouping.
+"""
+import duckdb
+import pyarrow as pa
+import pytest
+
+from src.data_pipelines.ad_pipeline import AD_GROUPING, AD_PARAMS, ad_pipeline
+from src.data_pipelines.dag import Stage
+from src.data_pipelines.grouping import ListColumn, ListGrouping, OrderKey
+from src.utils.synthetic_data import make_synthetic_ad_events
+
+DATE = "2025-07-23"
+
+GROUPING = ListGrouping(
+    "rows",
+    "ID",
+    mins=("SESSION",),
+    lists=(
+        ListColumn("SCORE_LIST", "SCORE"),
+        ListColumn("NAME_LIST", "NAME"),
+        ListColumn("POSITION_LIST", "POSITION", fill=99999),
+    ),
+    order=(OrderKey("POSITION"), OrderKey("SCORE", descending=True)),
+)
+
+ROWS = pa.table({
+    "ID": ["a", "b", "a", "a", None, "b", "a", "c"],
+    "SESSION": ["s2", None, "s1", "s3", "s9", None, None, "s4"],
+    "POSITION": pa.array([3, None, 1, None, 7, 2, None, None], pa.int64()),
+    "SCORE": [0.3, 0.5, None, 0.9, 0.1, 0.2, 0.4, None],
+    "NAME": ["x3", "y1", "x1", "x9", "z", None, "x4", None],
+})
+
+# Per-list ARRAY_AGG, the way the notebooks write the grouping.
+PER_LIST_SQL = """
+SELECT
+  ID,
+  MIN(SESSION) AS SESSION_MIN,
+  COALESCE(ARRAY_AGG(SCORE ORDER BY POSITION NULLS LAST, SCORE DESC NULLS LAST)
+           FILTER (WHERE SCORE IS NOT NULL), []) AS SCORE_LIST,
+  COALESCE(ARRAY_AGG(NAME ORDER BY POSITION NULLS LAST, SCORE DESC NULLS LAST)
+           FILTER (WHERE NAME IS NOT NULL), []) AS NAME_LIST,
+  ARRAY_AGG(COALESCE(POSITION, 99999) ORDER BY POSITION NULLS LAST, SCORE DESC NULLS LAST) AS POSITION_LIST
+FROM rows
+GROUP BY ID
+"""
+
+
+def query(sql, rows):
+    connection = duckdb.connect()
+    connection.register("rows", rows)
+    return connection.execute(sql).to_arrow_table()
+
+
+def by_key(table, key="ID"):
+    return {row.pop(key): row for row in table.to_pylist()}
+
+
+def test_group_orders_every_list_by_one_sort():
+    grouped = by_key(GROUPING.group(ROWS))
+    assert grouped["a"] == {
+        "SESSION_MIN": "s1",
+        "SCORE_LIST": [0.3, 0.9, 0.4],
+        "NAME_LIST": ["x1", "x3", "x9", "x4"],
+        "POSITION_LIST": [1, 3, 99999, 99999],
+    }
+    assert grouped["b"] == {"SESSION_MIN": None, "SCORE_LIST": [0.2, 0.5], "NAME_LIST": ["y1"],
+                            "POSITION_LIST": [2, 99999]}
+    assert grouped["c"] == {"SESSION_MIN": "s4", "SCORE_LIST": [], "NAME_LIST": [], "POSITION_LIST": [99999]}
+    assert grouped[None]["NAME_LIST"] == ["z"]
+
+
+@pytest.mark.parametrize("rows", [ROWS, ROWS.slice(0, 0), pa.concat_tables([ROWS.slice(0, 3), ROWS.slice(3)])])
+def test_local_and_sql_forms_match_per_list_aggregation(rows):
+    expected = by_key(query(PER_LIST_SQL, rows))
+    assert by_key(GROUPING.group(rows)) == expected
+    assert by_key(query(GROUPING.sql(), rows)) == expected
+    assert by_key(query(GROUPING.sql(single_sort=False), rows)) == expected
+
+
+def test_ad_grouping_matches_its_sql_form():
+    events = make_synthetic_ad_events(400, date=DATE, seed=5)
+    run = ad_pipeline().run(events, dict(AD_PARAMS, date=DATE), targets=["ad_left_joined_table"])
+    joined = run.outputs["ad_left_joined_table"]
+    connection = duckdb.connect()
+    connection.register("ad_left_joined_table", joined)
+    local = by_key(AD_GROUPING.group(joined), "AD_REQUEST_ID")
+    assert local == by_key(connection.execute(AD_GROUPING.sql()).to_arrow_table(), "AD_REQUEST_ID")
+    assert len(local) == len(set(joined.column("AD_REQUEST_ID").to_pylist()))
+
+
+def test_fingerprint_follows_the_grouping():
+    reordered = ListGrouping(GROUPING.table, GROUPING.key, GROUPING.mins, GROUPING.lists, (OrderKey("POSITION"),))
+    stages = [Stage("grouped", ("rows",), fn=grouping, params=()) for grouping in (GROUPING, reordered)]
+    assert stages[0].fingerprint({}, ["x"]) != stages[1].fingerprint({}, ["x"])
+    again = Stage("grouped", ("rows",), fn=GROUPING, params=())
+    assert stages[0].fingerprint({"date": DATE}, ["x"]) == again.fingerprint({}, ["x"])
@@ -0,0 +1,51 @@
+"""
+Tests for bms id interning and the flag-array dedup.
+"""
+import numpy as np
+import pytest
+
+from src.algorithms import interning
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.algorithms.interning import intern_ids
+from src.config.blending_config import BlendingConfig
+from src.utils.synthetic_data import make_synthetic_requests
+from tests.test_batch_blending import CONFIGS, reference_blend
+
+
+def check_interned(inputs, interned):
+    assert interned.ad_bms_id.dtype == np.int32 and interned.nv_bms_id.dtype == np.int32
+    for r in range(len(inputs)):
+        row, dense = inputs.row(r), interned.row(r)
+        ids = row["ad_unhashed_bms_id_array"] + row["nv_unhashed_bms_id_array"]
+        codes = dense["ad_unhashed_bms_id_array"] + dense["nv_unhashed_bms_id_array"]
+        assert sorted(set(codes)) == list(range(interned.n_ids[r]))
+        assert len(set(zip(ids, codes))) == len(set(ids)) == interned.n_ids[r]
+
+
+def test_ids_are_dense_per_request():
+    inputs = BlendingInput.from_rows(make_synthetic_requests(100, seed=12, max_nv=30, id_pool_size=20))
+    check_interned(inputs, intern_ids(inputs))
+    assert intern_ids(intern_ids(inputs)).n_ids is not None
+
+
+def test_hash_collisions_fall_back_to_exact_codes(monkeypatch):
+    inputs = BlendingInput.from_rows(make_synthetic_requests(50, seed=13, max_nv=30, id_pool_size=20))
+    monkeypatch.setattr(interning, "_hash_codes", lambda ids: np.zeros(len(ids), dtype=np.int64))
+    check_interned(inputs, intern_ids(inputs))
+
+
+@pytest.mark.parametrize("config", CONFIGS)
+def test_interned_blend_matches_reference(config):
+    rows = make_synthetic_requests(300, seed=14, max_ads=10, max_nv=30, id_pool_size=25)
+    blended = blend_batch(intern_ids(BlendingInput.from_rows(rows)), config)
+    for r, row in enumerate(rows):
+        assert blended.to_records(r) == reference_blend(row, config)
+
+
+def test_take_keeps_interned_ids():
+    inputs = intern_ids(BlendingInput.from_rows(make_synthetic_requests(30, seed=15)))
+    subset = inputs.take(np.array([7, 3, 20]))
+    np.testing.assert_array_equal(subset.n_ids, inputs.n_ids[[7, 3, 20]])
+    full = blend_batch(inputs, BlendingConfig())
+    for r, original in enumerate([7, 3, 20]):
+        assert blend_batch(subset).to_records(r) == full.to_records(original)
@@ -0,0 +1,43 @@
+"""
+Tests for the columnar list decoder.
+"""
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from src.algorithms.batch_blending import BlendingInput
+from src.utils.list_decoding import blending_input_from_raw, decode_list_array, decode_list_column
+from src.utils.list_parsing import parse_list, parse_raw_rows
+from src.utils.synthetic_data import make_synthetic_requests, to_raw_rows
+
+CASES = {
+    "int": ["[1, 2 ,3]", "[]", "[\n]", None, "[\n  7\n]", "  [4]  "],
+    "float": ["[1.5, 2e-3, -0.1]", "[]", None, "[0.30000001]", "[\n  1,\n  2\n]"],
+    "string": ['["a", "b c"]', "[]", '[""]', '["x\\"y", "z"]', None, '[\n "a,b",\n "c" ]', '["[x]"]',
+               '["\\u00e9"]', "[12, 34]"],
+}
+
+
+@pytest.mark.parametrize("kind", sorted(CASES))
+def test_decoder_matches_row_parser(kind):
+    texts = CASES[kind]
+    assert decode_list_array(texts, kind).to_pylist() == [parse_list(t, kind) for t in texts]
+    values, offsets = decode_list_column(pa.array(texts), kind)
+    expected = [parse_list(t, kind) or [] for t in texts]
+    assert offsets.tolist() == np.cumsum([0] + [len(e) for e in expected]).tolist()
+    assert values.tolist() == [v for e in expected for v in e]
+
+
+def test_malformed_lists_raise_like_the_row_parser():
+    with pytest.raises(ValueError):
+        decode_list_array(["[1,,2]"], "int")
+
+
+def test_blending_input_from_raw_columns():
+    rows = make_synthetic_requests(300, seed=23, max_nv=30)
+    raw = to_raw_rows(rows)
+    columns = {name: [row[name] for row in raw] for name in raw[0]}
+    decoded = blending_input_from_raw(columns)
+    expected = BlendingInput.from_rows(parse_raw_rows(raw))
+    for field in ("ad_offsets", "nv_offsets", "ad_quality_score", "nv_pctr", "ad_card_position", "nv_bms_id"):
+        np.testing.assert_array_equal(getattr(decoded, field), getattr(expected, field))
@@ -0,0 +1,147 @@
+"""
+Tests for the content-hash stage materialization cache.
+"""
+import os
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+
+from src.data_pipelines import materialization
+from src.data_pipelines.ad_pipeline import AD_OUTPUT, ad_pipeline, run_ad_pipeline
+from src.data_pipelines.backfill import backfill
+from src.data_pipelines.dag import Pipeline, Stage
+from src.data_pipelines.materialization import (
+    STATUS_CACHED,
+    STATUS_RUN,
+    STATUS_SKIPPED,
+    MaterializationCache,
+    format_plan,
+    source_fingerprint,
+    source_fingerprints,
+)
+from src.data_pipelines.nv_pipeline import NV_OUTPUT, run_nv_pipeline
+from src.utils.synthetic_data import make_synthetic_events
+
+DATE = "2025-07-23"
+
+
+@pytest.fixture(scope="module")
+def events():
+    return make_synthetic_events(300, date=DATE, seed=91)
+
+
+def statuses(run):
+    return {p.stage: p.status for p in run.plan}
+
+
+def test_unchanged_stages_are_served_from_the_cache(events, tmp_path):
+    cache = MaterializationCache(str(tmp_path))
+    first = run_ad_pipeline(events, DATE, cache=cache)
+    assert set(statuses(first).values()) == {STATUS_RUN}
+
+    second = run_ad_pipeline(events, DATE, cache=cache)
+    assert statuses(second)[AD_OUTPUT] == STATUS_CACHED and not second.seconds
+    assert set(statuses(second).values()) == {STATUS_CACHED, STATUS_SKIPPED}
+    assert second.outputs[AD_OUTPUT].equals(first.outputs[AD_OUTPUT])
+
+    # A new placement filter reruns the funnel stage and everything below it.
+    placements = ("PLACEMENT_TYPE_SPONSORED_PRODUCTS_CATEGORY_L1",)
+    third = run_ad_pipeline(events, DATE, cache=cache, placements=placements)
+    assert statuses(third) == {
+        "ad_impression": STATUS_CACHED,
+        "ad_funnel": STATUS_RUN,
+        "ad_left_joined_table": STATUS_RUN,
+        "ad_grouped_left_joined_table": STATUS_RUN,
+        AD_OUTPUT: STATUS_RUN,
+    }
+    assert third.outputs[AD_OUTPUT].num_rows < first.outputs[AD_OUTPUT].num_rows
+    assert len(cache.fingerprints("ad_funnel")) == 2 and len(cache.fingerprints("ad_impression")) == 1
+
+
+def test_dry_run_and_model_change(events, tmp_path):
+    cache = MaterializationCache(str(tmp_path))
+    dry = run_nv_pipeline(events, DATE, cache=cache, dry_run=True)
+    assert not dry.outputs and not os.listdir(tmp_path) and set(statuses(dry).values()) == {STATUS_RUN}
+    assert "run" in format_plan(dry.plan) and NV_OUTPUT in format_plan(dry.plan)
+
+    run_nv_pipeline(events, DATE, cache=cache)
+    changed = run_nv_pipeline(events, DATE, cache=cache, dry_run=True, v2c_model_id="mtml_v2c_ctr_2")
+    assert statuses(changed) == {
+        "nv_impression": STATUS_CACHED,
+        "nv_non_v2c_sibyl_log": STATUS_CACHED,
+        "nv_v2c_sibyl_log": STATUS_RUN,
+        "nv_union_sibyl_log": STATUS_RUN,
+        "nv_joined_table": STATUS_RUN,
+        "nv_grouped_table": STATUS_RUN,
+        NV_OUTPUT: STATUS_RUN,
+    }
+    # Another day shares no fingerprint.
+    other_day = run_nv_pipeline(events, "2025-07-24", cache=cache, dry_run=True)
+    assert set(statuses(other_day).values()) == {STATUS_RUN}
+
+
+def test_fingerprints_follow_logic_and_sources(events, tmp_path):
+    source = pa.table({"x": [1, 2, 3]})
+    base = Pipeline([Stage("a", ("s",), sql="SELECT x FROM s"), Stage("b", ("a",), sql="SELECT SUM(x) AS y FROM a")])
+    reformatted = Pipeline([Stage("a", ("s",), sql="select x\n  from s"), base.stages["b"]])
+    edited = Pipeline([Stage("a", ("s",), sql="SELECT x + 1 AS x FROM s"), base.stages["b"]])
+    fingerprints = base.fingerprints({"s": source}, {}, ["a", "b"])
+    assert reformatted.fingerprints({"s": source}, {}, ["a", "b"]) == fingerprints
+    assert edited.fingerprints({"s": source}, {}, ["a", "b"])["b"] != fingerprints["b"]
+    assert base.fingerprints({"s": pa.table({"x": [1, 2, 4]})}, {}, ["a", "b"])["a"] != fingerprints["a"]
+    # Unused parameters do not change a SQL stage's fingerprint.
+    assert base.fingerprints({"s": source}, {"date": DATE}, ["a", "b"]) == fingerprints
+
+    path = str(tmp_path / "s.parquet")
+    pq.write_table(source, path)
+    before = source_fingerprint(path)
+    assert source_fingerprint(path) == before
+    os.utime(path, ns=(0, 0))
+    assert source_fingerprint(path) != before
+    with pytest.raises(KeyError):
+        ad_pipeline().stages["ad_funnel"].parameters({"date": DATE})
+
+    # Supplied source fingerprints are used as given.
+    assert base.fingerprints({"s": source}, {}, ["a", "b"], source_fingerprints({"s": source})) == fingerprints
+    assert base.fingerprints({"s": source}, {}, ["a"], {"s": "other"})["a"] != fingerprints["a"]
+
+
+def test_slices_of_one_table_are_fingerprinted_apart(events, tmp_path):
+    table = pa.table({"x": list(range(10))})
+    assert len({source_fingerprint(t) for t in (table, table.slice(0, 3), table.slice(5, 5))}) == 3
+    # Equal rows hash equal whatever buffers they sit in.
+    assert source_fingerprint(table.slice(5, 5)) == source_fingerprint(pa.table({"x": list(range(5, 10))}))
+
+    cache = MaterializationCache(str(tmp_path))
+    full = run_ad_pipeline(events, DATE, cache=cache)
+    half = run_ad_pipeline({name: t.slice(0, t.num_rows // 2) for name, t in events.items()}, DATE, cache=cache)
+    assert set(statuses(half).values()) == {STATUS_RUN}
+    assert half.outputs[AD_OUTPUT].num_rows < full.outputs[AD_OUTPUT].num_rows
+
+
+def test_dataset_sources_are_fingerprinted(tmp_path):
+    source = pa.table({"x": [1, 2, 3]})
+    in_memory = ds.dataset(source)
+    assert source_fingerprint(in_memory) == source_fingerprint(source)
+    pq.write_table(source, str(tmp_path / "s.parquet"))
+    files = ds.dataset(str(tmp_path / "s.parquet"))
+    union = ds.dataset([files, in_memory])
+    assert source_fingerprint(union) not in (source_fingerprint(files), source_fingerprint(in_memory))
+    assert source_fingerprint(union) == source_fingerprint(ds.dataset([files, ds.dataset(source)]))
+
+
+def test_backfill_hashes_shared_sources_once(events, tmp_path, monkeypatch):
+    hashed = []
+    hash_table = materialization._hash_table
+
+    def counting_hash_table(table, digest):
+        hashed.append(table)
+        hash_table(table, digest)
+
+    monkeypatch.setattr(materialization, "_hash_table", counting_hash_table)
+    cache = MaterializationCache(str(tmp_path / "cache"))
+    report = backfill(events, "2025-07-22", "2025-07-24", str(tmp_path / "output"), cache=cache)
+    assert report.failed == []
+    assert len(hashed) == len(events)
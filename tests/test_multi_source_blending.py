@@ -0,0 +1,90 @@
+"""
+Tests for the heap-based multi-source blender.
+"""
+import itertools
+
+import numpy as np
+import pytest
+
+from src.algorithms.multi_source_blending import BlendSource, ads_source, blend_ads_and_nv, blend_sources, nv_source
+from src.config.blending_config import BlendingConfig
+from src.utils.synthetic_data import make_synthetic_requests
+from tests.test_batch_blending import CONFIGS, reference_blend
+
+EDGE_CONFIGS = CONFIGS + [
+    BlendingConfig(min_nv_block_size=0),
+    BlendingConfig(max_ads_block_size=1, min_nv_block_size=1),
+    BlendingConfig(max_ads_block_size=0),
+    BlendingConfig(max_ads_block_size=0, min_nv_block_size=1),
+]
+
+
+def source(name, utility, ids, **rules):
+    return BlendSource(
+        name=name, utility=utility, engagement_signal=[u / 100 for u in utility],
+        card_position=list(range(len(utility))), bms_id=ids, **rules,
+    )
+
+
+def names(merged):
+    return [(x["source"], x["index"]) for x in merged]
+
+
+@pytest.mark.parametrize("config", EDGE_CONFIGS)
+@pytest.mark.parametrize("id_pool_size", [8, 25])
+def test_two_sources_match_reference(config, id_pool_size, monkeypatch):
+    rows = make_synthetic_requests(500, seed=51, max_ads=10, max_nv=30, id_pool_size=id_pool_size)
+    expected = [reference_blend(row, config) for row in rows]
+    monkeypatch.setattr("tests.test_batch_blending.merge_sort_blending_dedup", blend_ads_and_nv)
+    assert [reference_blend(row, config) for row in rows] == expected
+
+
+def test_three_sources():
+    ads = source("ads", [10, 9, 8, 7], ["a1", "a2", "a3", "a4"], max_block_size=2)
+    brands = source("sponsored_brand", [9.5, 1], ["s1", "a2"], max_block_size=1)
+    nv = source("nv", [5, 4, 3, 2], ["n1", "n2", "n3", "n4"], min_block_size=2, fills_tail=False)
+    merged = blend_sources([ads, brands, nv])
+    # s1 interrupts the ad run; the brand copy of a2 is skipped once the ad is
+    # placed; the full ad run forces two NV items; NV alone does not fill the tail.
+    assert names(merged) == [
+        ("ads", 0), ("sponsored_brand", 0), ("ads", 1), ("ads", 2), ("nv", 0), ("nv", 1), ("ads", 3),
+    ]
+    assert merged[1] == {
+        "source": "sponsored_brand", "revenue_signal": 0.0, "engagement_signal": 0.095, "index": 0,
+        "original_card_position": 0,
+    }
+
+    # A source that fills the tail stops at its block limit.
+    assert names(blend_sources([source("a", [3, 2, 1], [1, 2, 3], max_block_size=2)])) == [("a", 0), ("a", 1)]
+    # Ties go to the source listed first.
+    a, b = source("a", [1.0], ["x"]), source("b", [1.0], ["y"])
+    assert names(blend_sources([b, a]))[0] == ("b", 0) and names(blend_sources([a, b]))[0] == ("a", 0)
+    assert blend_sources([]) == [] and blend_sources([source("a", [], [])]) == []
+
+
+def test_block_rules_hold_for_many_sources():
+    rng = np.random.default_rng(52)
+    for _ in range(200):
+        sources = [
+            source(f"s{r}", sorted(rng.random(int(rng.integers(0, 12))).tolist(), reverse=True), None,
+                   max_block_size=int(rng.integers(1, 4)))
+            for r in range(5)
+        ]
+        for r, s in enumerate(sources):
+            s.bms_id = [f"{r}-{p}" for p in range(len(s))]
+        merged = blend_sources(sources)
+        assert len(merged) <= sum(len(s) for s in sources)
+        limits = {s.name: s.max_block_size for s in sources}
+        for name, run in itertools.groupby(x["source"] for x in merged):
+            assert len(list(run)) <= limits[name]
+        for s in sources:
+            # Each source keeps its ranked order.
+            indexes = [x["index"] for x in merged if x["source"] == s.name]
+            assert indexes == list(range(len(indexes)))
+
+
+def test_source_builders():
+    ads = ads_source([0.1, 0.2], [1.0, 0.5], [3, 9], ["a", "b"], alpha=10, max_block_size=3)
+    assert ads.utility == pytest.approx([2.0, 2.5]) and ads.fills_tail and ads.min_block_size is None
+    nv = nv_source([0.3], [1], ["c"], beta=10, min_block_size=2)
+    assert nv.utility == pytest.approx([3.0]) and not nv.fills_tail and nv.record(0)["revenue_signal"] == 0.0
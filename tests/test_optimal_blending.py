@@ -0,0 +1,140 @@
+"""
+Tests for the exact optimal blending solver and the greedy's optimality gap.
+"""
+import dataclasses
+
+import numpy as np
+import pytest
+
+from src.algorithms.batch_blending import (
+    AD_BMS_ID_COL,
+    AD_EXPECTED_VALUE_COL,
+    AD_QUALITY_SCORE_COL,
+    NV_BMS_ID_COL,
+    NV_PCTR_COL,
+    BlendingInput,
+    blend_batch,
+)
+from src.config.blending_config import BlendingConfig
+from src.evaluation.blending_metrics import slot_discounts
+from src.evaluation.optimal_blending import (
+    GAP_COL,
+    RELATIVE_GAP_COL,
+    blend_value,
+    optimal_blend,
+    optimality_gap,
+    summarize_gap,
+)
+from src.utils.synthetic_data import make_synthetic_requests
+from tests.test_batch_blending import CONFIGS
+
+
+def arrangements(row, config, k):
+    """Top-``k`` orders ``merge_sort_blending_dedup`` can produce with every ad-or-NV comparison left free."""
+    ad_ids, nv_ids = row[AD_BMS_ID_COL], row[NV_BMS_ID_COL]
+    n_ads, n_nv = len(ad_ids), len(nv_ids)
+    found = set()
+
+    # The reference loop, branching where it compares an ad with an NV item.
+    def run(i, j, ads_run, nv_run, must, placed, merged):
+        while (i < n_ads or j < n_nv) and len(merged) < k:
+            if i < n_ads and ad_ids[i] in placed:
+                i += 1
+                continue
+            if j < n_nv and nv_ids[j] in placed:
+                j += 1
+                continue
+            while must:
+                if j < n_nv:
+                    merged, placed, j, nv_run = merged + (("nv", j),), placed | {nv_ids[j]}, j + 1, nv_run + 1
+                    if nv_run >= config.min_nv_block_size:
+                        must, nv_run = False, 0
+                else:
+                    must, nv_run = False, 0
+            if i < n_ads and j < n_nv:
+                if ads_run >= config.max_ads_block_size:
+                    must, ads_run = True, 0
+                    continue
+                run(i + 1, j, ads_run + 1, nv_run, must, placed | {ad_ids[i]}, merged + (("ads", i),))
+                merged, placed, j, nv_run = merged + (("nv", j),), placed | {nv_ids[j]}, j + 1, nv_run + 1
+                if ads_run:
+                    must, ads_run = True, 0
+            elif i < n_ads:
+                if ads_run >= config.max_ads_block_size:
+                    break
+                merged, placed, i, ads_run = merged + (("ads", i),), placed | {ad_ids[i]}, i + 1, ads_run + 1
+            elif j < n_nv:
+                j += 1
+        found.add(merged[:k])
+
+    run(0, 0, 0, 0, False, frozenset(), ())
+    return found
+
+
+def arrangement_value(row, arrangement, config):
+    discounts = slot_discounts(len(arrangement))
+    return sum(
+        discount * (row[AD_EXPECTED_VALUE_COL][index] + config.alpha * row[AD_QUALITY_SCORE_COL][index]
+                    if source == "ads" else config.effective_beta * row[NV_PCTR_COL][index])
+        for discount, (source, index) in zip(discounts, arrangement)
+    )
+
+
+def traced(blended, r):
+    return tuple((x["source"], x["index"]) for x in blended.to_records(r))
+
+
+@pytest.mark.parametrize(
+    "config",
+    [dataclasses.replace(c, k=6) for c in CONFIGS]
+    + [BlendingConfig(k=6, max_ads_block_size=0), BlendingConfig(k=6, max_ads_block_size=2, min_nv_block_size=0)],
+)
+def test_matches_brute_force(config):
+    rows = make_synthetic_requests(200, seed=41, max_ads=6, max_nv=9, id_pool_size=10)
+    blended, values = optimal_blend(BlendingInput.from_rows(rows), config, chunk_size=64)
+    greedy = blend_batch(BlendingInput.from_rows(rows), config, top_k=config.k)
+    for r, row in enumerate(rows):
+        feasible = arrangements(row, config, config.k)
+        assert traced(greedy, r) in feasible and traced(blended, r) in feasible
+        expected = max(arrangement_value(row, arrangement, config) for arrangement in feasible)
+        assert values[r] == pytest.approx(expected, rel=1e-12, abs=1e-12)
+    # The traced arrangement scores the value the DP found.
+    np.testing.assert_allclose(blend_value(blended, config), values, rtol=1e-12, atol=1e-12)
+    assert blended.lengths.max() <= config.k
+
+
+def test_gap_against_the_greedy():
+    config = BlendingConfig()
+    rows = make_synthetic_requests(500, seed=43, max_nv=40, id_pool_size=30)
+    inputs = BlendingInput.from_rows(rows)
+    gaps = optimality_gap(inputs, config)
+    assert len(gaps) == 500 and (gaps[GAP_COL] >= -1e-12).all()
+    greedy = blend_batch(inputs, config, top_k=config.k)
+    np.testing.assert_allclose(gaps["greedy_value"], blend_value(greedy, config))
+    np.testing.assert_allclose(gaps[GAP_COL], gaps["optimal_value"] - gaps["greedy_value"])
+    assert ((gaps[RELATIVE_GAP_COL] >= -1e-12) & (gaps[RELATIVE_GAP_COL] < 1)).all()
+
+    summary = summarize_gap(gaps)
+    assert summary["requests"] == 500 and summary["above_optimum"] == 0
+    assert 0 < summary["optimal_share"] < 1 and 0 < summary["share_of_optimum"] <= 1
+    assert summary["gap_mean"] == pytest.approx(gaps[GAP_COL].mean())
+    assert "ads_load_topk_blended_optimal_mean" in summary.index
+
+
+def test_edge_cases():
+    rows = [
+        {AD_QUALITY_SCORE_COL: [], AD_EXPECTED_VALUE_COL: [], "ad_sorted_card_position_array": [],
+         AD_BMS_ID_COL: [], NV_PCTR_COL: [0.5, 0.4], "nv_sorted_card_position_array": [0, 1],
+         NV_BMS_ID_COL: ["x", "y"]},
+        {AD_QUALITY_SCORE_COL: [0.1, 0.1], AD_EXPECTED_VALUE_COL: [1.0, 1.0],
+         "ad_sorted_card_position_array": [0, 1], AD_BMS_ID_COL: ["x", "x"], NV_PCTR_COL: [],
+         "nv_sorted_card_position_array": [], NV_BMS_ID_COL: []},
+    ]
+    config = BlendingConfig()
+    blended, values = optimal_blend(BlendingInput.from_rows(rows), config)
+    # No ads: like the greedy, nothing is placed; a repeated ad id is placed once.
+    assert blended.lengths.tolist() == [0, 1]
+    np.testing.assert_allclose(values, [0.0, 1.0 + config.alpha * 0.1])
+
+    empty, values = optimal_blend(BlendingInput.from_rows([]), config)
+    assert len(empty) == 0 and len(values) == 0
@@ -0,0 +1,62 @@
+"""
+Tests for the mergeable KLL quantile sketches.
+"""
+import numpy as np
+import pytest
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.config.blending_config import BlendingConfig
+from src.evaluation.blending_metrics import metric_pack
+from src.evaluation.grid_evaluation import QUANTILES, summarize_metrics
+from src.evaluation.quantile_sketch import (
+    KLLSketch,
+    merge_metric_sketches,
+    metric_sketches,
+    sketch_summary,
+    sketches_from_bytes,
+    sketches_to_bytes,
+)
+from src.utils.synthetic_data import make_synthetic_requests
+
+
+def rank_error(sketch, values, qs):
+    ranks = np.searchsorted(np.sort(values), sketch.quantile(qs), side="right") / len(values)
+    return np.abs(ranks - qs).max()
+
+
+def test_small_streams_are_exact():
+    values = np.random.default_rng(0).random(150)
+    sketch = KLLSketch().update(values)
+    np.testing.assert_array_equal(sketch.quantile(QUANTILES), np.quantile(values, QUANTILES, method="inverted_cdf"))
+    assert sketch.mean == pytest.approx(values.mean())
+    assert np.isnan(KLLSketch().quantile(0.5))
+
+
+def test_merged_shards_stay_accurate_and_small():
+    values = np.random.default_rng(1).gamma(2.0, size=200_000)
+    shards = [KLLSketch(seed=s).update(chunk) for s, chunk in enumerate(np.array_split(values, 40))]
+    merged = merge_metric_sketches({"x": shard} for shard in shards)["x"]
+    assert merged.n == len(values) and merged.total == pytest.approx(values.sum())
+    assert merged.num_retained < 1000
+    qs = np.array([0.01, 0.25, 0.5, 0.75, 0.99])
+    assert rank_error(merged, values, qs) < 0.02
+    assert shards[0].n == 5000  # merging leaves the inputs alone
+
+    # Sketches of different k have different error bounds and do not mix.
+    with pytest.raises(ValueError, match="k="):
+        KLLSketch(100).merge(KLLSketch(200).update(values[:10]))
+    with pytest.raises(ValueError):
+        merge_metric_sketches([{"x": shards[0]}, sketches_from_bytes(sketches_to_bytes({"x": KLLSketch(50)}))])
+
+
+def test_sketch_summary_of_days_matches_exact_summary():
+    config = BlendingConfig()
+    days = [BlendingInput.from_rows(make_synthetic_requests(100, seed=s)) for s in (20, 21, 22)]
+    packs = [metric_pack(blend_batch(day, config, top_k=config.k), config.k) for day in days]
+    stored = [sketches_to_bytes(metric_sketches(pack, k=400)) for pack in packs]
+    merged = merge_metric_sketches(sketches_from_bytes(data) for data in stored)
+    exact = summarize_metrics({name: np.concatenate([p[name] for p in packs]) for name in packs[0]})
+    table = sketch_summary(merged)  # 300 values fit in k=400: no compaction yet
+    assert list(table.metric) == list(exact.metric)
+    assert table["mean"].tolist() == pytest.approx(exact["mean"].tolist())
+    assert table["quantiles"].tolist() == exact["quantiles"].tolist()
@@ -0,0 +1,124 @@
+"""
+Tests for the local query result cache.
+"""
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from src.utils.query_cache import QueryCache, normalize_query, query_key
+
+QUERY = "SELECT * FROM proddb.duocheng.FINAL_BLENDING_LONG_INPUT_UPTO_0721"
+
+
+def make_table(n=1000, offset=0):
+    return pa.table({"request_id": pa.array(range(offset, offset + n)), "score": pa.array([0.5] * n)})
+
+
+class CountingLoader:
+    def __init__(self, table):
+        self.table = table
+        self.calls = 0
+
+    def __call__(self, query):
+        self.calls += 1
+        return self.table
+
+
+def test_normalized_queries_share_a_key():
+    assert normalize_query("  select *\n  FROM  t ; ") == "select * from t"
+    assert normalize_query("SELECT 'A  B' FROM \"My Table\"") == "select 'A  B' from \"My Table\""
+    assert query_key("SELECT * FROM t") == query_key("select *\nfrom t;")
+    assert query_key("SELECT 'A'") != query_key("SELECT 'a'")
+    assert query_key("SELECT * FROM t", "proddb.duocheng") != query_key("SELECT * FROM t", "proddb.other")
+
+
+def test_load_fetches_once_and_memory_maps(tmp_path):
+    cache = QueryCache(str(tmp_path))
+    loader = CountingLoader(make_table())
+    first = cache.load(QUERY, loader)
+    second = cache.load(QUERY.lower() + ";", loader)
+    assert loader.calls == 1
+    assert first.equals(loader.table) and second.equals(loader.table)
+    assert (cache.hits, cache.misses) == (1, 1)
+    # A second cache on the same directory sees the entry, as a later notebook run would.
+    assert QUERY in QueryCache(str(tmp_path))
+    assert QueryCache(str(tmp_path)).read_table(QUERY).equals(loader.table)
+
+
+def test_hits_read_only_their_entry(tmp_path, monkeypatch):
+    cache = QueryCache(str(tmp_path))
+    cache.put_table(QUERY, make_table(10))
+    monkeypatch.setattr(cache, "entries", lambda: pytest.fail("a hit scanned the whole cache"))
+    assert cache.read_table(QUERY).equals(make_table(10))
+
+    # An entry evicted or half-removed by another process is a miss.
+    with open(os.path.join(cache.path(QUERY), "meta.json"), "w") as f:
+        f.write("{")
+    assert cache.read_table(QUERY) is None and (cache.hits, cache.misses) == (1, 1)
+
+
+def test_pandas_results_and_part_files(tmp_path):
+    cache = QueryCache(str(tmp_path))
+    frame = pd.DataFrame({"a": range(10), "b": list("abcdefghij")})
+    assert cache.load("select 1", lambda q: frame).to_pandas().equals(frame)
+
+    table = cache.put_table("select 2", make_table(25), rows_per_file=10)
+    entry = next(e for e in cache.entries() if e.query == "select 2")
+    assert sorted(f for f in os.listdir(entry.path) if f.endswith(".arrow")) == [
+        "part-00000.arrow", "part-00001.arrow", "part-00002.arrow"]
+    assert table.equals(make_table(25)) and entry.num_rows == 25
+
+    empty = cache.put_table("select 3", make_table(0))
+    assert empty.num_rows == 0 and empty.schema.names == ["request_id", "score"]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = QueryCache(str(tmp_path))
+    for i in range(3):
+        cache.put_table(f"select {i}", make_table(1000, i))
+        os.utime(os.path.join(cache.path(f"select {i}"), "meta.json"), (i, i))
+    entry_bytes = max(e.nbytes for e in cache.entries())
+
+    cache.read_table("select 0")  # now the most recently used
+    cache.max_bytes = 3 * entry_bytes
+    cache.put_table("select 3", make_table(1000, 3))
+    assert "select 1" not in cache
+    assert all(q in cache for q in ("select 0", "select 2", "select 3"))
+    assert cache.nbytes <= cache.max_bytes
+
+    cache.max_bytes = 1
+    cache.put_table("select 4", make_table(1000, 4))
+    assert [e.query for e in cache.entries()] == ["select 4"]
+    cache.clear()
+    assert cache.entries() == [] and "select 4" not in cache
+
+
+def test_failed_writes_leave_no_entry(tmp_path):
+    cache = QueryCache(str(tmp_path))
+
+    def batches():
+        yield from make_table(10).to_batches()
+        raise RuntimeError("warehouse connection lost")
+
+    with pytest.raises(RuntimeError):
+        cache.put_table("select 1", batches())
+    assert "select 1" not in cache and os.listdir(tmp_path) == []
+
+
+def test_spark_loads_are_cached_as_parquet(spark, tmp_path):
+    cache = QueryCache(str(tmp_path))
+    calls = []
+
+    def load_data_from_snowflake(query):
+        calls.append(query)
+        return spark.createDataFrame([(i, float(i)) for i in range(50)], "request_id int, score double").repartition(3)
+
+    load = cache.wrap(load_data_from_snowflake, spark)
+    first = load(QUERY)
+    second = load(QUERY)
+    assert len(calls) == 1
+    assert sorted(first.collect()) == sorted(second.collect())
+    assert second.count() == 50
+    assert cache.read_table(QUERY).num_rows == 50
@@ -0,0 +1,106 @@
+"""
+Tests for the ragged per-request list container.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.algorithms.interning import intern_ids
+from src.config.blending_config import BlendingConfig
+from src.evaluation.blending_metrics import fixed_slot_metrics, metric_pack
+from src.utils.ragged import RaggedArrays
+from src.utils.synthetic_data import make_synthetic_requests
+
+
+def make_ragged():
+    return RaggedArrays.from_lists(
+        {"score": [[0.5, 0.25], [], None, [1.0]], "id": [["a", "b"], [], None, ["c"]]},
+        dtypes={"score": np.float64, "id": object},
+    )
+
+
+def test_from_lists_rows_and_lengths():
+    ragged = make_ragged()
+    assert len(ragged) == 4
+    assert ragged.lengths.tolist() == [2, 0, 0, 1]
+    assert ragged.row(0) == {"score": [0.5, 0.25], "id": ["a", "b"]}
+    assert ragged.row(3) == {"score": [1.0], "id": ["c"]}
+    with pytest.raises(ValueError):
+        RaggedArrays.from_lists({"a": [[1], [2]], "b": [[1], []]})
+
+
+def test_slice_is_zero_copy():
+    ragged = make_ragged()
+    part = ragged.slice(2, 4)
+    assert len(part) == 2 and part.offsets[0] == 2
+    assert part["score"] is ragged["score"]
+    assert np.shares_memory(part.offsets, ragged.offsets)
+    assert part.row(1) == ragged.row(3)
+    assert part.values("id").tolist() == ["c"]
+    assert len(ragged.slice(3, 1)) == 0
+
+    compact = part.compact()
+    assert compact.offsets.tolist() == [0, 0, 1]
+    assert compact["score"].tolist() == [1.0]
+
+
+def test_take_reorders_requests():
+    ragged = make_ragged()
+    taken = ragged.take(np.array([3, 0]))
+    assert [taken.row(r)["id"] for r in range(2)] == [["c"], ["a", "b"]]
+
+
+@pytest.mark.parametrize("large", [False, True])
+def test_arrow_round_trip(large):
+    ragged = make_ragged().slice(0, 4)
+    arrays = ragged.to_arrow(large=large)
+    assert arrays["score"].to_pylist() == [[0.5, 0.25], [], [], [1.0]]
+    back = RaggedArrays.from_arrow(arrays)
+    assert back.lengths.tolist() == ragged.lengths.tolist()
+    assert [back.row(r) for r in range(4)] == [ragged.row(r) for r in range(4)]
+
+
+def test_from_arrow_shares_numeric_values():
+    column = pa.array([[1.0, 2.0], [3.0]], type=pa.list_(pa.float64()))
+    ragged = RaggedArrays.from_arrow({"x": column.slice(1)})
+    assert ragged.offsets.tolist() == [2, 3]
+    assert ragged.values("x").tolist() == [3.0]
+    assert np.shares_memory(ragged["x"], np.frombuffer(column.values.buffers()[1], dtype=np.float64))
+
+
+def test_from_arrow_nulls_and_alignment():
+    ints = pa.array([[1, 2], None, [3]], type=pa.list_(pa.int32()))
+    strings = pa.array([["a", "b"], [], ["c"]], type=pa.list_(pa.string()))
+    ragged = RaggedArrays.from_arrow(pa.record_batch([ints, strings], names=["i", "s"]))
+    assert ragged.row(1) == {"i": [], "s": []}
+    assert ragged.row(2) == {"i": [3], "s": ["c"]}
+
+    # Aligned lengths over differently placed child values are rebased.
+    shifted = RaggedArrays.from_arrow({"i": ints.slice(2), "s": pa.array([["z"]], type=pa.list_(pa.string()))})
+    assert shifted.row(0) == {"i": [3], "s": ["z"]}
+    with pytest.raises(ValueError):
+        RaggedArrays.from_arrow({"i": ints, "s": strings.slice(1)})
+
+
+def test_blending_input_views_and_slices():
+    rows = make_synthetic_requests(200, seed=41, max_nv=20)
+    inputs = BlendingInput.from_rows(rows)
+    assert inputs.ads.row(5) == {k: v for k, v in inputs.row(5).items() if k.startswith("ad_")}
+
+    rebuilt = BlendingInput.from_arrow(pa.Table.from_pandas(pd.DataFrame(rows)))
+    assert [rebuilt.row(r) for r in range(len(rows))] == [inputs.row(r) for r in range(len(rows))]
+
+    part = inputs.slice(50, 120)
+    assert part.ad_quality_score is inputs.ad_quality_score
+    assert part.ad_offsets[0] == inputs.ad_offsets[50]
+    taken = inputs.take(np.arange(50, 120))
+    config = BlendingConfig(k=8)
+    for sliced, copied in ((part, taken), (intern_ids(part), intern_ids(taken))):
+        a, b = blend_batch(sliced, config, top_k=8), blend_batch(copied, config, top_k=8)
+        assert [a.to_records(r) for r in range(len(a))] == [b.to_records(r) for r in range(len(b))]
+        for name, values in metric_pack(a, 8).items():
+            np.testing.assert_allclose(values, metric_pack(b, 8)[name])
+        for name, values in fixed_slot_metrics(sliced, 8).items():
+            np.testing.assert_allclose(values, fixed_slot_metrics(copied, 8)[name])
@@ -0,0 +1,60 @@
+"""
+Tests for the shared-memory sharded blending runner.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.algorithms.interning import intern_ids
+from src.config.blending_config import BlendingConfig
+from src.evaluation.blending_metrics import ad_slot_histogram, metric_pack
+from src.evaluation.grid_evaluation import summarize_metrics
+from src.evaluation.sharded_blending import SharedBlendingInput, shard_bounds, sharded_blend
+from src.utils.synthetic_data import make_synthetic_requests
+
+EXACT_SKETCH_K = 10_000
+
+
+@pytest.fixture(scope="module")
+def inputs():
+    return BlendingInput.from_rows(make_synthetic_requests(1500, seed=71, max_nv=40))
+
+
+def test_shard_bounds_cover_the_requests(inputs):
+    bounds = shard_bounds(inputs, 7)
+    assert bounds[0][0] == 0 and bounds[-1][1] == len(inputs) and len(bounds) == 7
+    assert all(stop == start for (_, stop), (start, _) in zip(bounds[:-1], bounds[1:]))
+    items = [int(inputs.slice(*b).ad_lengths.sum() + inputs.slice(*b).nv_lengths.sum()) for b in bounds]
+    assert max(items) < 1.5 * min(items)
+    assert shard_bounds(inputs.slice(0, 3), 8) == [(0, 1), (1, 2), (2, 3)]
+    assert shard_bounds(inputs.slice(0, 0), 4) == []
+
+
+def test_shared_input_views_the_interned_arrays(inputs):
+    interned = intern_ids(inputs)
+    with SharedBlendingInput.create(inputs) as shared:
+        attached = SharedBlendingInput.attach(shared.name, shared.layout)
+        for name in ("ad_expected_value", "ad_bms_id", "nv_offsets", "n_ids"):
+            np.testing.assert_array_equal(getattr(attached.inputs, name), getattr(interned, name))
+        # Both sides view the same block.
+        shared.inputs.nv_pctr[0] += 1.0
+        assert attached.inputs.nv_pctr[0] == interned.nv_pctr[0] + 1.0
+        attached.close()
+    assert not os.path.exists(f"/dev/shm/{shared.name}")
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_matches_single_blend(inputs, max_workers):
+    config = BlendingConfig(max_ads_block_size=2)
+    metrics = sharded_blend(inputs, config, max_workers=max_workers, n_shards=5, sketch_k=EXACT_SKETCH_K)
+    blended = blend_batch(inputs, config, top_k=config.k)
+    expected = summarize_metrics(metric_pack(blended, config.k))
+    got = metrics.summary()
+    assert metrics.requests == len(inputs)
+    assert got["metric"].tolist() == expected["metric"].tolist()
+    np.testing.assert_allclose(got["mean"], expected["mean"])
+    np.testing.assert_allclose(np.vstack(got["quantiles"]), np.vstack(expected["quantiles"]))
+    np.testing.assert_array_equal(metrics.ad_slots, ad_slot_histogram(blended, config.k))
+    assert sharded_blend(inputs.slice(0, 0), config, max_workers=max_workers).requests == 0
@@ -0,0 +1,26 @@
+"""
+Tests for the Arrow list-column parser in Spark (local-mode Spark).
+"""
+import pytest
+
+pytest.importorskip("pyspark")
+pytest.importorskip("pyarrow")
+
+from src.algorithms.spark_blending import PARSED_INPUT_SCHEMA
+from src.utils.list_parsing import RAW_LIST_COLUMNS, parse_raw_rows
+from src.utils.spark_list_parsing import with_parsed_lists
+from src.utils.synthetic_data import make_synthetic_requests, to_raw_rows
+
+
+def test_parsed_columns_match_row_parser(spark):
+    raw = to_raw_rows(make_synthetic_requests(200, seed=24, max_nv=30))
+    raw[3] = dict(raw[3], nv_pctr_list=None, nv_card_position_list=None, nv_unhashed_bms_id_list=None)
+    names = [r for r, _, _ in RAW_LIST_COLUMNS]
+    df = spark.createDataFrame([tuple(row[n] for n in names) + (i,) for i, row in enumerate(raw)],
+                               ", ".join(f"{n} string" for n in names) + ", request_id int")
+    out = with_parsed_lists(df.repartition(3), drop_raw=True)
+    assert out.columns == ["request_id"] + PARSED_INPUT_SCHEMA.fieldNames()
+    assert [f.dataType for f in out.schema.fields[1:]] == [f.dataType for f in PARSED_INPUT_SCHEMA.fields]
+    expected = parse_raw_rows(raw)
+    for row in out.collect():
+        assert row.asDict(recursive=True) == dict(expected[row.request_id], request_id=row.request_id)
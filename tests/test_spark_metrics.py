@@ -0,0 +1,101 @@
+"""
+Tests for the fused Spark metrics, sketches and slot histograms (local-mode Spark).
+"""
+import pytest
+
+pytest.importorskip("pyspark")
+pytest.importorskip("pyarrow")
+
+from pyspark.sql.functions import expr
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.algorithms.spark_blending import with_merged_result
+from src.config.blending_config import BlendingConfig
+from src.evaluation.blending_metrics import ad_slot_histogram, fixed_slot_histogram, metric_cube
+from src.evaluation.grid_evaluation import summarize_cube, summarize_metrics
+from src.evaluation.quantile_sketch import sketch_summary
+from src.evaluation.spark_metrics import (
+    fixed_slot_sql,
+    metric_cube_summary,
+    metric_pack_sketches,
+    metric_pack_summary,
+    slot_histograms,
+    with_metric_pack,
+)
+from tests.test_grid_evaluation import notebook_metrics
+from tests.test_spark_blending import make_input_df
+
+
+def request_rows(df):
+    """Parsed input rows keyed by request id, with null arrays as empty lists."""
+    return {
+        r.request_id: {k: ([] if v is None else v) for k, v in r.asDict().items()}
+        for r in df.collect()
+    }
+
+
+@pytest.mark.parametrize("config", [BlendingConfig(), BlendingConfig(k=4, alpha=5, max_ads_block_size=1)])
+def test_metric_columns_match_notebook_formulas(spark, config):
+    df = make_input_df(spark, 150, seed=16)
+    rows = request_rows(df)
+    out = with_metric_pack(with_merged_result(df, config), config.k)
+    assert out.columns[:len(df.columns) + 1] == df.columns + ["merged_result"]
+    for row in out.collect():
+        for name, value in notebook_metrics(rows[row.request_id], config).items():
+            assert row[name] == pytest.approx(value), name
+
+
+def test_summary_matches_local_backend(spark):
+    config = BlendingConfig()
+    df = make_input_df(spark, 200, seed=17)
+    rows = request_rows(df)
+    expected = [notebook_metrics(rows[r], config) for r in sorted(rows)]
+    local = summarize_metrics({name: [m[name] for m in expected] for name in expected[0]})
+    summary = metric_pack_summary(with_merged_result(df, config), config.k).toPandas()
+    assert list(summary.metric) == list(local.metric)
+    assert summary["mean"].tolist() == pytest.approx(local["mean"].tolist())
+    assert summary["median"].tolist() == pytest.approx(local["median"].tolist())
+    for actual, wanted in zip(summary.quantiles, local.quantiles):
+        assert list(actual) == pytest.approx(wanted)
+
+
+def test_partition_sketches_merge_to_the_exact_summary(spark):
+    config = BlendingConfig()
+    df = with_merged_result(make_input_df(spark, 200, seed=18).repartition(3), config)
+    summary = metric_pack_summary(df, config.k).toPandas()
+    table = sketch_summary(metric_pack_sketches(df, config.k))
+    assert list(table.metric) == list(summary.metric)
+    assert table["mean"].tolist() == pytest.approx(summary["mean"].tolist())
+    for actual, wanted in zip(table.quantiles, summary.quantiles):
+        assert actual == pytest.approx(list(wanted))
+
+
+def test_cube_summary_matches_local_cube(spark):
+    ks = (1, 2, 5, 12)
+    config = BlendingConfig()
+    df = make_input_df(spark, 150, seed=19)
+    rows = request_rows(df)
+    inputs = BlendingInput.from_rows([rows[r] for r in sorted(rows)])
+    local = summarize_cube(metric_cube(blend_batch(inputs, config), ks))
+    summary = metric_cube_summary(with_merged_result(df, config, top_k=max(ks)), ks).toPandas()
+    assert summary.k.tolist() == local.k.tolist()
+    assert list(summary.metric) == list(local.metric)
+    assert summary["mean"].tolist() == pytest.approx(local["mean"].tolist())
+    for actual, wanted in zip(summary.quantiles, local.quantiles):
+        assert list(actual) == pytest.approx(wanted)
+
+
+def test_slot_histograms_of_several_configs(spark):
+    configs = [BlendingConfig(), BlendingConfig(alpha=5, max_ads_block_size=1)]
+    df = make_input_df(spark, 150, seed=20).repartition(3)
+    rows = request_rows(df)
+    inputs = BlendingInput.from_rows([rows[r] for r in sorted(rows)])
+    for i, config in enumerate(configs):
+        df = with_merged_result(df, config, output_col=f"merged_{i}")
+    counts = slot_histograms(df, 12, ["merged_0", "merged_1"])
+    assert list(counts.index) == ["fixed", "merged_0", "merged_1"]
+    assert counts.loc["fixed"].tolist() == fixed_slot_histogram(inputs, 12).tolist()
+    given = slot_histograms(df.withColumn("sorted_struct", expr(fixed_slot_sql())), 12, [], "sorted_struct")
+    assert given.loc["fixed"].tolist() == counts.loc["fixed"].tolist()
+    for i, config in enumerate(configs):
+        assert counts.loc[f"merged_{i}"].tolist() == ad_slot_histogram(blend_batch(inputs, config), 12).tolist()
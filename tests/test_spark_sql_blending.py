@@ -0,0 +1,40 @@
+"""
+Tests for the pure Spark SQL blending expression (local-mode Spark).
+"""
+import pytest
+
+pytest.importorskip("pyspark")
+
+from src.algorithms.spark_blending import RESULT_SCHEMA
+from src.algorithms.spark_sql_blending import with_merged_result_sql
+from src.config.blending_config import BlendingConfig
+from tests.test_spark_blending import make_input_df, reference_merged
+
+
+@pytest.mark.parametrize("config", [
+    BlendingConfig(),
+    BlendingConfig(alpha=5, beta=30, max_ads_block_size=1, min_nv_block_size=3),
+    BlendingConfig(alpha=0.5, max_ads_block_size=4, min_nv_block_size=1),
+])
+def test_sql_expression_matches_udf(spark, config):
+    df = make_input_df(spark, 200, seed=5)
+    expected = {r.request_id: r.merged_result for r in reference_merged(df, config).collect()}
+    actual = with_merged_result_sql(df, config).collect()
+    assert len(actual) == len(expected)
+    for row in actual:
+        assert row.merged_result == expected[row.request_id]
+
+
+def test_result_type(spark):
+    df = make_input_df(spark, 5, seed=6)
+    out = with_merged_result_sql(df, output_col="blended")
+    assert out.columns == df.columns + ["blended"]
+    # Same types as the udf result; only the nullability flags differ.
+    assert out.schema["blended"].dataType.simpleString() == RESULT_SCHEMA.simpleString()
+
+
+def test_top_k_keeps_the_first_k_items(spark):
+    df = make_input_df(spark, 100, seed=7)
+    full = {r.request_id: r.merged_result for r in with_merged_result_sql(df).collect()}
+    for row in with_merged_result_sql(df, top_k=5).collect():
+        assert row.merged_result == full[row.request_id][:5]
@@ -0,0 +1,114 @@
+"""
+Tests for streaming blending over partitioned Parquet inputs.
+"""
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+
+from src.algorithms.batch_blending import BlendingInput, blend_batch
+from src.config.blending_config import BlendingConfig
+from src.evaluation.blending_metrics import ad_slot_histogram, fixed_slot_histogram, metric_pack
+from src.evaluation.grid_evaluation import summarize_metrics
+from src.evaluation.streaming import MERGED_RESULT_COL, StreamingMetrics, iter_input_batches, stream_blend
+from src.utils.list_decoding import blending_input_from_raw
+from src.utils.synthetic_data import make_synthetic_requests, to_raw_rows
+
+DATES = ["2025-07-19", "2025-07-20", "2025-07-21"]
+EXACT_SKETCH_K = 10_000  # larger than any day, so the sketches stay exact
+
+
+def write_days(root, raw=False, n=400):
+    days = {}
+    for d, date in enumerate(DATES):
+        rows = make_synthetic_requests(n + 50 * d, seed=60 + d, max_nv=40)
+        records = to_raw_rows(rows) if raw else rows
+        table = pa.Table.from_pylist([dict(r, request_id=f"{date}-{i}", date=date) for i, r in enumerate(records)])
+        pq.write_to_dataset(table, str(root), partition_cols=["date"])
+        days[date] = records
+    return days
+
+
+def day_input(records, raw):
+    if raw:
+        return blending_input_from_raw({name: [r[name] for r in records] for name in records[0]})
+    return BlendingInput.from_rows(records)
+
+
+@pytest.mark.parametrize("raw", [False, True])
+def test_per_day_metrics_match_in_memory(tmp_path, raw):
+    days = write_days(tmp_path, raw=raw)
+    config = BlendingConfig()
+    metrics = stream_blend(str(tmp_path), config, group_by="date", batch_size=128, sketch_k=EXACT_SKETCH_K)
+    assert sorted(metrics) == DATES
+    for date, records in days.items():
+        inputs = day_input(records, raw)
+        blended = blend_batch(inputs, config)
+        values = metric_pack(blended, config.k)
+        expected = summarize_metrics(values)
+        got = metrics[date].summary()
+        assert metrics[date].requests == len(records)
+        assert got["metric"].tolist() == expected["metric"].tolist()
+        np.testing.assert_allclose(got["mean"], expected["mean"])
+        np.testing.assert_allclose(np.vstack(got["quantiles"]), np.vstack(expected["quantiles"]))
+        np.testing.assert_array_equal(metrics[date].ad_slots, ad_slot_histogram(blended, config.k))
+        np.testing.assert_array_equal(metrics[date].fixed_ad_slots, fixed_slot_histogram(inputs, config.k))
+
+
+def test_blended_batches_are_written_per_day(tmp_path):
+    days = write_days(tmp_path / "input")
+    config = BlendingConfig(max_ads_block_size=2)
+    output = str(tmp_path / "output")
+    stream_blend(str(tmp_path / "input"), config, group_by="date", output=output,
+                 keep_columns=["request_id"], batch_size=100)
+
+    written = ds.dataset(output, format="parquet", partitioning="hive").to_table()
+    assert written.num_rows == sum(len(rows) for rows in days.values())
+    for date, rows in days.items():
+        day = written.filter(ds.field("date") == date).sort_by("request_id").to_pylist()
+        by_id = {r["request_id"]: r for r in day}
+        blended = blend_batch(BlendingInput.from_rows(rows), config)
+        values = metric_pack(blended, config.k)
+        for i in range(0, len(rows), 37):
+            record = by_id[f"{date}-{i}"]
+            expected = blended.to_records(i)
+            assert [x["source"] for x in record[MERGED_RESULT_COL]] == [x["source"] for x in expected]
+            assert [x["index"] for x in record[MERGED_RESULT_COL]] == [x["index"] for x in expected]
+            assert record["ads_load_topk_blended"] == values["ads_load_topk_blended"][i]
+
+
+def test_short_written_blends_keep_the_k_metrics(tmp_path):
+    write_days(tmp_path / "input")
+    config = BlendingConfig(k=8)
+    expected = stream_blend(str(tmp_path / "input"), config, sketch_k=EXACT_SKETCH_K)[None]
+    output = str(tmp_path / "output")
+    got = stream_blend(str(tmp_path / "input"), config, output=output, top_k=3, sketch_k=EXACT_SKETCH_K)[None]
+    np.testing.assert_allclose(got.summary()["mean"], expected.summary()["mean"])
+    np.testing.assert_array_equal(got.ad_slots, expected.ad_slots)
+    np.testing.assert_array_equal(got.fixed_ad_slots, expected.fixed_ad_slots)
+    written = ds.dataset(output, format="parquet").to_table()
+    assert max(len(blend) for blend in written.column(MERGED_RESULT_COL).to_pylist()) == 3
+
+
+def test_accumulators_merge_and_filters(tmp_path):
+    days = write_days(tmp_path)
+    config = BlendingConfig()
+    per_day = stream_blend(str(tmp_path), config, group_by="date", sketch_k=EXACT_SKETCH_K)
+    total = StreamingMetrics(config.k, EXACT_SKETCH_K)
+    for metrics in per_day.values():
+        total.merge(metrics)
+    overall = stream_blend(str(tmp_path), config, sketch_k=EXACT_SKETCH_K)[None]
+    assert total.requests == overall.requests == sum(len(rows) for rows in days.values())
+    np.testing.assert_array_equal(total.ad_slots, overall.ad_slots)
+    np.testing.assert_allclose(total.summary()["mean"], overall.summary()["mean"])
+    with pytest.raises(ValueError):
+        total.merge(StreamingMetrics(k=5))
+
+    last = stream_blend(str(tmp_path), config, group_by="date", filter=ds.field("date") == DATES[-1])
+    assert list(last) == [DATES[-1]] and last[DATES[-1]].requests == len(days[DATES[-1]])
+
+    batches = list(iter_input_batches(str(tmp_path), ["request_id"], batch_size=64))
+    assert all(b.num_rows <= 64 for b in batches) and batches[0].schema.names[-1] == "request_id"
+    with pytest.raises(KeyError):
+        next(iter_input_batches(str(tmp_path), ["no_such_column"]))